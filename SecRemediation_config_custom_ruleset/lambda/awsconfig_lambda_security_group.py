@@ -13,6 +13,12 @@
 # the required permissions as specificed in the REQUIRED_PERMISSIONS variable below.   If so, the Lambda
 # function adds or removes ingress ports as needed.  Egress rules are not checked.
 #
+# The permissions are compared with rule_runtime.diff_ip_permissions() from config_custom_ruleset_lambda_fucntions.
+# awsconfig_lambda_security_group.py.zip holds this file and the rule_runtime package, build it again after a change:
+#
+#   PYTHONPATH=../../config_custom_ruleset_lambda_fucntions python -m rule_runtime.package awsconfig_lambda_security_group.py \
+#       --output awsconfig_lambda_security_group.py.zip
+#
 # NOTES:
 #
 # This code is only intended for instructional purposes and should not be used for any other use.
@@ -20,6 +26,7 @@
 import boto3
 import botocore
 import json
+import rule_runtime
 
 
 APPLICABLE_RESOURCES = ["AWS::EC2::SecurityGroup"]
@@ -53,7 +60,7 @@ REQUIRED_PERMISSIONS = [
 # All keys are stored in lower case.  Only boolean and numeric keys are stored.
 
 def normalize_parameters(rule_parameters):
-    for key, value in rule_parameters.iteritems():
+    for key, value in list(rule_parameters.items()):
         normalized_key=key.lower()
         normalized_value=value.lower()
 
@@ -118,9 +125,7 @@ def evaluate_compliance(configuration_item, debug_enabled):
     if debug_enabled:
         print("security group definition: ", json.dumps(response, indent=2))
 
-    ip_permissions = response["SecurityGroups"][0]["IpPermissions"]
-    authorize_permissions = [item for item in REQUIRED_PERMISSIONS if item not in ip_permissions]
-    revoke_permissions = [item for item in ip_permissions if item not in REQUIRED_PERMISSIONS]
+    authorize_permissions, revoke_permissions = rule_runtime.diff_ip_permissions(response["SecurityGroups"][0]["IpPermissions"], REQUIRED_PERMISSIONS)
 
     if authorize_permissions or revoke_permissions:
         annotation_message = "Permissions were modified."
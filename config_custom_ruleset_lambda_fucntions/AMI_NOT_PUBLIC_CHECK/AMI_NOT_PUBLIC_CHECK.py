@@ -30,8 +30,8 @@ Scenarios:
 import json
 import sys
 import datetime
-import boto3
 import botocore
+import rule_runtime
 
 try:
     import liblogging
@@ -102,34 +102,22 @@ def build_parameters_value_error_response(ex):
 # This gets the client after assuming the Config service role
 # either in the same AWS account or cross-account.
 def get_client(service, event):
-    if not ASSUME_ROLE_MODE:
-        return boto3.client(service)
-    credentials = get_assume_role_credentials(event["executionRoleArn"])
-    return boto3.client(service, aws_access_key_id=credentials['AccessKeyId'],
-                        aws_secret_access_key=credentials['SecretAccessKey'],
-                        aws_session_token=credentials['SessionToken']
-                       )
+    return rule_runtime.get_client(service, event, assume_role_mode=ASSUME_ROLE_MODE, role_duration_seconds=CONFIG_ROLE_TIMEOUT_SECONDS)
 
 # This generate an evaluation for config
 def build_evaluation(resource_id, compliance_type, event, resource_type=DEFAULT_RESOURCE_TYPE, annotation=None):
-    eval_cc = {}
-    if annotation:
-        eval_cc['Annotation'] = build_annotation(annotation)
-    eval_cc['ComplianceResourceType'] = resource_type
-    eval_cc['ComplianceResourceId'] = resource_id
-    eval_cc['ComplianceType'] = compliance_type
-    eval_cc['OrderingTimestamp'] = str(json.loads(event['invokingEvent'])['notificationCreationTime'])
-    return eval_cc
+    return rule_runtime.Evaluation(resource_type,
+                                   resource_id,
+                                   compliance_type,
+                                   rule_runtime.InvocationContext.from_event(event).ordering_timestamp,
+                                   build_annotation(annotation) if annotation else None)
 
 def build_evaluation_from_config_item(configuration_item, compliance_type, annotation=None):
-    eval_ci = {}
-    if annotation:
-        eval_ci['Annotation'] = build_annotation(annotation)
-    eval_ci['ComplianceResourceType'] = configuration_item['resourceType']
-    eval_ci['ComplianceResourceId'] = configuration_item['resourceId']
-    eval_ci['ComplianceType'] = compliance_type
-    eval_ci['OrderingTimestamp'] = configuration_item['configurationItemCaptureTime']
-    return eval_ci
+    return rule_runtime.Evaluation(configuration_item['resourceType'],
+                                   configuration_item['resourceId'],
+                                   compliance_type,
+                                   configuration_item['configurationItemCaptureTime'],
+                                   build_annotation(annotation) if annotation else None)
 
 ####################
 # Boilerplate Code #
@@ -202,61 +190,15 @@ def is_applicable(configuration_item, event):
         print("Resource Deleted, setting Compliance Status to NOT_APPLICABLE.")
     return status in ('OK', 'ResourceDiscovered') and not event_left_scope
 
-def get_assume_role_credentials(role_arn):
-    sts_client = boto3.client('sts')
-    try:
-        assume_role_response = sts_client.assume_role(RoleArn=role_arn,
-                                                      RoleSessionName="configLambdaExecution",
-                                                      DurationSeconds=CONFIG_ROLE_TIMEOUT_SECONDS)
-        if 'liblogging' in sys.modules:
-            liblogging.logSession(role_arn, assume_role_response)
-        return assume_role_response['Credentials']
-    except botocore.exceptions.ClientError as ex:
-        # Scrub error message for any internal account info leaks
-        print(str(ex))
-        if 'AccessDenied' in ex.response['Error']['Code']:
-            ex.response['Error']['Message'] = "AWS Config does not have permission to assume the IAM role."
-        else:
-            ex.response['Error']['Message'] = "InternalError"
-            ex.response['Error']['Code'] = "InternalError"
-        raise ex
-
 # This removes older evaluation (usually useful for periodic rule not reporting on AWS::::Account).
 def clean_up_old_evaluations(latest_evaluations, event):
+    return rule_runtime.clean_up_old_evaluations(
+        AWS_CONFIG_CLIENT,
+        event['configRuleName'],
+        latest_evaluations,
+        lambda resource_id: build_evaluation(resource_id, "NOT_APPLICABLE", event))
 
-    cleaned_evaluations = []
-
-    old_eval = AWS_CONFIG_CLIENT.get_compliance_details_by_config_rule(
-        ConfigRuleName=event['configRuleName'],
-        ComplianceTypes=['COMPLIANT', 'NON_COMPLIANT'],
-        Limit=100)
-
-    old_eval_list = []
-
-    while True:
-        for old_result in old_eval['EvaluationResults']:
-            old_eval_list.append(old_result)
-        if 'NextToken' in old_eval:
-            next_token = old_eval['NextToken']
-            old_eval = AWS_CONFIG_CLIENT.get_compliance_details_by_config_rule(
-                ConfigRuleName=event['configRuleName'],
-                ComplianceTypes=['COMPLIANT', 'NON_COMPLIANT'],
-                Limit=100,
-                NextToken=next_token)
-        else:
-            break
-
-    for old_eval in old_eval_list:
-        old_resource_id = old_eval['EvaluationResultIdentifier']['EvaluationResultQualifier']['ResourceId']
-        newer_founded = False
-        for latest_eval in latest_evaluations:
-            if old_resource_id == latest_eval['ComplianceResourceId']:
-                newer_founded = True
-        if not newer_founded:
-            cleaned_evaluations.append(build_evaluation(old_resource_id, "NOT_APPLICABLE", event))
-
-    return cleaned_evaluations + latest_evaluations
-
+@rule_runtime.instrument_handler
 def lambda_handler(event, context):
     if 'liblogging' in sys.modules:
         liblogging.logEvent(event)
@@ -265,7 +207,8 @@ def lambda_handler(event, context):
 
     #print(event)
     check_defined(event, 'event')
-    invoking_event = json.loads(event['invokingEvent'])
+    event = rule_runtime.InvocationContext.from_event(event)
+    invoking_event = event.invoking_event
     rule_parameters = {}
     if 'ruleParameters' in event:
         rule_parameters = json.loads(event['ruleParameters'])
@@ -295,35 +238,34 @@ def lambda_handler(event, context):
     evaluations = []
     latest_evaluations = []
 
-    if not compliance_result:
-        latest_evaluations.append(build_evaluation(event['accountId'], "NOT_APPLICABLE", event, resource_type='AWS::::Account'))
-        evaluations = clean_up_old_evaluations(latest_evaluations, event)
-    elif isinstance(compliance_result, str):
-        if configuration_item:
-            evaluations.append(build_evaluation_from_config_item(configuration_item, compliance_result))
+    # An Evaluation built from an invalid compliance type or resource raises a ValueError.
+    try:
+        if not compliance_result:
+            latest_evaluations.append(build_evaluation(event['accountId'], "NOT_APPLICABLE", event, resource_type='AWS::::Account'))
+            evaluations = clean_up_old_evaluations(latest_evaluations, event)
+        elif isinstance(compliance_result, str):
+            if configuration_item:
+                evaluations.append(build_evaluation_from_config_item(configuration_item, compliance_result))
+            else:
+                evaluations.append(build_evaluation(event['accountId'], compliance_result, event, resource_type=DEFAULT_RESOURCE_TYPE))
+        elif isinstance(compliance_result, list):
+            latest_evaluations = [evaluation for evaluation in compliance_result if rule_runtime.is_valid_evaluation(evaluation)]
+            evaluations = clean_up_old_evaluations(latest_evaluations, event)
+        elif isinstance(compliance_result, (dict, rule_runtime.Evaluation)):
+            if rule_runtime.is_valid_evaluation(compliance_result):
+                evaluations.append(compliance_result)
+        elif rule_runtime.is_evaluation_stream(compliance_result):
+            # Evaluations yielded by evaluate_compliance() are sent while they are produced
+            evaluations = rule_runtime.stream_evaluations(
+                AWS_CONFIG_CLIENT,
+                event['configRuleName'],
+                compliance_result,
+                lambda resource_id: build_evaluation(resource_id, "NOT_APPLICABLE", event),
+                lambda: build_evaluation(event['accountId'], "NOT_APPLICABLE", event, resource_type='AWS::::Account'))
         else:
-            evaluations.append(build_evaluation(event['accountId'], compliance_result, event, resource_type=DEFAULT_RESOURCE_TYPE))
-    elif isinstance(compliance_result, list):
-        for evaluation in compliance_result:
-            missing_fields = False
-            for field in ('ComplianceResourceType', 'ComplianceResourceId', 'ComplianceType', 'OrderingTimestamp'):
-                if field not in evaluation:
-                    print("Missing " + field + " from custom evaluation.")
-                    missing_fields = True
-
-            if not missing_fields:
-                latest_evaluations.append(evaluation)
-        evaluations = clean_up_old_evaluations(latest_evaluations, event)
-    elif isinstance(compliance_result, dict):
-        missing_fields = False
-        for field in ('ComplianceResourceType', 'ComplianceResourceId', 'ComplianceType', 'OrderingTimestamp'):
-            if field not in compliance_result:
-                print("Missing " + field + " from custom evaluation.")
-                missing_fields = True
-        if not missing_fields:
-            evaluations.append(compliance_result)
-    else:
-        evaluations.append(build_evaluation_from_config_item(configuration_item, 'NOT_APPLICABLE'))
+            evaluations.append(build_evaluation_from_config_item(configuration_item, 'NOT_APPLICABLE'))
+    except ValueError as ex:
+        return build_internal_error_response(str(ex), str(ex))
 
     # Put together the request that reports the evaluation status
     result_token = event['resultToken']
@@ -333,14 +275,22 @@ def lambda_handler(event, context):
         test_mode = True
 
     # Invoke the Config API to report the result of the evaluation
-    evaluation_copy = []
-    evaluation_copy = evaluations[:]
-    while evaluation_copy:
-        AWS_CONFIG_CLIENT.put_evaluations(Evaluations=evaluation_copy[:100], ResultToken=result_token, TestMode=test_mode)
-        del evaluation_copy[:100]
+    try:
+        metrics = rule_runtime.put_evaluations(AWS_CONFIG_CLIENT, evaluations, result_token, test_mode)
+    except rule_runtime.EvaluationStreamError as ex:
+        # The streamed evaluations are produced while they are sent, so their errors surface here.
+        return build_stream_error_response(ex.error)
 
     # Used solely for RDK test to be able to test Lambda function
-    return evaluations
+    return rule_runtime.build_handler_response(evaluations, metrics)
+
+def build_stream_error_response(exception):
+    """Return the error dictionary of an error raised while the streamed evaluations were produced and sent."""
+    if isinstance(exception, botocore.exceptions.ClientError):
+        if is_internal_error(exception):
+            return build_internal_error_response("Unexpected error while completing API request", str(exception))
+        return build_error_response("Customer error while making API request", str(exception), exception.response['Error']['Code'], exception.response['Error']['Message'])
+    return build_internal_error_response(str(exception), str(exception))
 
 def is_internal_error(exception):
     return ((not isinstance(exception, botocore.exceptions.ClientError)) or exception.response['Error']['Code'].startswith('5')
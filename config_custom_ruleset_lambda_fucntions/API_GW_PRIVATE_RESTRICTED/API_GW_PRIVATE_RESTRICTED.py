@@ -80,8 +80,8 @@ Scenarios:
 
 import json
 import datetime
-import boto3
 import botocore
+import rule_runtime
 
 ##############
 # Parameters #
@@ -123,9 +123,7 @@ def evaluate_compliance(event, configuration_item, valid_rule_parameters):
     if not gateways_list:
         return None
 
-    ec2_client = get_client('ec2', event)
-    all_vpc_in_account = ec2_client.describe_vpcs()
-    all_vpce_in_account = get_all_vpce(ec2_client)
+    network = rule_runtime.get_network_snapshot(get_client('ec2', event), event['accountId'], ('vpcs', 'vpc_endpoints'))
 
     evaluations = []
     for gateway in gateways_list:
@@ -156,14 +154,14 @@ def evaluate_compliance(event, configuration_item, valid_rule_parameters):
 
                 if allow_statement_has_attrib(statement, 'aws:sourceVpc'):
                     vpc_list = statement['Condition']['StringEquals']['aws:sourceVpc']
-                    if not is_resource_in_same_account(vpc_list, 'VpcId', all_vpc_in_account['Vpcs']):
+                    if not is_resource_in_same_account(vpc_list, network.vpcs):
                         evaluations.append(build_evaluation(gateway['name'], 'NON_COMPLIANT', event, annotation='The VPCs are not in the same account than this API Gateway.'))
                         is_gateway_compliant = False
                         break
 
                 if allow_statement_has_attrib(statement, 'aws:sourceVpce'):
                     vpce_list = statement['Condition']['StringEquals']['aws:sourceVpce']
-                    if not is_resource_in_same_account(vpce_list, 'VpcEndpointId', all_vpce_in_account):
+                    if not is_resource_in_same_account(vpce_list, network.vpc_endpoints):
                         evaluations.append(build_evaluation(gateway['name'], 'NON_COMPLIANT', event, annotation='The VPCEs are not in the same account than this API Gateway.'))
                         is_gateway_compliant = False
                         break
@@ -196,7 +194,7 @@ def allow_statement_has_attrib(statement, attrib_value):
         return False
     return True
 
-def is_resource_in_same_account(resource, key_id, all_resources_in_account):
+def is_resource_in_same_account(resource, resources_in_account):
     resource_list = []
     if not isinstance(resource, list):
         resource_list.append(resource)
@@ -207,39 +205,12 @@ def is_resource_in_same_account(resource, key_id, all_resources_in_account):
         return True
 
     for current_resource in resource_list:
-        if not in_dictlist(key_id, str(current_resource), all_resources_in_account):
+        if str(current_resource) not in resources_in_account:
             return False
     return True
 
-def in_dictlist(key, value, my_dictlist):
-    for this in my_dictlist:
-        if this[key] == value:
-            return True
-    return False
-
-def get_all_vpce(client):
-    vpce_list = client.describe_vpc_endpoints(MaxResults=1000)
-    all_vpce_list = []
-    while True:
-        for item in vpce_list['VpcEndpoints']:
-            all_vpce_list.append(item)
-        if 'NextToken' in vpce_list:
-            vpce_list = client.describe_vpc_endpoints(NextToken=vpce_list['NextToken'], MaxResults=1000)
-        else:
-            break
-    return all_vpce_list
-
 def get_all_api_gateway(client):
-    rest_apis_list = client.get_rest_apis(limit=500)
-    apis_list = []
-    while True:
-        for item in rest_apis_list['items']:
-            apis_list.append(item)
-        if 'position' in rest_apis_list:
-            rest_apis_list = client.get_rest_apis(position=rest_apis_list['position'], limit=500)
-        else:
-            break
-    return apis_list
+    return list(rule_runtime.paginate(client, client.get_rest_apis))
 
 def evaluate_parameters(rule_parameters):
     """Evaluate the rule parameters dictionary validity. Raise a ValueError for invalid parameters.
@@ -274,54 +245,44 @@ def build_parameters_value_error_response(ex):
 def get_client(service, event):
     """Return the service boto client. It should be used instead of directly calling the client.
 
+    The client comes from the rule_runtime pool and is reused across warm invocations.
+
     Keyword arguments:
     service -- the service name used for calling the boto.client()
     event -- the event variable given in the lambda handler
     """
-    if not ASSUME_ROLE_MODE:
-        return boto3.client(service)
-    credentials = get_assume_role_credentials(event["executionRoleArn"])
-    return boto3.client(service, aws_access_key_id=credentials['AccessKeyId'],
-                        aws_secret_access_key=credentials['SecretAccessKey'],
-                        aws_session_token=credentials['SessionToken']
-                       )
+    return rule_runtime.get_client(service, event, assume_role_mode=ASSUME_ROLE_MODE)
 
 # This generate an evaluation for config
 def build_evaluation(resource_id, compliance_type, event, resource_type=DEFAULT_RESOURCE_TYPE, annotation=None):
-    """Form an evaluation as a dictionary. Usually suited to report on scheduled rules.
+    """Form an evaluation as a rule_runtime.Evaluation. Usually suited to report on scheduled rules.
 
     Keyword arguments:
     resource_id -- the unique id of the resource to report
     compliance_type -- either COMPLIANT, NON_COMPLIANT or NOT_APPLICABLE
-    event -- the event variable given in the lambda handler
+    event -- the InvocationContext (or the raw event) given in the lambda handler
     resource_type -- the CloudFormation resource type (or AWS::::Account) to report on the rule (default DEFAULT_RESOURCE_TYPE)
     annotation -- an annotation to be added to the evaluation (default None)
     """
-    eval_cc = {}
-    if annotation:
-        eval_cc['Annotation'] = annotation
-    eval_cc['ComplianceResourceType'] = resource_type
-    eval_cc['ComplianceResourceId'] = resource_id
-    eval_cc['ComplianceType'] = compliance_type
-    eval_cc['OrderingTimestamp'] = str(json.loads(event['invokingEvent'])['notificationCreationTime'])
-    return eval_cc
+    return rule_runtime.Evaluation(resource_type,
+                                   resource_id,
+                                   compliance_type,
+                                   rule_runtime.InvocationContext.from_event(event).ordering_timestamp,
+                                   annotation)
 
 def build_evaluation_from_config_item(configuration_item, compliance_type, annotation=None):
-    """Form an evaluation as a dictionary. Usually suited to report on configuration change rules.
+    """Form an evaluation as a rule_runtime.Evaluation. Usually suited to report on configuration change rules.
 
     Keyword arguments:
     configuration_item -- the configurationItem dictionary in the invokingEvent
     compliance_type -- either COMPLIANT, NON_COMPLIANT or NOT_APPLICABLE
     annotation -- an annotation to be added to the evaluation (default None)
     """
-    eval_ci = {}
-    if annotation:
-        eval_ci['Annotation'] = annotation
-    eval_ci['ComplianceResourceType'] = configuration_item['resourceType']
-    eval_ci['ComplianceResourceId'] = configuration_item['resourceId']
-    eval_ci['ComplianceType'] = compliance_type
-    eval_ci['OrderingTimestamp'] = configuration_item['configurationItemCaptureTime']
-    return eval_ci
+    return rule_runtime.Evaluation(configuration_item['resourceType'],
+                                   configuration_item['resourceId'],
+                                   compliance_type,
+                                   configuration_item['configurationItemCaptureTime'],
+                                   annotation)
 
 ####################
 # Boilerplate Code #
@@ -394,65 +355,24 @@ def is_applicable(configurationItem, event):
         print("Resource Deleted, setting Compliance Status to NOT_APPLICABLE.")
     return (status == 'OK' or status == 'ResourceDiscovered') and not eventLeftScope
 
-def get_assume_role_credentials(role_arn):
-    sts_client = boto3.client('sts')
-    try:
-        assume_role_response = sts_client.assume_role(RoleArn=role_arn, RoleSessionName="configLambdaExecution")
-        return assume_role_response['Credentials']
-    except botocore.exceptions.ClientError as ex:
-        # Scrub error message for any internal account info leaks
-        print(str(ex))
-        if 'AccessDenied' in ex.response['Error']['Code']:
-            ex.response['Error']['Message'] = "AWS Config does not have permission to assume the IAM role."
-        else:
-            ex.response['Error']['Message'] = "InternalError"
-            ex.response['Error']['Code'] = "InternalError"
-        raise ex
-
 # This removes older evaluation (usually useful for periodic rule not reporting on AWS::::Account).
 def clean_up_old_evaluations(latest_evaluations, event):
-
-    cleaned_evaluations = []
-
-    old_eval = AWS_CONFIG_CLIENT.get_compliance_details_by_config_rule(
-        ConfigRuleName=event['configRuleName'],
-        ComplianceTypes=['COMPLIANT', 'NON_COMPLIANT'],
-        Limit=100)
-
-    old_eval_list = []
-
-    while True:
-        for old_result in old_eval['EvaluationResults']:
-            old_eval_list.append(old_result)
-        if 'NextToken' in old_eval:
-            next_token = old_eval['NextToken']
-            old_eval = AWS_CONFIG_CLIENT.get_compliance_details_by_config_rule(
-                ConfigRuleName=event['configRuleName'],
-                ComplianceTypes=['COMPLIANT', 'NON_COMPLIANT'],
-                Limit=100,
-                NextToken=next_token)
-        else:
-            break
-
-    for old_eval in old_eval_list:
-        old_resource_id = old_eval['EvaluationResultIdentifier']['EvaluationResultQualifier']['ResourceId']
-        newer_founded = False
-        for latest_eval in latest_evaluations:
-            if old_resource_id == latest_eval['ComplianceResourceId']:
-                newer_founded = True
-        if not newer_founded:
-            cleaned_evaluations.append(build_evaluation(old_resource_id, "NOT_APPLICABLE", event))
-
-    return cleaned_evaluations + latest_evaluations
+    return rule_runtime.clean_up_old_evaluations(
+        AWS_CONFIG_CLIENT,
+        event['configRuleName'],
+        latest_evaluations,
+        lambda resource_id: build_evaluation(resource_id, "NOT_APPLICABLE", event))
 
 # This decorates the lambda_handler in rule_code with the actual PutEvaluation call
+@rule_runtime.instrument_handler
 def lambda_handler(event, context):
 
     global AWS_CONFIG_CLIENT
 
     #print(event)
     check_defined(event, 'event')
-    invoking_event = json.loads(event['invokingEvent'])
+    event = rule_runtime.InvocationContext.from_event(event)
+    invoking_event = event.invoking_event
     rule_parameters = {}
     if 'ruleParameters' in event:
         rule_parameters = json.loads(event['ruleParameters'])
@@ -482,32 +402,31 @@ def lambda_handler(event, context):
     evaluations = []
     latest_evaluations = []
 
-    if not compliance_result:
-        latest_evaluations.append(build_evaluation(event['accountId'], "NOT_APPLICABLE", event, resource_type='AWS::::Account'))
-        evaluations = clean_up_old_evaluations(latest_evaluations, event)
-    elif isinstance(compliance_result, str):
-        evaluations.append(build_evaluation_from_config_item(configuration_item, compliance_result))
-    elif isinstance(compliance_result, list):
-        for evaluation in compliance_result:
-            missing_fields = False
-            for field in ('ComplianceResourceType', 'ComplianceResourceId', 'ComplianceType', 'OrderingTimestamp'):
-                if field not in evaluation:
-                    print("Missing " + field + " from custom evaluation.")
-                    missing_fields = True
-
-            if not missing_fields:
-                latest_evaluations.append(evaluation)
-        evaluations = clean_up_old_evaluations(latest_evaluations, event)
-    elif isinstance(compliance_result, dict):
-        missing_fields = False
-        for field in ('ComplianceResourceType', 'ComplianceResourceId', 'ComplianceType', 'OrderingTimestamp'):
-            if field not in compliance_result:
-                print("Missing " + field + " from custom evaluation.")
-                missing_fields = True
-        if not missing_fields:
-            evaluations.append(compliance_result)
-    else:
-        evaluations.append(build_evaluation_from_config_item(configuration_item, 'NOT_APPLICABLE'))
+    # An Evaluation built from an invalid compliance type or resource raises a ValueError.
+    try:
+        if not compliance_result:
+            latest_evaluations.append(build_evaluation(event['accountId'], "NOT_APPLICABLE", event, resource_type='AWS::::Account'))
+            evaluations = clean_up_old_evaluations(latest_evaluations, event)
+        elif isinstance(compliance_result, str):
+            evaluations.append(build_evaluation_from_config_item(configuration_item, compliance_result))
+        elif isinstance(compliance_result, list):
+            latest_evaluations = [evaluation for evaluation in compliance_result if rule_runtime.is_valid_evaluation(evaluation)]
+            evaluations = clean_up_old_evaluations(latest_evaluations, event)
+        elif isinstance(compliance_result, (dict, rule_runtime.Evaluation)):
+            if rule_runtime.is_valid_evaluation(compliance_result):
+                evaluations.append(compliance_result)
+        elif rule_runtime.is_evaluation_stream(compliance_result):
+            # Evaluations yielded by evaluate_compliance() are sent while they are produced
+            evaluations = rule_runtime.stream_evaluations(
+                AWS_CONFIG_CLIENT,
+                event['configRuleName'],
+                compliance_result,
+                lambda resource_id: build_evaluation(resource_id, "NOT_APPLICABLE", event),
+                lambda: build_evaluation(event['accountId'], "NOT_APPLICABLE", event, resource_type='AWS::::Account'))
+        else:
+            evaluations.append(build_evaluation_from_config_item(configuration_item, 'NOT_APPLICABLE'))
+    except ValueError as ex:
+        return build_internal_error_response(str(ex), str(ex))
 
     # Put together the request that reports the evaluation status
     resultToken = event['resultToken']
@@ -516,13 +435,21 @@ def lambda_handler(event, context):
         # Used solely for RDK test to skip actual put_evaluation API call
         testMode = True
     # Invoke the Config API to report the result of the evaluation
-    evaluation_copy = []
-    evaluation_copy = evaluations[:]
-    while(evaluation_copy):
-        AWS_CONFIG_CLIENT.put_evaluations(Evaluations=evaluation_copy[:100], ResultToken=resultToken, TestMode=testMode)
-        del evaluation_copy[:100]
+    try:
+        metrics = rule_runtime.put_evaluations(AWS_CONFIG_CLIENT, evaluations, resultToken, testMode)
+    except rule_runtime.EvaluationStreamError as ex:
+        # The streamed evaluations are produced while they are sent, so their errors surface here.
+        return build_stream_error_response(ex.error)
     # Used solely for RDK test to be able to test Lambda function
-    return evaluations
+    return rule_runtime.build_handler_response(evaluations, metrics)
+
+def build_stream_error_response(exception):
+    """Return the error dictionary of an error raised while the streamed evaluations were produced and sent."""
+    if isinstance(exception, botocore.exceptions.ClientError):
+        if is_internal_error(exception):
+            return build_internal_error_response("Unexpected error while completing API request", str(exception))
+        return build_error_response("Customer error while making API request", str(exception), exception.response['Error']['Code'], exception.response['Error']['Message'])
+    return build_internal_error_response(str(exception), str(exception))
 
 def is_internal_error(exception):
     return ((not isinstance(exception, botocore.exceptions.ClientError)) or exception.response['Error']['Code'].startswith('5')
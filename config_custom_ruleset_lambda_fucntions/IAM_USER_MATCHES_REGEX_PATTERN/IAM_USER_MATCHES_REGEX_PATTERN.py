@@ -6,6 +6,7 @@ Description:
   Verify that IAM user name conforms to a particular regex pattern.
 Trigger:
   Configuration change on AWS::IAM::User
+  Periodic, every user evaluated again (after a change of regexPattern)
 Resource Type to report on:
   AWS::IAM::User
 Rule Parameters:
@@ -18,6 +19,9 @@ Scenarios:
   Scenario 2:
   Given: Regex Pattern an invaild regex pattern
     Then: Return Error
+  Scenario 2b:
+  Given: Regex Pattern backtracks catastrophically on a user name of 64 characters, as (a+)+$
+    Then: Return Error
   Scenario 3:
   Given: The parameter regexPattern is configured and valid.
     And: A user name contains the regex pattern
@@ -32,8 +36,10 @@ import json
 import re
 import sys
 import datetime
-import boto3
+import multiprocessing
+import string
 import botocore
+import rule_runtime
 
 try:
     import liblogging
@@ -53,15 +59,33 @@ ASSUME_ROLE_MODE = False
 # Other parameters (no change needed)
 CONFIG_ROLE_TIMEOUT_SECONDS = 900
 
+# Compiled regexPattern values, kept for the warm container
+COMPILED_PATTERNS = {}
+
+# Verdicts of the backtracking check of the regexPattern values, kept for the warm container
+BACKTRACKING_PATTERNS = {}
+
+# Time given to the pattern to reject every probe user name, longer means catastrophic backtracking
+PATTERN_CHECK_TIMEOUT_SECONDS = 1
+
+# Characters of the IAM user names, repeated up to the longest user name in the probes
+NAME_CHARACTERS = string.ascii_letters + string.digits + '+=,.@_-'
+NAME_MAX_LENGTH = 64
+
 #############
 # Main Code #
 #############
 
 def evaluate_compliance(event, configuration_item, valid_rule_parameters):
     """Form the evaluation(s) to be return to Config Rules
+
+    A scheduled invocation (without configuration_item) evaluates every user of the account, see evaluate_all_users().
     """
-    iam_user_name = configuration_item["resourceName"]
     pattern = valid_rule_parameters["regexPattern"]
+    if configuration_item is None:
+        return evaluate_all_users(event, pattern)
+
+    iam_user_name = configuration_item["resourceName"]
     is_compliant = evaluate_username(iam_user_name, pattern)
 
     if is_compliant:
@@ -69,6 +93,24 @@ def evaluate_compliance(event, configuration_item, valid_rule_parameters):
 
     return build_evaluation(iam_user_name, 'NON_COMPLIANT', event, annotation='The regex ({}) does not match ({}).'.format(pattern, iam_user_name))
 
+def evaluate_all_users(event, pattern_str):
+    """Yield the evaluation of every IAM user, the users listed page by page and matched with one compiled pattern
+
+    The evaluations are sent in batches while the users are still listed. They are reported under the user name, as the
+    change-triggered ones are, so both modes keep a single evaluation per user.
+
+    Keyword arguments:
+    event -- the event variable given in the lambda handler
+    pattern_str -- the regexPattern parameter
+    """
+    iam_client = get_client('iam', event)
+    pattern = get_compiled_pattern(pattern_str)
+    for user in rule_runtime.paginate(iam_client, iam_client.list_users):
+        if pattern.match(user['UserName']):
+            yield build_evaluation(user['UserName'], 'COMPLIANT', event)
+        else:
+            yield build_evaluation(user['UserName'], 'NON_COMPLIANT', event, annotation='The regex ({}) does not match ({}).'.format(pattern_str, user['UserName']))
+
 def evaluate_username(user_name, pattern_str):
     """Evaluate the regex pattern for match in the user name
 
@@ -79,9 +121,57 @@ def evaluate_username(user_name, pattern_str):
     user_name -- the string in the iam user name
     pattern_str -- a string that gets compiled into a regular expression object
     """
-    pattern = re.compile(f"{pattern_str}")
+    pattern = get_compiled_pattern(pattern_str)
     return pattern.match(user_name)
 
+def get_compiled_pattern(pattern_str):
+    """Return the regular expression object of the pattern, compiled once per warm container
+
+    Keyword arguments:
+    pattern_str -- a string that gets compiled into a regular expression object
+    """
+    pattern = COMPILED_PATTERNS.get(pattern_str)
+    if pattern is None:
+        pattern = COMPILED_PATTERNS[pattern_str] = re.compile(pattern_str)
+    return pattern
+
+def has_nested_quantifier(pattern_str):
+    """Check whether the pattern backtracks catastrophically, as (a+)+$ or (a|aa)+$ do
+
+    The pattern is matched against probe user names, each one a run of a single name character ended by a character
+    no user name holds, in a child process given PATTERN_CHECK_TIMEOUT_SECONDS: a pattern still backtracking at the
+    deadline is stopped and reported. The verdict is kept per pattern for the warm container.
+
+    Return:
+    True when the pattern does not reject the probe user names in time
+
+    Keyword arguments:
+    pattern_str -- a valid regular expression
+    """
+    verdict = BACKTRACKING_PATTERNS.get(pattern_str)
+    if verdict is None:
+        verdict = BACKTRACKING_PATTERNS[pattern_str] = not is_matched_in_time(get_compiled_pattern(pattern_str))
+    return verdict
+
+def is_matched_in_time(pattern):
+    # Lambda has no /dev/shm, the child reports through a pipe, not a multiprocessing queue or pool
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.get_context('fork').Process(target=match_probes, args=(pattern, sender), daemon=True)
+    process.start()
+    sender.close()
+    try:
+        return receiver.poll(PATTERN_CHECK_TIMEOUT_SECONDS)
+    finally:
+        process.terminate()
+        process.join()
+        receiver.close()
+
+def match_probes(pattern, sender):
+    for character in NAME_CHARACTERS:
+        pattern.match(character * NAME_MAX_LENGTH + '!')
+    sender.send(True)
+    sender.close()
+
 def evaluate_parameters(rule_parameters):
     """Evaluate the rule parameters dictionary validity. Raise a ValueError for invalid parameters.
 
@@ -92,10 +182,13 @@ def evaluate_parameters(rule_parameters):
     rule_parameters -- the Key/Value dictionary of the Config Rules parameters
     """
     try:
-        re.compile(rule_parameters['regexPattern'])
+        get_compiled_pattern(rule_parameters['regexPattern'])
     except:
         raise ValueError('The Config Rule must have a validate regex value specified for the parameter "regexPattern"')
 
+    if has_nested_quantifier(rule_parameters['regexPattern']):
+        raise ValueError('The parameter "regexPattern" backtracks catastrophically (as (a+)+$ does), it did not reject a probe user name within {} second(s)'.format(PATTERN_CHECK_TIMEOUT_SECONDS))
+
     return rule_parameters
 
 ####################
@@ -119,54 +212,44 @@ def build_parameters_value_error_response(ex):
 def get_client(service, event):
     """Return the service boto client. It should be used instead of directly calling the client.
 
+    The client comes from the rule_runtime pool and is reused across warm invocations.
+
     Keyword arguments:
     service -- the service name used for calling the boto.client()
     event -- the event variable given in the lambda handler
     """
-    if not ASSUME_ROLE_MODE:
-        return boto3.client(service)
-    credentials = get_assume_role_credentials(event["executionRoleArn"])
-    return boto3.client(service, aws_access_key_id=credentials['AccessKeyId'],
-                        aws_secret_access_key=credentials['SecretAccessKey'],
-                        aws_session_token=credentials['SessionToken']
-                       )
+    return rule_runtime.get_client(service, event, assume_role_mode=ASSUME_ROLE_MODE, role_duration_seconds=CONFIG_ROLE_TIMEOUT_SECONDS)
 
 # This generate an evaluation for config
 def build_evaluation(resource_id, compliance_type, event, resource_type=DEFAULT_RESOURCE_TYPE, annotation=None):
-    """Form an evaluation as a dictionary. Usually suited to report on scheduled rules.
+    """Form an evaluation as a rule_runtime.Evaluation. Usually suited to report on scheduled rules.
 
     Keyword arguments:
     resource_id -- the unique id of the resource to report
     compliance_type -- either COMPLIANT, NON_COMPLIANT or NOT_APPLICABLE
-    event -- the event variable given in the lambda handler
+    event -- the InvocationContext (or the raw event) given in the lambda handler
     resource_type -- the CloudFormation resource type (or AWS::::Account) to report on the rule (default DEFAULT_RESOURCE_TYPE)
     annotation -- an annotation to be added to the evaluation (default None)
     """
-    eval_cc = {}
-    if annotation:
-        eval_cc['Annotation'] = annotation
-    eval_cc['ComplianceResourceType'] = resource_type
-    eval_cc['ComplianceResourceId'] = resource_id
-    eval_cc['ComplianceType'] = compliance_type
-    eval_cc['OrderingTimestamp'] = str(json.loads(event['invokingEvent'])['notificationCreationTime'])
-    return eval_cc
+    return rule_runtime.Evaluation(resource_type,
+                                   resource_id,
+                                   compliance_type,
+                                   rule_runtime.InvocationContext.from_event(event).ordering_timestamp,
+                                   annotation)
 
 def build_evaluation_from_config_item(configuration_item, compliance_type, annotation=None):
-    """Form an evaluation as a dictionary. Usually suited to report on configuration change rules.
+    """Form an evaluation as a rule_runtime.Evaluation. Usually suited to report on configuration change rules.
 
     Keyword arguments:
     configuration_item -- the configurationItem dictionary in the invokingEvent
     compliance_type -- either COMPLIANT, NON_COMPLIANT or NOT_APPLICABLE
     annotation -- an annotation to be added to the evaluation (default None)
     """
-    eval_ci = {}
-    if annotation:
-        eval_ci['Annotation'] = annotation
-    eval_ci['ComplianceResourceType'] = configuration_item['resourceType']
-    eval_ci['ComplianceResourceId'] = configuration_item['resourceId']
-    eval_ci['ComplianceType'] = compliance_type
-    eval_ci['OrderingTimestamp'] = configuration_item['configurationItemCaptureTime']
-    return eval_ci
+    return rule_runtime.Evaluation(configuration_item['resourceType'],
+                                   configuration_item['resourceId'],
+                                   compliance_type,
+                                   configuration_item['configurationItemCaptureTime'],
+                                   annotation)
 
 ####################
 # Boilerplate Code #
@@ -239,61 +322,15 @@ def is_applicable(configuration_item, event):
         print("Resource Deleted, setting Compliance Status to NOT_APPLICABLE.")
     return (status in ('OK', 'ResourceDiscovered')) and not event_left_scope
 
-def get_assume_role_credentials(role_arn):
-    sts_client = boto3.client('sts')
-    try:
-        assume_role_response = sts_client.assume_role(RoleArn=role_arn,
-                                                      RoleSessionName="configLambdaExecution",
-                                                      DurationSeconds=CONFIG_ROLE_TIMEOUT_SECONDS)
-        if 'liblogging' in sys.modules:
-            liblogging.logSession(role_arn, assume_role_response)
-        return assume_role_response['Credentials']
-    except botocore.exceptions.ClientError as ex:
-        # Scrub error message for any internal account info leaks
-        print(str(ex))
-        if 'AccessDenied' in ex.response['Error']['Code']:
-            ex.response['Error']['Message'] = "AWS Config does not have permission to assume the IAM role."
-        else:
-            ex.response['Error']['Message'] = "InternalError"
-            ex.response['Error']['Code'] = "InternalError"
-        raise ex
-
 # This removes older evaluation (usually useful for periodic rule not reporting on AWS::::Account).
 def clean_up_old_evaluations(latest_evaluations, event):
+    return rule_runtime.clean_up_old_evaluations(
+        AWS_CONFIG_CLIENT,
+        event['configRuleName'],
+        latest_evaluations,
+        lambda resource_id: build_evaluation(resource_id, "NOT_APPLICABLE", event))
 
-    cleaned_evaluations = []
-
-    old_eval = AWS_CONFIG_CLIENT.get_compliance_details_by_config_rule(
-        ConfigRuleName=event['configRuleName'],
-        ComplianceTypes=['COMPLIANT', 'NON_COMPLIANT'],
-        Limit=100)
-
-    old_eval_list = []
-
-    while True:
-        for old_result in old_eval['EvaluationResults']:
-            old_eval_list.append(old_result)
-        if 'NextToken' in old_eval:
-            next_token = old_eval['NextToken']
-            old_eval = AWS_CONFIG_CLIENT.get_compliance_details_by_config_rule(
-                ConfigRuleName=event['configRuleName'],
-                ComplianceTypes=['COMPLIANT', 'NON_COMPLIANT'],
-                Limit=100,
-                NextToken=next_token)
-        else:
-            break
-
-    for old_eval in old_eval_list:
-        old_resource_id = old_eval['EvaluationResultIdentifier']['EvaluationResultQualifier']['ResourceId']
-        newer_founded = False
-        for latest_eval in latest_evaluations:
-            if old_resource_id == latest_eval['ComplianceResourceId']:
-                newer_founded = True
-        if not newer_founded:
-            cleaned_evaluations.append(build_evaluation(old_resource_id, "NOT_APPLICABLE", event))
-
-    return cleaned_evaluations + latest_evaluations
-
+@rule_runtime.instrument_handler
 def lambda_handler(event, context):
     if 'liblogging' in sys.modules:
         liblogging.logEvent(event)
@@ -302,7 +339,8 @@ def lambda_handler(event, context):
 
     #print(event)
     check_defined(event, 'event')
-    invoking_event = json.loads(event['invokingEvent'])
+    event = rule_runtime.InvocationContext.from_event(event)
+    invoking_event = event.invoking_event
     rule_parameters = {}
     if 'ruleParameters' in event:
         rule_parameters = json.loads(event['ruleParameters'])
@@ -332,35 +370,34 @@ def lambda_handler(event, context):
     evaluations = []
     latest_evaluations = []
 
-    if not compliance_result:
-        latest_evaluations.append(build_evaluation(event['accountId'], "NOT_APPLICABLE", event, resource_type='AWS::IAM::User'))
-        evaluations = clean_up_old_evaluations(latest_evaluations, event)
-    elif isinstance(compliance_result, str):
-        if configuration_item:
-            evaluations.append(build_evaluation_from_config_item(configuration_item, compliance_result))
+    # An Evaluation built from an invalid compliance type or resource raises a ValueError.
+    try:
+        if not compliance_result:
+            latest_evaluations.append(build_evaluation(event['accountId'], "NOT_APPLICABLE", event, resource_type='AWS::IAM::User'))
+            evaluations = clean_up_old_evaluations(latest_evaluations, event)
+        elif isinstance(compliance_result, str):
+            if configuration_item:
+                evaluations.append(build_evaluation_from_config_item(configuration_item, compliance_result))
+            else:
+                evaluations.append(build_evaluation(event['accountId'], compliance_result, event, resource_type=DEFAULT_RESOURCE_TYPE))
+        elif isinstance(compliance_result, list):
+            latest_evaluations = [evaluation for evaluation in compliance_result if rule_runtime.is_valid_evaluation(evaluation)]
+            evaluations = clean_up_old_evaluations(latest_evaluations, event)
+        elif isinstance(compliance_result, (dict, rule_runtime.Evaluation)):
+            if rule_runtime.is_valid_evaluation(compliance_result):
+                evaluations.append(compliance_result)
+        elif rule_runtime.is_evaluation_stream(compliance_result):
+            # Evaluations yielded by evaluate_compliance() are sent while they are produced
+            evaluations = rule_runtime.stream_evaluations(
+                AWS_CONFIG_CLIENT,
+                event['configRuleName'],
+                compliance_result,
+                lambda resource_id: build_evaluation(resource_id, "NOT_APPLICABLE", event),
+                lambda: build_evaluation(event['accountId'], "NOT_APPLICABLE", event, resource_type='AWS::IAM::User'))
         else:
-            evaluations.append(build_evaluation(event['accountId'], compliance_result, event, resource_type=DEFAULT_RESOURCE_TYPE))
-    elif isinstance(compliance_result, list):
-        for evaluation in compliance_result:
-            missing_fields = False
-            for field in ('ComplianceResourceType', 'ComplianceResourceId', 'ComplianceType', 'OrderingTimestamp'):
-                if field not in evaluation:
-                    print("Missing " + field + " from custom evaluation.")
-                    missing_fields = True
-
-            if not missing_fields:
-                latest_evaluations.append(evaluation)
-        evaluations = clean_up_old_evaluations(latest_evaluations, event)
-    elif isinstance(compliance_result, dict):
-        missing_fields = False
-        for field in ('ComplianceResourceType', 'ComplianceResourceId', 'ComplianceType', 'OrderingTimestamp'):
-            if field not in compliance_result:
-                print("Missing " + field + " from custom evaluation.")
-                missing_fields = True
-        if not missing_fields:
-            evaluations.append(compliance_result)
-    else:
-        evaluations.append(build_evaluation_from_config_item(configuration_item, 'NOT_APPLICABLE'))
+            evaluations.append(build_evaluation_from_config_item(configuration_item, 'NOT_APPLICABLE'))
+    except ValueError as ex:
+        return build_internal_error_response(str(ex), str(ex))
 
     # Put together the request that reports the evaluation status
     result_token = event['resultToken']
@@ -370,14 +407,22 @@ def lambda_handler(event, context):
         test_mode = True
 
     # Invoke the Config API to report the result of the evaluation
-    evaluation_copy = []
-    evaluation_copy = evaluations[:]
-    while evaluation_copy:
-        AWS_CONFIG_CLIENT.put_evaluations(Evaluations=evaluation_copy[:100], ResultToken=result_token, TestMode=test_mode)
-        del evaluation_copy[:100]
+    try:
+        metrics = rule_runtime.put_evaluations(AWS_CONFIG_CLIENT, evaluations, result_token, test_mode)
+    except rule_runtime.EvaluationStreamError as ex:
+        # The streamed evaluations are produced while they are sent, so their errors surface here.
+        return build_stream_error_response(ex.error)
 
     # Used solely for RDK test to be able to test Lambda function
-    return evaluations
+    return rule_runtime.build_handler_response(evaluations, metrics)
+
+def build_stream_error_response(exception):
+    """Return the error dictionary of an error raised while the streamed evaluations were produced and sent."""
+    if isinstance(exception, botocore.exceptions.ClientError):
+        if is_internal_error(exception):
+            return build_internal_error_response("Unexpected error while completing API request", str(exception))
+        return build_error_response("Customer error while making API request", str(exception), exception.response['Error']['Code'], exception.response['Error']['Message'])
+    return build_internal_error_response(str(exception), str(exception))
 
 def is_internal_error(exception):
     return ((not isinstance(exception, botocore.exceptions.ClientError)) or exception.response['Error']['Code'].startswith('5')
@@ -3,42 +3,45 @@
 # Description: Checks that all instances block access to the specified ports.
 #
 # Trigger Type: Change Triggered
-# Scope of Changes: EC2:Instance
+# Scope of Changes: EC2:Instance, EC2:SecurityGroup (a group change refreshes its cached permissions)
 # Accepted Parameters: examplePort1, exampleRange1, examplePort2, ...
 # Example Values: 8080, 1-1024, 2375, ...
+#
+# Deployment: the function imports rule_runtime, deploy the zip built by
+# "python -m rule_runtime.package ec2-exposed-instance.py", or attach the rule_runtime layer (see rule_runtime/README.md).
 
 
 import json
 import boto3
+import rule_runtime
 
 
 APPLICABLE_RESOURCES = ["AWS::EC2::Instance"]
 
+# Security group permissions, kept between the invocations of a warm container.
+security_group_cache = rule_runtime.SecurityGroupCache()
+
 
-def expand_range(ports):
+def port_range(ports):
     if "-" in ports:
-        return range(int(ports.split("-")[0]), int(ports.split("-")[1])+1)
+        return int(ports.split("-")[0]), int(ports.split("-")[1])
     else:
-        return [int(ports)]
+        return int(ports), int(ports)
 
 
 def find_exposed_ports(ip_permissions):
-    exposed_ports = []
-    for permission in ip_permissions:
+    return rule_runtime.PortIntervals(
+        rule_runtime.permission_port_range(permission)
+        for permission in ip_permissions
         if next((r for r in permission["IpRanges"]
-                if "0.0.0.0/0" in r["CidrIp"]), None):
-                    exposed_ports.extend(range(permission["FromPort"],
-                                               permission["ToPort"]+1))
-    return exposed_ports
+                if "0.0.0.0/0" in r["CidrIp"]), None))
 
 
 def find_violation(ip_permissions, forbidden_ports):
     exposed_ports = find_exposed_ports(ip_permissions)
     for forbidden in forbidden_ports:
-        ports = expand_range(forbidden_ports[forbidden])
-        for port in ports:
-            if port in exposed_ports:
-                return "A forbidden port is exposed to the internet."
+        if exposed_ports.overlaps(*port_range(forbidden_ports[forbidden])):
+            return "A forbidden port is exposed to the internet."
 
     return None
 
@@ -65,14 +68,13 @@ def evaluate_compliance(configuration_item, rule_parameters):
             "annotation": "The instance doesn't pertain to any security groups."
         }
 
-    ec2 = boto3.resource("ec2")
+    group_permissions = security_group_cache.get_ip_permissions(
+        rule_runtime.get_client("ec2"),
+        [security_group["groupId"] for security_group in security_groups]
+    )
     for security_group in security_groups:
-        ip_permissions = ec2.SecurityGroup(
-                                           security_group["groupId"]
-                                          ).ip_permissions
-
         violation = find_violation(
-            ip_permissions,
+            group_permissions[security_group["groupId"]],
             rule_parameters
         )
 
@@ -93,6 +95,7 @@ def lambda_handler(event, context):
     invoking_event = json.loads(event["invokingEvent"])
     configuration_item = invoking_event["configurationItem"]
     rule_parameters = json.loads(event["ruleParameters"])
+    security_group_cache.observe(configuration_item)
 
     result_token = "No token found."
     if "resultToken" in event:
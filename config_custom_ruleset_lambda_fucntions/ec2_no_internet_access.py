@@ -7,15 +7,16 @@
 # Optional Parameter: None
 # Example Value: N/A
 #
-# Requires additional AWS Config permissions for GetResourceConfigHistory
-
-from __future__ import print_function
+# Requires additional AWS Config permissions for GetResourceConfigHistory and BatchGetResourceConfig
+#
+# Deployment: the function imports rule_runtime, deploy the zip built by
+# "python -m rule_runtime.package ec2_no_internet_access.py", or attach the rule_runtime layer (see rule_runtime/README.md).
 
 import json
-import boto3
+import rule_runtime
 
-aws_config = boto3.client('config')
-aws_ec2 = boto3.client('ec2')
+# Related configuration items, kept between the invocations of a warm container.
+related_items = rule_runtime.ConfigItemResolver()
 
 # this is a utility class for parsing config rules events. RaiseInternetConnectivity inherhits from it
 class ConfigRule:
@@ -45,20 +46,18 @@ class ConfigRule:
          result.append(i)
     return result  
     
-  def get_related_configuration_item(self, relationship):
-    result = aws_config.get_resource_config_history(
-      resourceType=relationship['resourceType'],
-      resourceId=relationship['resourceId'],
-      limit=1,
-    )
-    item = result['configurationItems'][0]
-    
-    if item.has_key('configuration'):
-      item['configuration'] = json.loads(item['configuration'])
+  def get_related_configuration_item(self, relationship, with_relationships=False):
+    item = related_items.resolve_one(rule_runtime.get_client('config'), relationship, with_relationships)
+    if item is None:
+      raise Exception('Related configuration item not found', relationship)
     return item
+
+  def get_related_configuration_items(self, relationships):
+    items = related_items.resolve(rule_runtime.get_client('config'), relationships)
+    return [i for i in items if i is not None]
     
   def put_evaluations(self, compliance, resultToken):
-    aws_config.put_evaluations(
+    rule_runtime.get_client('config').put_evaluations(
       Evaluations=[
           {
             'ComplianceResourceType': self.configurationItem['resourceType'],
@@ -115,10 +114,10 @@ class RaiseInternetConnectivity(ConfigRule):
         route_table = self.get_related_configuration_item(self.find_relationships_by_type('AWS::EC2::RouteTable').pop())
       except:
         # no routing table associated, get main routing table of VPC
-        vpc = self.get_related_configuration_item(self.find_relationships_by_type('AWS::EC2::VPC').pop())
+        vpc = self.get_related_configuration_item(self.find_relationships_by_type('AWS::EC2::VPC').pop(), with_relationships=True)
         route_tables = self.find_relationships_by_type('AWS::EC2::RouteTable', vpc['relationships'])
-        for i in route_tables:
-          r = self.get_related_configuration_item(i)
+        # one batch for all the route tables of the VPC, most of them already cached in a burst of subnet changes
+        for r in self.get_related_configuration_items(route_tables):
           if r['configuration']['associations'][0]['main']:
             route_table = r
             break
@@ -161,6 +160,9 @@ def lambda_handler(event, context):
     rule = RaiseInternetConnectivity(configurationItem)
   except:
     raise Exception('Could not process configuration item', configurationItem)
+
+  # a newer state of a cached route table, VPC or subnet replaces the cached one
+  related_items.observe(configurationItem)
   
   compliance = rule.evaluate_compliance()
  
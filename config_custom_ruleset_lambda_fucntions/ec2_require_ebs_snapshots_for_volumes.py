@@ -5,11 +5,15 @@
 # Scope: Volumes
 # Required Parameters: requiredSnapshotFrequencyHours
 # Example Value: 10
+#
+# Deployment: the function imports rule_runtime, deploy the zip built by
+# "python -m rule_runtime.package ec2_require_ebs_snapshots_for_volumes.py", or attach the rule_runtime layer (see rule_runtime/README.md).
 
 import boto3, botocore
 import json
 import logging
 from datetime import tzinfo, datetime, timedelta
+import rule_runtime
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -99,20 +103,7 @@ def retrieve_snapshots_for_volume(volume):
 
 # List current volumes from AWSConfig
 def list_config_discovered_volumes():
-    volumes = []
-    ldr_pagination_token = ''
-    while True:
-        discovered_volumes_response = config.list_discovered_resources(
-            resourceType='AWS::EC2::Volume',
-            nextToken=ldr_pagination_token
-        )
-        volumes.extend(discovered_volumes_response['resourceIdentifiers'])
-        if 'nextToken' in discovered_volumes_response:
-            ldr_pagination_token = discovered_volumes_response['nextToken']
-        else:
-            break
-    
-    return volumes
+    return list(rule_runtime.paginate(config, config.list_discovered_resources, resourceType='AWS::EC2::Volume'))
 
 # Get the most recent state of the volume from AWSConfig
 def get_latest_state(volume):
@@ -140,9 +131,6 @@ def lambda_handler(event, context):
     else:
         raise Exception('Unexpected message type ' + str(invoking_event))
     
-    # Report Evaluations to the AWSConfig service
-    response = config.put_evaluations(
-        Evaluations = evaluations,
-        ResultToken = event['resultToken'])
-    if 'FailedEvaluations' in response and response['FailedEvaluations']:
-        raise Exception('Failed to report all evaluations successfully to the AWSConfig service. Failed: ' + str(response['FailedEvaluations'])
+    # Report Evaluations to the AWSConfig service, in batches of 100, raising when some are still rejected
+    rule_runtime.put_evaluations(config, evaluations, event['resultToken'])
+
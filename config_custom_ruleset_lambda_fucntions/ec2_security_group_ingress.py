@@ -9,6 +9,9 @@
 # the required permissions as specificed in the REQUIRED_PERMISSIONS variable below.   If so, the Lambda
 # function adds or removes ingress ports as needed.  Egress rules are not checked.
 #
+# The function imports rule_runtime: deploy the zip built by
+# "python -m rule_runtime.package ec2_security_group_ingress.py", or attach the rule_runtime layer (see rule_runtime/README.md).
+#
 # Your Lambda function execution role will need to have a policy that provides the appropriate
 # permissions.  Here is a policy that you can consider.  You should validate this for your own
 # environment
@@ -45,6 +48,7 @@
 import boto3
 import botocore
 import json
+import rule_runtime
 
  
 APPLICABLE_RESOURCES = ["AWS::EC2::SecurityGroup"]
@@ -78,7 +82,7 @@ REQUIRED_PERMISSIONS = [
 # All keys are stored in lower case.  Only boolean and numeric keys are stored.
 
 def normalize_parameters(rule_parameters):
-    for key, value in rule_parameters.iteritems():
+    for key, value in list(rule_parameters.items()):
         normalized_key=key.lower()
         normalized_value=value.lower()
 
@@ -146,9 +150,11 @@ def evaluate_compliance(configuration_item, debug_enabled):
     if debug_enabled:
         print("security group definition: ", json.dumps(response, indent=2))
 
+    # Compare the permissions as sets of atomic rules, so a change of order, grouping or
+    # description alone revokes and authorizes nothing.
+
     ip_permissions = response["SecurityGroups"][0]["IpPermissions"]
-    authorize_permissions = [item for item in REQUIRED_PERMISSIONS if item not in ip_permissions]
-    revoke_permissions = [item for item in ip_permissions if item not in REQUIRED_PERMISSIONS]
+    authorize_permissions, revoke_permissions = rule_runtime.diff_ip_permissions(ip_permissions, REQUIRED_PERMISSIONS)
 
     if authorize_permissions or revoke_permissions:
         annotation_message = "Permissions were modified."
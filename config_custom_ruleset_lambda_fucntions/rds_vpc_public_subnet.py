@@ -30,11 +30,14 @@
 #    ]
 #}
 #
+# Deployment: the function imports rule_runtime, deploy the zip built by
+# "python -m rule_runtime.package rds_vpc_public_subnet.py", or attach the rule_runtime layer (see rule_runtime/README.md).
 
 import boto3
 import botocore
 import json
 import logging
+import rule_runtime
 
 log = logging.getLogger()
 log.setLevel(logging.INFO)
@@ -44,36 +47,14 @@ def evaluate_compliance(configuration_item):
     subnet_ids   = []
     for i in configuration_item["configuration"]['dBSubnetGroup']['subnets']:
         subnet_ids.append(i['subnetIdentifier'])
-    client      = boto3.client("ec2");
-
-    response    = client.describe_route_tables()
+    network     = rule_runtime.get_network_snapshot(rule_runtime.get_client("ec2"), configuration_item["awsAccountId"], ("route_tables",),
+                                                    not_before=configuration_item["configurationItemCaptureTime"])
 
     # If the subnet is explicitly associated to a route table, check if there
     # is a public route. If no explicit association exists, check if the main
     # route table has a public route.
 
-    private = True
-
-    for subnet_id in subnet_ids:
-        mainTableIsPublic = False
-        noExplicitAssociationFound = True
-        explicitAssocationIsPublic = False
-        for i in response['RouteTables']:
-            if i['VpcId'] == vpc_id:
-                for j in i['Associations']:
-                    if j['Main'] == True:
-                        for k in i['Routes']:
-                            if k['DestinationCidrBlock'] == '0.0.0.0/0' or k['GatewayId'].startswith('igw-'):
-                                mainTableIsPublic = True
-                    else:
-                        if j['SubnetId'] == subnet_id:
-                            noExplicitAssociationFound = False
-                            for k in i['Routes']:
-                                if k['DestinationCidrBlock'] == '0.0.0.0/0' or k['GatewayId'].startswith('igw-'):
-                                    explicitAssocationIsPublic = True
-
-        if (mainTableIsPublic and noExplicitAssociationFound) or explicitAssocationIsPublic:
-            private = False
+    private = not any(network.is_public_subnet(subnet_id, vpc_id) for subnet_id in subnet_ids)
 
     if private:
         return {
@@ -0,0 +1,30 @@
+# pylint: disable=invalid-name
+# pylint: enable=invalid-name
+"""
+Shared runtime of the RDK Config rules.
+
+Deploy this package next to the rule code (or as a Lambda layer) and call it from the
+rule helpers instead of copying the boilerplate in every rule.
+"""
+
+from rule_runtime.authorization import (AuthorizationSnapshot, clear_authorization_snapshots, get_authorization_snapshot,
+                                        get_entity_authorization)
+from rule_runtime.clients import clear_client_pool, get_assume_role_credentials, get_client, set_client_factory
+from rule_runtime.context import InvocationContext
+from rule_runtime.credential_report import CredentialReport, clear_credential_reports, get_credential_report
+from rule_runtime.credentials import CredentialCache
+from rule_runtime.debuglog import RuleLogger, log
+from rule_runtime.delta import DeltaReporter, LocalFingerprintStore, MemoryFingerprintStore
+from rule_runtime.evaluations import (Evaluation, EvaluationStreamError, build_handler_response, clean_up_old_evaluations,
+                                      is_evaluation_stream, is_valid_evaluation, iter_stale_evaluations, stream_evaluations)
+from rule_runtime.instrumentation import ApiCallStats, get_api_call_stats, instrument_handler, reset_api_call_stats
+from rule_runtime.ip_permissions import canonical_ip_permissions, compose_ip_permissions, diff_ip_permissions
+from rule_runtime.metrics import build_emf_record, emit_emf_record
+from rule_runtime.network import NetworkSnapshot, clear_network_snapshots, get_network_snapshot
+from rule_runtime.paginator import get_pagination_stats, paginate, reset_pagination_stats
+from rule_runtime.policy_analysis import PolicyAnalysisCache, document_hash
+from rule_runtime.policy_evaluator import FULL_ADMIN, CompiledPolicy, PatternTrie, compile_policy, service_admin
+from rule_runtime.ports import PortIntervals, permission_port_range
+from rule_runtime.relationships import ConfigItemResolver
+from rule_runtime.security_groups import SecurityGroupCache
+from rule_runtime.submitter import EvaluationSubmissionError, iter_batches, put_evaluations
@@ -0,0 +1,262 @@
+# pylint: disable=invalid-name
+# pylint: enable=invalid-name
+"""
+Shared snapshot of the IAM users, groups, roles and policies of an account.
+
+The IAM rules read, for every entity, its inline policies, its attached managed policies and the
+default version of each of them, with one call per policy. get_authorization_snapshot() reads the
+whole account with get_account_authorization_details instead, one paginated walk per kind of entity
+run in parallel, and indexes it by entity name and policy ARN. The snapshot is kept in memory and in
+a gzipped JSON file under /tmp for ttl_seconds, so the next invocations, and the other IAM rules run
+by the same container, reuse it:
+
+    authorization = rule_runtime.get_authorization_snapshot(iam_client, event['accountId'])
+    for policy in authorization.attached_policies('Role', role_name):
+        document = authorization.policy_document(policy['PolicyArn'])
+
+A change-triggered rule evaluates a single entity, and a snapshot read before the change does not
+hold it as it is now. Walking the whole account again for every change would cost far more than
+reading the entity, so the rule calls get_entity_authorization() with the configurationItemCaptureTime
+as not_before instead: the snapshot kept by the container is used when it was read after the change,
+and a snapshot of the entity alone, read with a few targeted calls, otherwise:
+
+    authorization = rule_runtime.get_entity_authorization(iam_client, event['accountId'], 'Role', role_name,
+                                                          not_before=configuration_item['configurationItemCaptureTime'])
+
+A scheduled invocation evaluates every entity, and reads them all from get_authorization_snapshot():
+
+    for role in authorization.entities('Role'):
+        ...
+
+The snapshot of an entity holds no managed policy, the rules read their documents from IAM.
+Only the default version of the managed policies is kept.
+"""
+
+import concurrent.futures
+import datetime
+import glob
+import gzip
+import json
+import os
+import threading
+import time
+
+from botocore.utils import parse_timestamp
+
+from rule_runtime.delta import STATE_DIRECTORY
+from rule_runtime.paginator import paginate
+
+# Kind of entity -> (get_account_authorization_details filter, detail list, name key, inline policy list)
+# The targeted IAM operations of a kind of entity are named after its lower-cased filter (list_role_policies...).
+ENTITY_TYPES = {
+    'User': ('User', 'UserDetailList', 'UserName', 'UserPolicyList'),
+    'Group': ('Group', 'GroupDetailList', 'GroupName', 'GroupPolicyList'),
+    'Role': ('Role', 'RoleDetailList', 'RoleName', 'RolePolicyList')
+}
+
+POLICY_FILTERS = ['LocalManagedPolicy', 'AWSManagedPolicy']
+
+# A snapshot older than this is read again, overridden by the RULE_RUNTIME_AUTHORIZATION_TTL_SECONDS environment variable.
+DEFAULT_TTL_SECONDS = int(os.environ.get('RULE_RUNTIME_AUTHORIZATION_TTL_SECONDS', 300))
+
+# Guards _SNAPSHOTS, and makes the concurrent callers of an account wait for a single fetch.
+_SNAPSHOTS_LOCK = threading.Lock()
+
+# account_id -> AuthorizationSnapshot
+_SNAPSHOTS = {}
+
+class AuthorizationSnapshot:
+    """Users, groups, roles and managed policies of an account, indexed on first use.
+
+    Keyword arguments:
+    details -- the detail lists, keyed like the get_account_authorization_details response ('UserDetailList', 'Policies'...)
+    fetched_at -- the time the details were read, in seconds since the epoch (default 0, never)
+    """
+
+    def __init__(self, details=None, fetched_at=0):
+        self.details = dict(details or {})
+        self.fetched_at = fetched_at
+        self._indexes = {}
+
+    @classmethod
+    def from_account(cls, iam_client):
+        """Read the entities and the managed policies in parallel and return them as a new snapshot."""
+        now = time.time()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(ENTITY_TYPES) + 1) as executor:
+            futures = {detail_list: executor.submit(_read_details, iam_client, detail_list, [entity_filter])
+                       for entity_filter, detail_list, _, _ in ENTITY_TYPES.values()}
+            futures['Policies'] = executor.submit(_read_details, iam_client, 'Policies', POLICY_FILTERS)
+            details = {detail_list: future.result() for detail_list, future in futures.items()}
+        return cls(details, now)
+
+    @classmethod
+    def fetch_entity(cls, iam_client, entity_type, name):
+        """Read the inline and attached managed policies of a single entity and return them as a new snapshot.
+
+        Keyword arguments:
+        iam_client -- the boto iam client of the account
+        entity_type -- 'User', 'Group' or 'Role'
+        name -- the name of the entity
+        """
+        now = time.time()
+        entity_filter, detail_list, name_key, inline_list = ENTITY_TYPES[entity_type]
+        operation_prefix = entity_filter.lower()
+        name_parameter = {name_key: name}
+        inline_policies = [{'PolicyName': policy_name,
+                            'PolicyDocument': getattr(iam_client, 'get_{}_policy'.format(operation_prefix))(
+                                PolicyName=policy_name, **name_parameter)['PolicyDocument']}
+                           for policy_name in paginate(iam_client, 'list_{}_policies'.format(operation_prefix), **name_parameter)]
+        attached_policies = list(paginate(iam_client, 'list_attached_{}_policies'.format(operation_prefix), **name_parameter))
+        entity = dict(name_parameter, **{inline_list: inline_policies, 'AttachedManagedPolicies': attached_policies})
+        return cls({detail_list: [entity]}, now)
+
+    @classmethod
+    def from_file(cls, path):
+        """Return the snapshot saved in the file, an empty one when the file is missing or unreadable."""
+        try:
+            with gzip.open(path, 'rt') as snapshot_file:
+                content = json.load(snapshot_file)
+            return cls(content['details'], content['fetched_at'])
+        except (IOError, ValueError, KeyError):
+            return cls()
+
+    def to_file(self, path):
+        """Replace the file content by the snapshot, atomically."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = path + '.tmp'
+        with gzip.open(temp_path, 'wt') as snapshot_file:
+            json.dump({'details': self.details, 'fetched_at': self.fetched_at}, snapshot_file, separators=(',', ':'))
+        os.replace(temp_path, path)
+
+    def is_stale(self, ttl_seconds=DEFAULT_TTL_SECONDS, not_before=None):
+        """Return True when the snapshot is older than ttl_seconds, or was read before not_before.
+
+        Keyword arguments:
+        ttl_seconds -- the age after which the snapshot is stale (default DEFAULT_TTL_SECONDS)
+        not_before -- a datetime, an ISO 8601 string or seconds since the epoch, the snapshot must be read after (default None)
+        """
+        if self.fetched_at < time.time() - ttl_seconds:
+            return True
+        return not_before is not None and self.fetched_at < _epoch_seconds(not_before)
+
+    def entity(self, entity_type, name):
+        """Return the detail dictionary of the 'User', 'Group' or 'Role' named name, None when the account has none."""
+        return self._entities(entity_type).get(name)
+
+    def entities(self, entity_type):
+        """Return the detail dictionaries of every 'User', 'Group' or 'Role' of the account."""
+        return list(self._entities(entity_type).values())
+
+    def user_details(self, user_name):
+        """Return the UserDetail of the user (with its GroupList and PermissionsBoundary), None when the account has none."""
+        return self.entity('User', user_name)
+
+    def group_details(self, group_name):
+        """Return the GroupDetail of the group, None when the account has none."""
+        return self.entity('Group', group_name)
+
+    def role_details(self, role_name):
+        """Return the RoleDetail of the role, None when the account has none."""
+        return self.entity('Role', role_name)
+
+    def inline_policies(self, entity_type, name):
+        """Return the inline policies of the entity, as dictionaries of 'PolicyName' and 'PolicyDocument'."""
+        entity = self.entity(entity_type, name) or {}
+        return entity.get(ENTITY_TYPES[entity_type][3], [])
+
+    def attached_policies(self, entity_type, name):
+        """Return the managed policies attached to the entity, as dictionaries of 'PolicyName' and 'PolicyArn'."""
+        entity = self.entity(entity_type, name) or {}
+        return entity.get('AttachedManagedPolicies', [])
+
+    def policy(self, policy_arn):
+        """Return the managed policy detail, with only its default version in PolicyVersionList, None when unknown."""
+        if 'policies' not in self._indexes:
+            self._indexes['policies'] = {policy['Arn']: policy for policy in self.details.get('Policies', [])}
+        return self._indexes['policies'].get(policy_arn)
+
+    def policy_document(self, policy_arn):
+        """Return the document of the default version of the managed policy, None when the policy is unknown."""
+        policy = self.policy(policy_arn)
+        if not policy or not policy.get('PolicyVersionList'):
+            return None
+        return policy['PolicyVersionList'][0]['Document']
+
+    def _entities(self, entity_type):
+        if entity_type not in self._indexes:
+            _, detail_list, name_key, _ = ENTITY_TYPES[entity_type]
+            self._indexes[entity_type] = {entity[name_key]: entity for entity in self.details.get(detail_list, [])}
+        return self._indexes[entity_type]
+
+def get_authorization_snapshot(iam_client, account_id, ttl_seconds=DEFAULT_TTL_SECONDS, not_before=None):
+    """Return the AuthorizationSnapshot of the account of the client, read again when stale.
+
+    Keyword arguments:
+    iam_client -- the boto iam client of the account, usually get_client('iam', event)
+    account_id -- the account of the client, usually event['accountId']
+    ttl_seconds -- the age after which the snapshot is read again (default DEFAULT_TTL_SECONDS)
+    not_before -- the time the snapshot must be read after, usually the configurationItemCaptureTime of a change (default None)
+    """
+    path = _snapshot_path(account_id)
+    with _SNAPSHOTS_LOCK:
+        snapshot = _SNAPSHOTS.get(account_id) or AuthorizationSnapshot.from_file(path)
+        if snapshot.is_stale(ttl_seconds, not_before):
+            snapshot = AuthorizationSnapshot.from_account(iam_client)
+            snapshot.to_file(path)
+        _SNAPSHOTS[account_id] = snapshot
+        return snapshot
+
+def get_entity_authorization(iam_client, account_id, entity_type, name, ttl_seconds=DEFAULT_TTL_SECONDS, not_before=None):
+    """Return the AuthorizationSnapshot kept for the account when still fresh, else a snapshot of the entity alone.
+
+    The account is never walked: a snapshot older than ttl_seconds or read before not_before is replaced by targeted
+    calls reading the entity.
+
+    Keyword arguments:
+    iam_client -- the boto iam client of the account, usually get_client('iam', event)
+    account_id -- the account of the client, usually event['accountId']
+    entity_type -- 'User', 'Group' or 'Role'
+    name -- the name of the entity
+    ttl_seconds -- the age after which the snapshot of the account is not used (default DEFAULT_TTL_SECONDS)
+    not_before -- the time the snapshot must be read after, usually the configurationItemCaptureTime of a change (default None)
+    """
+    with _SNAPSHOTS_LOCK:
+        snapshot = _SNAPSHOTS.get(account_id) or AuthorizationSnapshot.from_file(_snapshot_path(account_id))
+        if not snapshot.is_stale(ttl_seconds, not_before):
+            _SNAPSHOTS[account_id] = snapshot
+            return snapshot
+    return AuthorizationSnapshot.fetch_entity(iam_client, entity_type, name)
+
+def clear_authorization_snapshots():
+    """Forget the snapshots kept in memory and delete their files, the next get_authorization_snapshot() calls read IAM again."""
+    with _SNAPSHOTS_LOCK:
+        _SNAPSHOTS.clear()
+        for path in glob.glob(_snapshot_path('*')):
+            os.remove(path)
+
+def _snapshot_path(account_id):
+    return os.path.join(STATE_DIRECTORY, 'authorization-{}.json.gz'.format(account_id))
+
+def _read_details(iam_client, detail_list, filters):
+    items = []
+    for item in paginate(iam_client, 'get_account_authorization_details', result_key=detail_list,
+                         call_site='authorization.' + detail_list, Filter=filters):
+        if detail_list == 'Policies':
+            # This drops the versions which are not the default one, never read by the rules.
+            item = dict(item, PolicyVersionList=[version for version in item.get('PolicyVersionList', [])
+                                                 if version.get('IsDefaultVersion')])
+        items.append(item)
+    # This gives the fresh details the same JSON types (timestamps as strings) as the ones loaded from the file.
+    return json.loads(json.dumps(items, default=_json_default))
+
+def _epoch_seconds(timestamp):
+    if isinstance(timestamp, str):
+        timestamp = parse_timestamp(timestamp)
+    if isinstance(timestamp, datetime.datetime):
+        return timestamp.timestamp()
+    return timestamp
+
+def _json_default(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return str(value)
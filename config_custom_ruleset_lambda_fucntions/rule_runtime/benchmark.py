@@ -0,0 +1,353 @@
+# pylint: disable=invalid-name
+# pylint: enable=invalid-name
+"""
+Benchmark of the periodic rules against synthetic accounts of 1k, 10k and 100k resources.
+
+Each rule runs through rule_runtime.replay with its clients answered by a SyntheticAccount,
+which generates the users, access keys, MFA devices, credential report, instances, AMIs, load balancers,
+listeners, listener rules, VPCs, flow logs, VPC endpoints, REST APIs, trails and file systems
+on demand, paginated like AWS. Every (rule, size) runs in a process of its own, so the peak RSS
+is the one of that run, and is stopped at the Lambda timeout:
+
+    python -m rule_runtime.benchmark --sizes 1000 10000 --rules IAM_ACCESS_KEY_ROTATED AMI_OUTDATED_CHECK
+"""
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import multiprocessing
+import os
+import re
+import resource
+import sys
+import time
+
+from rule_runtime.replay import (DEFAULT_PUT_EVALUATIONS_RESPONSE, FixtureClientFactory, build_event,
+                                 build_invoking_event, replay)
+
+BENCHMARK_SIZES = (1000, 10000, 100000)
+
+# The Lambda timeout, a run taking longer would be killed in production.
+LAMBDA_TIMEOUT_SECONDS = 900
+
+RULES_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Rule -> (code path relative to RULES_DIRECTORY, rule parameters)
+BENCHMARK_RULES = {
+    'AMI_OUTDATED_CHECK': ('AMI_OUTDATED_CHECK/AMI_OUTDATED_CHECK.py',
+                           {'NumberOfDays': '90', 'WhitelistedAmis': '', 'WhitelistedInstances': ''}),
+    'API_GW_PRIVATE_RESTRICTED': ('API_GW_PRIVATE_RESTRICTED/API_GW_PRIVATE_RESTRICTED.py', {}),
+    'ALB_HTTP_TO_HTTPS_REDIRECTION_CHECK': ('Custom_config_ALB_http_to_https_redirection/ALB_HTTP_TO_HTTPS_REDIRECTION_CHECK.py', {}),
+    'CLOUDTRAIL_ENABLED_V2': ('CLOUDTRAIL_ENABLED_V2/CLOUDTRAIL_ENABLED_V2.py', {}),
+    'EFS_ENCRYPTED_CHECK': ('EFS_ENCRYPTED_CHECK/EFS_ENCRYPTED_CHECK.py',
+                            {'KmsKeyId': 'arn:aws:kms:us-east-1:123456789012:key/benchmark'}),
+    'IAM_ACCESS_KEY_ROTATED': ('IAM_ACCESS_KEY_ROTATED/IAM_ACCESS_KEY_ROTATED.py', {'KeyActiveTimeOutInDays': '90'}),
+    'IAM_NO_USER': ('IAM_NO_USER/IAM_NO_USER.py', {}),
+    'IAM_USER_MATCHES_REGEX_PATTERN': ('IAM_USER_MATCHES_REGEX_PATTERN/IAM_USER_MATCHES_REGEX_PATTERN.py', {'regexPattern': r'user-\d*[02468]$'}),
+    'IAM_USER_MFA_ENABLED': ('IAM_USER_MFA_ENABLED/IAM_USER_MFA_ENABLED.py', {}),
+    'VPC_FLOW_LOGS_ENABLED_CUSTOM': ('VPC_FLOW_LOGS_ENABLED_CUSTOM/VPC_FLOW_LOGS_ENABLED_CUSTOM.py', {}),
+}
+
+# (service, operation) -> (result key, input token, output token, limit key, default page size, max page size)
+PAGINATION = {
+    ('apigateway', 'get_rest_apis'): ('items', 'position', 'position', 'limit', 25, 500),
+    ('cloudtrail', 'describe_trails'): ('trailList', None, None, None, None, None),
+    ('config', 'get_compliance_details_by_config_rule'): ('EvaluationResults', 'NextToken', 'NextToken', 'Limit', 100, 100),
+    ('ec2', 'describe_flow_logs'): ('FlowLogs', 'NextToken', 'NextToken', 'MaxResults', 1000, 1000),
+    ('ec2', 'describe_images'): ('Images', 'NextToken', 'NextToken', 'MaxResults', 1000, 1000),
+    ('ec2', 'describe_instances'): ('Reservations', 'NextToken', 'NextToken', 'MaxResults', 1000, 1000),
+    ('ec2', 'describe_vpc_endpoints'): ('VpcEndpoints', 'NextToken', 'NextToken', 'MaxResults', 1000, 1000),
+    ('ec2', 'describe_vpcs'): ('Vpcs', 'NextToken', 'NextToken', 'MaxResults', 1000, 1000),
+    ('efs', 'describe_file_systems'): ('FileSystems', 'Marker', 'NextMarker', 'MaxItems', 100, 100),
+    ('elbv2', 'describe_listeners'): ('Listeners', 'Marker', 'NextMarker', 'PageSize', 400, 400),
+    ('elbv2', 'describe_load_balancers'): ('LoadBalancers', 'Marker', 'NextMarker', 'PageSize', 400, 400),
+    ('elbv2', 'describe_rules'): ('Rules', 'Marker', 'NextMarker', 'PageSize', 400, 400),
+    ('iam', 'list_access_keys'): ('AccessKeyMetadata', 'Marker', 'Marker', 'MaxItems', 100, 1000),
+    ('iam', 'list_mfa_devices'): ('MFADevices', 'Marker', 'Marker', 'MaxItems', 100, 1000),
+    ('iam', 'list_users'): ('Users', 'Marker', 'Marker', 'MaxItems', 100, 1000),
+}
+
+ACCOUNT_ID = '123456789012'
+NOW = datetime.datetime.now(datetime.timezone.utc)
+
+CREDENTIAL_REPORT_COLUMNS = (
+    'user', 'arn', 'user_creation_time', 'password_enabled', 'password_last_used', 'password_last_changed',
+    'password_next_rotation', 'mfa_active', 'access_key_1_active', 'access_key_1_last_rotated', 'access_key_1_last_used_date',
+    'access_key_1_last_used_region', 'access_key_1_last_used_service', 'access_key_2_active', 'access_key_2_last_rotated',
+    'access_key_2_last_used_date', 'access_key_2_last_used_region', 'access_key_2_last_used_service', 'cert_1_active',
+    'cert_1_last_rotated', 'cert_2_active', 'cert_2_last_rotated'
+)
+
+class SyntheticAccount(FixtureClientFactory):
+    """Client factory answering the list/describe calls of the rules from a generated account.
+
+    The resources are built from their index when a page is requested, so the inventory itself
+    does not weigh on the measured memory. About half of them are compliant with each rule.
+
+    Keyword arguments:
+    size -- the number of resources of every type (users, instances, load balancers, VPCs...)
+    """
+
+    def __init__(self, size):
+        super().__init__(None, record_calls=False)
+        self.size = size
+
+    def _next_response(self, service_name, operation_name, params):
+        key = (service_name, operation_name)
+        if key == ('config', 'put_evaluations'):
+            return DEFAULT_PUT_EVALUATIONS_RESPONSE
+        if key not in PAGINATION:
+            return getattr(self, '_' + operation_name)(params)
+        result_key, input_token, output_token, limit_key, default_limit, max_limit = PAGINATION[key]
+        items = getattr(self, '_' + operation_name)(params)
+        if not input_token:
+            return {result_key: list(items)}
+        start = int(params.get(input_token) or 0)
+        limit = min(params.get(limit_key) or default_limit, max_limit)
+        page = items[start:start + limit]
+        response = {result_key: list(page)}
+        if start + limit < len(items):
+            response[output_token] = str(start + limit)
+            response['IsTruncated'] = True
+        elif service_name == 'iam':
+            response['IsTruncated'] = False
+        return response
+
+    # IAM
+
+    def _list_users(self, params):
+        return _Generated(self.size, lambda index: {
+            'Path': '/', 'UserName': 'user-{:06d}'.format(index), 'UserId': 'AIDA{:017d}'.format(index),
+            'Arn': 'arn:aws:iam::{}:user/user-{:06d}'.format(ACCOUNT_ID, index), 'CreateDate': NOW})
+
+    def _list_access_keys(self, params):
+        index = _index(params['UserName'])
+        return [{'UserName': params['UserName'], 'AccessKeyId': 'AKIA{:016d}{}'.format(index, key), 'Status': 'Active',
+                 'CreateDate': NOW - datetime.timedelta(days=30 + 120 * key * (index % 2))} for key in range(2)]
+
+    def _list_mfa_devices(self, params):
+        if _index(params['UserName']) % 2:
+            return []
+        return [{'UserName': params['UserName'], 'SerialNumber': 'arn:aws:iam::{}:mfa/{}'.format(ACCOUNT_ID, params['UserName']),
+                 'EnableDate': NOW}]
+
+    def _generate_credential_report(self, params):
+        return {'State': 'COMPLETE'}
+
+    def _get_credential_report(self, params):
+        # The report agrees with _list_users, _list_access_keys and _list_mfa_devices.
+        lines = [','.join(CREDENTIAL_REPORT_COLUMNS)]
+        for index in range(self.size):
+            user_name = 'user-{:06d}'.format(index)
+            row = [user_name, 'arn:aws:iam::{}:user/{}'.format(ACCOUNT_ID, user_name), NOW.isoformat(), 'false', 'N/A', 'N/A', 'N/A',
+                   'false' if index % 2 else 'true']
+            for key in range(2):
+                row += ['true', (NOW - datetime.timedelta(days=30 + 120 * key * (index % 2))).isoformat(), 'N/A', 'N/A', 'N/A']
+            row += ['false', 'N/A', 'false', 'N/A']
+            lines.append(','.join(row))
+        return {'Content': '\n'.join(lines).encode('utf-8'), 'ReportFormat': 'text/csv', 'GeneratedTime': NOW}
+
+    # EC2
+
+    def _describe_instances(self, params):
+        return _Generated(self.size, lambda index: {'Instances': [{
+            'InstanceId': 'i-{:017d}'.format(index), 'ImageId': 'ami-{:017d}'.format(index % max(self.size // 10, 1))}]})
+
+    def _describe_images(self, params):
+        return [{'ImageId': image_id, 'CreationDate': (NOW - datetime.timedelta(days=_index(image_id) % 180)).isoformat()}
+                for image_id in params.get('ImageIds', [])]
+
+    def _describe_vpcs(self, params):
+        return _Generated(self.size, lambda index: {'VpcId': 'vpc-{:017d}'.format(index), 'CidrBlock': '10.0.0.0/16'})
+
+    def _describe_flow_logs(self, params):
+        # The API names the parameter Filter, botocore accepts Filters too.
+        filters = params.get('Filter') or params.get('Filters', [])
+        vpc_ids = next((flt['Values'] for flt in filters if flt['Name'] == 'resource-id'), None)
+        if vpc_ids is None:
+            return _Generated(self.size // 2, lambda index: _flow_log('vpc-{:017d}'.format(2 * index + 1)))
+        return [_flow_log(vpc_id) for vpc_id in vpc_ids if _index(vpc_id) % 2]
+
+    def _describe_vpc_endpoints(self, params):
+        return _Generated(self.size, lambda index: {
+            'VpcEndpointId': 'vpce-{:017d}'.format(index), 'VpcId': 'vpc-{:017d}'.format(index),
+            'ServiceName': 'com.amazonaws.us-east-1.execute-api', 'VpcEndpointType': 'Interface'})
+
+    # API Gateway
+
+    def _get_rest_apis(self, params):
+        return _Generated(self.size, lambda index: {
+            'id': 'api{:07d}'.format(index), 'name': 'api-{}'.format(index),
+            'endpointConfiguration': {'types': ['PRIVATE' if index % 2 else 'REGIONAL'],
+                                      'vpcEndpointIds': ['vpce-{:017d}'.format(index)]}})
+
+    # Elastic Load Balancing
+
+    def _describe_load_balancers(self, params):
+        return _Generated(self.size, lambda index: {
+            'LoadBalancerArn': 'arn:aws:elasticloadbalancing:us-east-1:{}:loadbalancer/app/alb-{index}/{index:016d}'.format(ACCOUNT_ID, index=index),
+            'LoadBalancerName': 'alb-{}'.format(index), 'Type': 'application'})
+
+    def _describe_listeners(self, params):
+        load_balancer_arn = params['LoadBalancerArn']
+        return [{'ListenerArn': '{}/listener/{}'.format(load_balancer_arn, port), 'LoadBalancerArn': load_balancer_arn,
+                 'Port': port, 'Protocol': 'HTTP'} for port in (80, 8080)]
+
+    def _describe_rules(self, params):
+        redirect = _index(params['ListenerArn'].split('/listener/')[0]) % 2
+        actions = [{'Type': 'redirect', 'RedirectConfig': {'Protocol': 'HTTPS', 'StatusCode': 'HTTP_301'}}] if redirect else \
+            [{'Type': 'forward', 'TargetGroupArn': 'arn:aws:elasticloadbalancing:us-east-1:{}:targetgroup/tg/0'.format(ACCOUNT_ID)}]
+        return [{'RuleArn': '{}/rule/{}'.format(params['ListenerArn'], rule), 'Priority': str(rule), 'Actions': actions}
+                for rule in range(2)]
+
+    # EFS
+
+    def _describe_file_systems(self, params):
+        return _Generated(self.size, lambda index: {
+            'FileSystemId': 'fs-{:08d}'.format(index), 'Encrypted': bool(index % 2),
+            'KmsKeyId': 'arn:aws:kms:us-east-1:{}:key/{}'.format(ACCOUNT_ID, 'benchmark' if index % 4 == 1 else index)})
+
+    # CloudTrail, only the last trail is logging so every trail is looked at.
+
+    def _describe_trails(self, params):
+        return _Generated(self.size, lambda index: {
+            'Name': 'trail-{}'.format(index), 'S3BucketName': 'trail-bucket', 'IncludeGlobalServiceEvents': True,
+            'IsMultiRegionTrail': True, 'LogFileValidationEnabled': True})
+
+    def _get_trail_status(self, params):
+        return {'IsLogging': _index(params['Name']) == self.size - 1}
+
+    def _get_event_selectors(self, params):
+        return {'EventSelectors': [{'ReadWriteType': 'All', 'IncludeManagementEvents': True, 'DataResources': []}]}
+
+    # Config, no evaluation history
+
+    def _get_compliance_details_by_config_rule(self, params):
+        return []
+
+class _Generated:
+    # This sequence builds its items from their index, only for the slices that are read.
+
+    def __init__(self, size, build_item):
+        self.size = size
+        self.build_item = build_item
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, page):
+        return [self.build_item(index) for index in range(*page.indices(self.size))]
+
+    def __iter__(self):
+        return (self.build_item(index) for index in range(self.size))
+
+def _index(resource_name):
+    # This reads back the index a synthetic resource was named after, its last number (user-000042 -> 42).
+    return int(re.findall(r'\d+', resource_name)[-1])
+
+def _flow_log(vpc_id):
+    return {'FlowLogId': 'fl-{:017d}'.format(_index(vpc_id)), 'ResourceId': vpc_id, 'TrafficType': 'ALL',
+            'LogGroupName': 'flow-logs', 'FlowLogStatus': 'ACTIVE'}
+
+def benchmark_rule(rule_name, size):
+    """Run the rule once against a synthetic account of the given size and return its measures.
+
+    The returned dictionary holds the 'rule', the 'size', the 'wall_seconds', the 'api_calls' (and
+    'api_calls_by_operation'), the 'peak_rss_mb' of the process, the 'evaluations' submitted and
+    the 'evaluations_per_second' and the 'printed_mb' written to stdout by the rule.
+
+    Keyword arguments:
+    rule_name -- a key of BENCHMARK_RULES
+    size -- the number of resources of every type in the account
+    """
+    rule_path, rule_parameters = BENCHMARK_RULES[rule_name]
+    account = SyntheticAccount(size)
+    event = build_event(build_invoking_event(), rule_parameters, rule_name)
+    # The rules print their inventories, which would dominate the measure at this scale.
+    with contextlib.redirect_stdout(io.StringIO()) as output:
+        start_time = time.time()
+        result = replay(os.path.join(RULES_DIRECTORY, rule_path), None, event, factory=account)
+        wall_seconds = time.time() - start_time
+    response = result['response']
+    if isinstance(response, dict) and 'internalErrorMessage' in response:
+        raise RuntimeError('{} failed: {}'.format(rule_name, response['internalErrorDetails']))
+    return {
+        'rule': rule_name,
+        'size': size,
+        'wall_seconds': round(wall_seconds, 3),
+        'api_calls': sum(account.call_counts.values()),
+        'api_calls_by_operation': {'.'.join(key): count for key, count in sorted(account.call_counts.items())},
+        'peak_rss_mb': round(_peak_rss_bytes() / 1024 / 1024, 1),
+        'evaluations': len(result['evaluations']),
+        'evaluations_per_second': round(len(result['evaluations']) / wall_seconds, 1) if wall_seconds else None,
+        'printed_mb': round(len(output.getvalue()) / 1024 / 1024, 1)
+    }
+
+def run_benchmarks(rule_names, sizes, timeout_seconds=LAMBDA_TIMEOUT_SECONDS):
+    """Yield the measures of every (rule, size), each run in a process of its own.
+
+    A run still going after timeout_seconds is stopped and reported with 'timed_out' True.
+
+    Keyword arguments:
+    rule_names -- the keys of BENCHMARK_RULES to run
+    sizes -- the account sizes
+    timeout_seconds -- the time limit of a run (default LAMBDA_TIMEOUT_SECONDS)
+    """
+    for size in sizes:
+        for rule_name in rule_names:
+            # Not a multiprocessing.Pool: its daemonic workers cannot start the processes of the rules.
+            receiver, sender = multiprocessing.Pipe(duplex=False)
+            process = multiprocessing.Process(target=_send_benchmark, args=(rule_name, size, sender))
+            process.start()
+            sender.close()
+            try:
+                if not receiver.poll(timeout_seconds):
+                    yield {'rule': rule_name, 'size': size, 'wall_seconds': None, 'timed_out': True}
+                    continue
+                measures = receiver.recv()
+            finally:
+                process.terminate()
+                process.join()
+                receiver.close()
+            if isinstance(measures, Exception):
+                raise measures
+            measures['timed_out'] = False
+            yield measures
+
+def _send_benchmark(rule_name, size, sender):
+    try:
+        sender.send(benchmark_rule(rule_name, size))
+    except Exception as ex:
+        sender.send(ex)
+    finally:
+        sender.close()
+
+def _peak_rss_bytes():
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    return peak_rss if sys.platform == 'darwin' else peak_rss * 1024
+
+def command_line(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the periodic rules against synthetic accounts.')
+    parser.add_argument('--rules', nargs='+', default=sorted(BENCHMARK_RULES), choices=sorted(BENCHMARK_RULES))
+    parser.add_argument('--sizes', nargs='+', type=int, default=list(BENCHMARK_SIZES))
+    parser.add_argument('--timeout', type=int, default=LAMBDA_TIMEOUT_SECONDS, help='seconds before a run is stopped')
+    parser.add_argument('--json', help='also write the measures to this file')
+    args = parser.parse_args(argv)
+
+    all_measures = []
+    print('{:<38} {:>7} {:>9} {:>9} {:>8} {:>8} {:>9}'.format('rule', 'size', 'seconds', 'calls', 'rss_mb', 'evals', 'evals/s'))
+    for measures in run_benchmarks(args.rules, args.sizes, args.timeout):
+        all_measures.append(measures)
+        if measures['timed_out']:
+            print('{:<38} {:>7} {:>9}  over the {}s limit'.format(measures['rule'], measures['size'], '-', args.timeout))
+            continue
+        print('{rule:<38} {size:>7} {wall_seconds:>9} {api_calls:>9} {peak_rss_mb:>8} {evaluations:>8} {evaluations_per_second:>9}'.format(**measures))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as json_file:
+            json.dump(all_measures, json_file, indent=2)
+
+if __name__ == '__main__':
+    command_line()
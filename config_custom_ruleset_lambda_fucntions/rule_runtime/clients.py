@@ -0,0 +1,129 @@
+# pylint: disable=invalid-name
+# pylint: enable=invalid-name
+"""
+Process-wide pool of boto3 sessions and clients shared by the Config rules.
+
+Lambda keeps module globals alive between invocations of a warm container, so the
+clients built here are reused by every get_client() call of the rule instead of
+being rebuilt on each call. Clients are keyed by (service, region, role), and the
+clients of a role are rebuilt only when its cached credentials are refreshed. Every
+client is instrumented to account its API calls (see rule_runtime.instrumentation).
+"""
+
+import sys
+import threading
+
+import boto3
+import botocore
+
+from rule_runtime.credentials import CredentialCache
+from rule_runtime.instrumentation import instrument_client
+
+# Guards the session and client dictionaries below. boto3 sessions are not thread-safe
+# while creating clients, the clients themselves are.
+_POOL_LOCK = threading.RLock()
+
+# (region, role_arn) -> (boto3 session, credentials it was built with or None)
+_SESSIONS = {}
+
+# (service, region, role_arn) -> (boto3 client, credentials it was built with or None)
+_CLIENTS = {}
+
+# Name of the session used when assuming the Config execution role.
+ROLE_SESSION_NAME = "configLambdaExecution"
+
+# Callable(service, region, credentials) building the clients instead of boto3, see set_client_factory().
+_CLIENT_FACTORY = None
+
+def get_client(service, event=None, assume_role_mode=False, region=None, role_duration_seconds=None):
+    """Return a pooled boto3 client for the service. It should be used instead of directly calling boto3.client().
+
+    Keyword arguments:
+    service -- the service name used for calling the boto.client()
+    event -- the event variable given in the lambda handler, required when assume_role_mode is True
+    assume_role_mode -- True to build the client with the credentials of event["executionRoleArn"] (default False)
+    region -- the region where the client is called (default None, the Lambda region)
+    role_duration_seconds -- the DurationSeconds requested when assuming the role (default None, the STS default)
+    """
+    role_arn = event["executionRoleArn"] if assume_role_mode else None
+    credentials = None
+    if role_arn:
+        # Outside of the pool lock, so a slow AssumeRole only blocks the callers of that role.
+        credentials = _CREDENTIALS.get_credentials(role_arn, region, role_duration_seconds)
+    key = (service, region, role_arn)
+    with _POOL_LOCK:
+        pooled = _CLIENTS.get(key)
+        if pooled and pooled[1] is credentials:
+            return pooled[0]
+        if _CLIENT_FACTORY:
+            client = _CLIENT_FACTORY(service, region, credentials)
+        else:
+            client = _get_session(region, role_arn, credentials).client(service, region_name=region)
+        instrument_client(client)
+        _CLIENTS[key] = (client, credentials)
+        return client
+
+def get_assume_role_credentials(role_arn, region=None, duration_seconds=None):
+    """Assume the role and return its Credentials dictionary.
+
+    Keyword arguments:
+    role_arn -- the ARN of the role to assume, usually event["executionRoleArn"]
+    region -- the region of the STS endpoint (default None, the Lambda region)
+    duration_seconds -- the DurationSeconds of the session (default None, the STS default)
+    """
+    sts_client = get_client('sts', region=region)
+    assume_role_args = {'RoleArn': role_arn, 'RoleSessionName': ROLE_SESSION_NAME}
+    if duration_seconds:
+        assume_role_args['DurationSeconds'] = duration_seconds
+    try:
+        assume_role_response = sts_client.assume_role(**assume_role_args)
+        if 'liblogging' in sys.modules:
+            sys.modules['liblogging'].logSession(role_arn, assume_role_response)
+        return assume_role_response['Credentials']
+    except botocore.exceptions.ClientError as ex:
+        # Scrub error message for any internal account info leaks
+        print(str(ex))
+        if 'AccessDenied' in ex.response['Error']['Code']:
+            ex.response['Error']['Message'] = "AWS Config does not have permission to assume the IAM role."
+        else:
+            ex.response['Error']['Message'] = "InternalError"
+            ex.response['Error']['Code'] = "InternalError"
+        raise ex
+
+def clear_client_pool():
+    """Drop every pooled session, client and cached credentials, the next get_client() call builds new ones."""
+    with _POOL_LOCK:
+        _SESSIONS.clear()
+        _CLIENTS.clear()
+    _CREDENTIALS.invalidate()
+
+def set_client_factory(factory):
+    """Build the clients with factory(service, region, credentials) instead of boto3, or with boto3 again when None.
+
+    The pool is cleared, so no client built by the previous factory is returned afterwards. It is
+    meant for running the rules offline (see rule_runtime.replay), not for Lambda.
+
+    Keyword arguments:
+    factory -- callable(service, region, credentials) returning a boto client, or None
+    """
+    global _CLIENT_FACTORY
+    clear_client_pool()
+    _CLIENT_FACTORY = factory
+
+def _get_session(region, role_arn, credentials):
+    key = (region, role_arn)
+    pooled = _SESSIONS.get(key)
+    if pooled and pooled[1] is credentials:
+        return pooled[0]
+    if not credentials:
+        session = boto3.session.Session(region_name=region)
+    else:
+        session = boto3.session.Session(aws_access_key_id=credentials['AccessKeyId'],
+                                        aws_secret_access_key=credentials['SecretAccessKey'],
+                                        aws_session_token=credentials['SessionToken'],
+                                        region_name=region)
+    _SESSIONS[key] = (session, credentials)
+    return session
+
+# Credentials of the assumed roles, shared by every client of the container.
+_CREDENTIALS = CredentialCache(get_assume_role_credentials)
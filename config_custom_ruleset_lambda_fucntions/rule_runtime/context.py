@@ -0,0 +1,44 @@
+# pylint: disable=invalid-name
+# pylint: enable=invalid-name
+"""
+Per-invocation context of a Config rule.
+"""
+
+import json
+
+class InvocationContext(dict):
+    """The lambda event with its invokingEvent parsed once per invocation.
+
+    It is a dictionary subclass, so it can be passed wherever the rules expect the raw event, and
+    the evaluation builders read the ordering timestamp from it instead of parsing the
+    invokingEvent for each evaluation.
+
+    Keyword arguments:
+    event -- the event variable given in the lambda handler
+    """
+
+    def __init__(self, event):
+        super().__init__(event)
+        self.invoking_event = json.loads(event['invokingEvent'])
+        self.account_id = event.get('accountId')
+        self.result_token = event.get('resultToken')
+        self.rule_name = event.get('configRuleName')
+        self._ordering_timestamp = None
+
+    @classmethod
+    def from_event(cls, event):
+        """Return the event itself when it is already an InvocationContext, a new InvocationContext otherwise."""
+        if isinstance(event, cls):
+            return event
+        return cls(event)
+
+    @property
+    def message_type(self):
+        return self.invoking_event['messageType']
+
+    @property
+    def ordering_timestamp(self):
+        """The notificationCreationTime of the invokingEvent, as expected in OrderingTimestamp."""
+        if self._ordering_timestamp is None:
+            self._ordering_timestamp = str(self.invoking_event['notificationCreationTime'])
+        return self._ordering_timestamp
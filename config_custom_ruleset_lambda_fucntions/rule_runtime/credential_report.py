@@ -0,0 +1,194 @@
+# pylint: disable=invalid-name
+# pylint: enable=invalid-name
+"""
+IAM credential report of the account, one row per user.
+
+The report holds, for every user, the password, MFA and access key columns the IAM rules otherwise
+read with one or more calls per user (list_mfa_devices, list_access_keys, get_access_key_last_used,
+get_login_profile). get_credential_report() has IAM generate it, polls until it is ready and parses
+the CSV line by line into a table of rows indexed by user name:
+
+    report = rule_runtime.get_credential_report(iam_client, event['accountId'])
+    if report.has_user(user['UserName'], user['CreateDate']):
+        has_mfa = report.column_value(user['UserName'], 'mfa_active')
+
+IAM generates a new report at most every 4 hours, so a report may predate the last changes of a
+user (see generated_time), and does not know the users created since. The report is kept in memory
+until IAM would generate the next one, or for the max_age given by the rule when it is shorter.
+
+In fixture mode the report is read from a local CSV file, in the format of the IAM report, instead
+of IAM: set the RULE_RUNTIME_CREDENTIAL_REPORT_FIXTURE environment variable to its path.
+"""
+
+import csv
+import datetime
+import io
+import os
+import threading
+import time
+
+from botocore.utils import parse_timestamp
+
+# Path of a CSV file read instead of calling IAM, see CredentialReport.from_csv_file().
+FIXTURE_ENVIRONMENT_VARIABLE = 'RULE_RUNTIME_CREDENTIAL_REPORT_FIXTURE'
+
+# IAM returns the last report until it is this old, a newer one cannot be generated before.
+REPORT_LIFETIME = datetime.timedelta(hours=4)
+
+# Polling of generate_credential_report until the report is COMPLETE.
+POLL_INTERVAL_SECONDS = 2
+POLL_TIMEOUT_SECONDS = 120
+
+# The row of the account root user, which is not an IAM user.
+ROOT_ACCOUNT_USER = '<root_account>'
+
+# Suffixes of the timestamp columns, read as datetimes.
+TIMESTAMP_COLUMN_SUFFIXES = ('_time', '_date', '_last_used', '_last_changed', '_last_rotated', '_next_rotation')
+
+# Cell values meaning the information does not exist, read as None.
+EMPTY_VALUES = ('N/A', 'not_supported', 'no_information', '')
+
+# Guards _REPORTS.
+_REPORTS_LOCK = threading.Lock()
+
+# account_id -> CredentialReport
+_REPORTS = {}
+
+class CredentialReport:
+    """Rows of a credential report, indexed by user name, with their cells parsed on read.
+
+    Keyword arguments:
+    columns -- the column names, the header of the report
+    rows -- the rows of the report, tuples of strings in the order of columns
+    generated_time -- the time the report was generated, an aware datetime (default None, unknown)
+    """
+
+    def __init__(self, columns, rows, generated_time=None):
+        self.columns = tuple(columns)
+        self.generated_time = generated_time
+        self._column_indexes = {column: index for index, column in enumerate(self.columns)}
+        self._rows = {row[0]: row for row in rows if row and row[0] != ROOT_ACCOUNT_USER}
+
+    @classmethod
+    def from_content(cls, content, generated_time=None):
+        """Return the report of the CSV content, as returned by get_credential_report (bytes or str)."""
+        if isinstance(content, bytes):
+            content = content.decode('utf-8')
+        reader = csv.reader(io.StringIO(content))
+        columns = next(reader, [])
+        return cls(columns, (tuple(row) for row in reader), generated_time)
+
+    @classmethod
+    def from_csv_file(cls, path):
+        """Return the report saved in a CSV file, generated at the modification time of the file."""
+        with open(path, encoding='utf-8') as report_file:
+            content = report_file.read()
+        generated_time = datetime.datetime.fromtimestamp(os.path.getmtime(path), datetime.timezone.utc)
+        return cls.from_content(content, generated_time)
+
+    def __contains__(self, user_name):
+        return user_name in self._rows
+
+    def __len__(self):
+        return len(self._rows)
+
+    def user_names(self):
+        """Return the names of the IAM users of the report, the root account excluded."""
+        return list(self._rows)
+
+    def has_user(self, user_name, create_date=None):
+        """Return True when the report has a row for the user, and the same creation date when create_date is given.
+
+        The creation date tells apart a user deleted and created again under the same name since the report.
+        """
+        if user_name not in self._rows:
+            return False
+        return create_date is None or self.column_value(user_name, 'user_creation_time') == create_date
+
+    def column_value(self, user_name, column):
+        """Return the cell of the user in the column: a bool, a datetime, None when not applicable, or the string.
+
+        Raise a KeyError when the user or the column is not in the report.
+        """
+        return _parse_cell(column, self._rows[user_name][self._column_indexes[column]])
+
+    def user_row(self, user_name):
+        """Return the parsed cells of the user as a dictionary keyed by column."""
+        return {column: self.column_value(user_name, column) for column in self.columns}
+
+    def access_keys(self, user_name):
+        """Return the access keys of the user, as dictionaries of 'number' (1 or 2), 'active', 'last_rotated',
+        'last_used_date', 'last_used_region' and 'last_used_service'. The report has no key id.
+        """
+        keys = []
+        for number in (1, 2):
+            prefix = 'access_key_{}_'.format(number)
+            if prefix + 'active' not in self._column_indexes:
+                continue
+            key = {'number': number}
+            for name in ('active', 'last_rotated', 'last_used_date', 'last_used_region', 'last_used_service'):
+                key[name] = self.column_value(user_name, prefix + name)
+            # This skips the slot of a key which was never created.
+            if key['active'] or key['last_rotated']:
+                keys.append(key)
+        return keys
+
+    def is_newer_than(self, timestamp):
+        """Return True when the report was generated after the timestamp (an aware datetime or an ISO 8601 string)."""
+        if self.generated_time is None:
+            return False
+        if isinstance(timestamp, str):
+            timestamp = parse_timestamp(timestamp)
+        return self.generated_time >= timestamp
+
+def get_credential_report(iam_client, account_id=None, fixture_path=None, max_age=REPORT_LIFETIME):
+    """Return the CredentialReport of the account, generating it when IAM has none younger than 4 hours.
+
+    The report is kept in memory per account until IAM would generate the next one.
+
+    Keyword arguments:
+    iam_client -- the boto iam client of the account
+    account_id -- the account of the client, the key of the report kept in memory (default None)
+    fixture_path -- a CSV file read instead of calling IAM (default the RULE_RUNTIME_CREDENTIAL_REPORT_FIXTURE environment variable)
+    max_age -- the age after which the report kept in memory is asked to IAM again, capped at REPORT_LIFETIME (default REPORT_LIFETIME)
+    """
+    fixture_path = fixture_path or os.environ.get(FIXTURE_ENVIRONMENT_VARIABLE)
+    if fixture_path:
+        return CredentialReport.from_csv_file(fixture_path)
+    max_age = min(max_age, REPORT_LIFETIME)
+    with _REPORTS_LOCK:
+        report = _REPORTS.get(account_id)
+        if report and report.generated_time and report.generated_time + max_age > datetime.datetime.now(datetime.timezone.utc):
+            return report
+        _wait_for_report(iam_client)
+        response = iam_client.get_credential_report()
+        generated_time = response.get('GeneratedTime')
+        if isinstance(generated_time, str):
+            generated_time = parse_timestamp(generated_time)
+        report = CredentialReport.from_content(response['Content'], generated_time)
+        _REPORTS[account_id] = report
+        return report
+
+def clear_credential_reports():
+    """Forget the reports kept in memory, the next get_credential_report() calls ask IAM again."""
+    with _REPORTS_LOCK:
+        _REPORTS.clear()
+
+def _wait_for_report(iam_client):
+    deadline = time.time() + POLL_TIMEOUT_SECONDS
+    while iam_client.generate_credential_report()['State'] != 'COMPLETE':
+        if time.time() > deadline:
+            raise TimeoutError('The IAM credential report was not generated within {} seconds.'.format(POLL_TIMEOUT_SECONDS))
+        time.sleep(POLL_INTERVAL_SECONDS)
+
+def _parse_cell(column, value):
+    if value in EMPTY_VALUES:
+        return None
+    if value in ('true', 'false'):
+        return value == 'true'
+    if column.endswith(TIMESTAMP_COLUMN_SUFFIXES):
+        try:
+            return parse_timestamp(value)
+        except ValueError:
+            return value
+    return value
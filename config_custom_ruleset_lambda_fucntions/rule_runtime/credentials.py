@@ -0,0 +1,77 @@
+# pylint: disable=invalid-name
+# pylint: enable=invalid-name
+"""
+Expiry-aware cache of the STS credentials used in ASSUME_ROLE_MODE.
+
+Credentials are kept per executionRoleArn and reused until a safety margin before their
+Expiration, so a rule assumes its role once per credential lifetime instead of once per client.
+"""
+
+import threading
+from datetime import datetime, timedelta, timezone
+
+# Credentials are refreshed this many seconds before their Expiration.
+CREDENTIALS_EXPIRY_MARGIN_SECONDS = 60
+
+class CredentialCache:
+    """Cache of Credentials dictionaries keyed by role ARN.
+
+    Concurrent callers asking for the same expired role wait for a single refresh instead of
+    each calling sts:AssumeRole.
+
+    Keyword arguments:
+    loader -- callable(role_arn, region, duration_seconds) returning a STS Credentials dictionary
+    margin_seconds -- seconds before Expiration after which the credentials are refreshed
+        (default CREDENTIALS_EXPIRY_MARGIN_SECONDS)
+    """
+
+    def __init__(self, loader, margin_seconds=CREDENTIALS_EXPIRY_MARGIN_SECONDS):
+        self._loader = loader
+        self._margin = timedelta(seconds=margin_seconds)
+        self._lock = threading.Lock()
+        self._role_locks = {}
+        self._credentials = {}
+
+    def get_credentials(self, role_arn, region=None, duration_seconds=None):
+        """Return valid credentials for the role, assuming it only when the cached ones are about to expire.
+
+        Keyword arguments:
+        role_arn -- the ARN of the role, usually event["executionRoleArn"]
+        region -- the region of the STS endpoint (default None, the Lambda region)
+        duration_seconds -- the DurationSeconds requested on refresh, used as lifetime when
+            the response has no Expiration (default None)
+        """
+        credentials = self._get_fresh(role_arn)
+        if credentials:
+            return credentials
+        with self._get_role_lock(role_arn):
+            # Another thread may have refreshed the role while we were waiting for the lock.
+            credentials = self._get_fresh(role_arn)
+            if credentials:
+                return credentials
+            credentials = dict(self._loader(role_arn, region, duration_seconds))
+            if 'Expiration' not in credentials and duration_seconds:
+                credentials['Expiration'] = datetime.now(timezone.utc) + timedelta(seconds=duration_seconds)
+            self._credentials[role_arn] = credentials
+            return credentials
+
+    def invalidate(self, role_arn=None):
+        """Forget the credentials of the role, or of every role when role_arn is None."""
+        with self._lock:
+            if role_arn is None:
+                self._credentials.clear()
+            else:
+                self._credentials.pop(role_arn, None)
+
+    def _get_fresh(self, role_arn):
+        credentials = self._credentials.get(role_arn)
+        if not credentials:
+            return None
+        expiration = credentials.get('Expiration')
+        if expiration is not None and expiration - self._margin <= datetime.now(timezone.utc):
+            return None
+        return credentials
+
+    def _get_role_lock(self, role_arn):
+        with self._lock:
+            return self._role_locks.setdefault(role_arn, threading.Lock())
@@ -0,0 +1,115 @@
+# pylint: disable=invalid-name
+# pylint: enable=invalid-name
+"""
+Bounded, sampled debug logging of the rules.
+
+The rules log their API payloads with rule_runtime.log.debug('instances: %s', instance_array)
+instead of print(instance_array). The message is only formatted when the level is enabled, so
+a payload dump costs nothing by default. Debug is enabled per rule with the rule parameters:
+
+    DebugLogging -- "True" to log the DEBUG messages (default "False")
+    DebugSampleRate -- the share of the DEBUG and INFO messages kept, between 0 and 1 (default 1)
+
+The DEBUG and INFO messages of an invocation share a budget of DEFAULT_BYTE_BUDGET bytes; a
+message crossing it is truncated and the next ones are dropped, and counted. WARNING and ERROR
+messages are always written.
+"""
+
+import os
+import random
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+LEVEL_NAMES = {DEBUG: 'DEBUG', INFO: 'INFO', WARNING: 'WARNING', ERROR: 'ERROR'}
+
+# Rule parameters read by configure().
+DEBUG_PARAMETER = 'DebugLogging'
+SAMPLE_RATE_PARAMETER = 'DebugSampleRate'
+DEBUG_PARAMETERS = (DEBUG_PARAMETER, SAMPLE_RATE_PARAMETER)
+
+# Bytes of DEBUG and INFO messages written per invocation, overridden by the RULE_RUNTIME_DEBUG_BYTE_BUDGET environment variable.
+DEFAULT_BYTE_BUDGET = int(os.environ.get('RULE_RUNTIME_DEBUG_BYTE_BUDGET', 64 * 1024))
+
+class RuleLogger:
+    """Leveled logger writing to the Lambda log (stdout) within a per-invocation byte budget.
+
+    Keyword arguments:
+    level -- the lowest level written (default INFO)
+    byte_budget -- the bytes of DEBUG and INFO messages written per invocation (default DEFAULT_BYTE_BUDGET)
+    sample_rate -- the share of the DEBUG and INFO messages kept (default 1.0)
+    """
+
+    def __init__(self, level=INFO, byte_budget=DEFAULT_BYTE_BUDGET, sample_rate=1.0):
+        self.level = level
+        self.byte_budget = byte_budget
+        self.sample_rate = sample_rate
+        self.bytes_written = 0
+        self.dropped = 0
+
+    def configure(self, rule_parameters):
+        """Set the level and sample rate from the rule parameters and start a new budget.
+
+        Keyword arguments:
+        rule_parameters -- the Key/Value dictionary of the Config Rules parameters
+        """
+        self.level = DEBUG if rule_parameters.get(DEBUG_PARAMETER, 'False') == 'True' else INFO
+        try:
+            self.sample_rate = min(max(float(rule_parameters.get(SAMPLE_RATE_PARAMETER, 1)), 0.0), 1.0)
+        except ValueError:
+            # A wrong sample rate must not fail the evaluation, keep every message instead.
+            self.sample_rate = 1.0
+        self.reset_budget()
+
+    def reset_budget(self):
+        """Start the byte budget of a new invocation."""
+        self.bytes_written = 0
+        self.dropped = 0
+
+    def is_enabled_for(self, level):
+        return level >= self.level
+
+    def debug(self, message, *args):  # pylint: disable=invalid-name
+        self.log(DEBUG, message, *args)
+
+    def info(self, message, *args):  # pylint: disable=invalid-name
+        self.log(INFO, message, *args)
+
+    def warning(self, message, *args):
+        self.log(WARNING, message, *args)
+
+    def error(self, message, *args):  # pylint: disable=invalid-name
+        self.log(ERROR, message, *args)
+
+    def log(self, level, message, *args):  # pylint: disable=invalid-name
+        """Write message % args at the level, formatting it only when it is written.
+
+        An argument may be a callable without parameters, called only when the message is written.
+        """
+        if not self.is_enabled_for(level):
+            return
+        bounded = level < WARNING
+        if bounded and (self.bytes_written >= self.byte_budget or
+                        (self.sample_rate < 1.0 and random.random() >= self.sample_rate)):
+            self.dropped += 1
+            return
+        if args:
+            message = message % tuple(arg() if callable(arg) else arg for arg in args)
+        line = '{} {}'.format(LEVEL_NAMES[level], message)
+        if bounded:
+            remaining = self.byte_budget - self.bytes_written
+            if len(line) > remaining:
+                line = line[:remaining] + '... (truncated, debug log budget of {} bytes reached)'.format(self.byte_budget)
+            self.bytes_written += len(line)
+        print(line)
+
+    def summary(self):
+        """Return the line reporting the messages dropped by the budget or the sampling, None when none was."""
+        if not self.dropped:
+            return None
+        return 'debug_log: {} messages dropped, {} bytes written of a budget of {}'.format(self.dropped, self.bytes_written, self.byte_budget)
+
+# Logger of the rules, configured for each invocation by rule_runtime.instrument_handler.
+log = RuleLogger()
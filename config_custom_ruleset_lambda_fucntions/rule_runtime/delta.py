@@ -0,0 +1,127 @@
+# pylint: disable=invalid-name
+# pylint: enable=invalid-name
+"""
+Delta-only evaluation reporting.
+
+A compact fingerprint (resource, compliance type, annotation hash) of every submitted evaluation is
+kept in a store, and the next invocations only submit the evaluations whose fingerprint changed or
+which were not submitted for refresh_after_seconds.
+
+The default store is a JSON file in /tmp, which lives as long as the Lambda container. Any object
+with load_fingerprints() and save_fingerprints(fingerprints) methods can be used instead to share the state between containers.
+
+A container only knows the evaluations it submitted itself: another container may have reported
+another result for a resource since. refresh_after_seconds bounds how long Config can keep such a
+result, so a periodic rule sets it to its trigger period: an unchanged evaluation is then submitted
+again at least every other run, and Config is corrected within two periods.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+# Directory of the LocalFingerprintStore files.
+STATE_DIRECTORY = os.path.join(tempfile.gettempdir(), 'rule_runtime_state')
+
+# An unchanged evaluation is submitted again when its last submission is older than this, the longest trigger period
+# (TwentyFour_Hours), overridden by the RULE_RUNTIME_DELTA_REFRESH_SECONDS environment variable.
+DEFAULT_REFRESH_AFTER_SECONDS = int(os.environ.get('RULE_RUNTIME_DELTA_REFRESH_SECONDS', 24 * 3600))
+
+class LocalFingerprintStore:
+    """Fingerprints persisted in a JSON file, by default one per rule and account under STATE_DIRECTORY.
+
+    Keyword arguments:
+    path -- the path of the JSON file
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    @classmethod
+    def for_rule(cls, config_rule_name, account_id):
+        """Return the store of the rule for the account."""
+        return cls(os.path.join(STATE_DIRECTORY, '{}-{}.json'.format(config_rule_name, account_id)))
+
+    def load_fingerprints(self):
+        """Return the dictionary of fingerprints, empty when the file is missing or unreadable."""
+        try:
+            with open(self.path, encoding='utf-8') as state_file:
+                return json.load(state_file)
+        except (IOError, ValueError):
+            return {}
+
+    def save_fingerprints(self, fingerprints):
+        """Replace the file content by the fingerprints dictionary, atomically."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as state_file:
+            json.dump(fingerprints, state_file, separators=(',', ':'))
+        os.replace(temp_path, self.path)
+
+class MemoryFingerprintStore:
+    """Fingerprints kept in memory, the local stand-in of a shared backend."""
+
+    def __init__(self, fingerprints=None):
+        self.fingerprints = dict(fingerprints or {})
+
+    def load_fingerprints(self):
+        return dict(self.fingerprints)
+
+    def save_fingerprints(self, fingerprints):
+        self.fingerprints = dict(fingerprints)
+
+class DeltaReporter:
+    """Filter the evaluations down to the ones that changed since their last submission.
+
+    Usage: pass filter(evaluations) to put_evaluations(), then commit() the failed evaluations
+    once the submission is over, so only the accepted ones are remembered.
+
+    Keyword arguments:
+    store -- the fingerprint store, e.g. LocalFingerprintStore.for_rule()
+    refresh_after_seconds -- the age after which an unchanged evaluation is submitted again, usually the trigger period
+        of the rule (default DEFAULT_REFRESH_AFTER_SECONDS)
+    """
+
+    def __init__(self, store, refresh_after_seconds=DEFAULT_REFRESH_AFTER_SECONDS):
+        self.store = store
+        self.refresh_after_seconds = refresh_after_seconds
+        self.skipped = 0
+        self._now = int(time.time())
+        self._fingerprints = store.load_fingerprints()
+        self._submitted = {}
+
+    def filter(self, evaluations):
+        """Yield the evaluations whose fingerprint changed or whose last submission is too old."""
+        for evaluation in evaluations:
+            key = _resource_key(evaluation)
+            fingerprint = _fingerprint(evaluation)
+            known = self._fingerprints.get(key)
+            if known and known[0] == fingerprint and self._now - known[1] < self.refresh_after_seconds:
+                self.skipped += 1
+                continue
+            self._submitted[key] = [fingerprint, self._now]
+            yield evaluation
+
+    def commit(self, failed_evaluations=()):
+        """Persist the fingerprints of the submitted evaluations, except the failed ones.
+
+        Fingerprints older than refresh_after_seconds are dropped, those resources are submitted
+        on their next evaluation anyway.
+        """
+        for evaluation in failed_evaluations:
+            self._submitted.pop(_resource_key(evaluation), None)
+        fingerprints = {key: known for key, known in self._fingerprints.items()
+                        if self._now - known[1] < self.refresh_after_seconds}
+        fingerprints.update(self._submitted)
+        self.store.save_fingerprints(fingerprints)
+        print("Delta reporting: {} unchanged evaluations skipped, {} submitted.".format(self.skipped, len(self._submitted)))
+
+def _resource_key(evaluation):
+    return evaluation['ComplianceResourceType'] + '|' + evaluation['ComplianceResourceId']
+
+def _fingerprint(evaluation):
+    annotation = evaluation.get('Annotation') or ''
+    annotation_hash = hashlib.sha1(annotation.encode('utf-8')).hexdigest()[:12]
+    return evaluation['ComplianceType'] + ':' + annotation_hash
@@ -0,0 +1,223 @@
+# pylint: disable=invalid-name
+# pylint: enable=invalid-name
+"""
+Evaluation record and helpers shared by the Config rules.
+"""
+
+import collections.abc
+
+import botocore
+
+from rule_runtime.paginator import paginate
+
+# Fields every evaluation sent to put_evaluations must have.
+EVALUATION_FIELDS = ('ComplianceResourceType', 'ComplianceResourceId', 'ComplianceType', 'OrderingTimestamp')
+
+COMPLIANCE_TYPES = ('COMPLIANT', 'NON_COMPLIANT', 'NOT_APPLICABLE', 'INSUFFICIENT_DATA')
+
+# Old evaluations with these compliance types are turned NOT_APPLICABLE when not reported anymore.
+CLEANED_COMPLIANCE_TYPES = ['COMPLIANT', 'NON_COMPLIANT']
+
+# Maximum Limit accepted by get_compliance_details_by_config_rule.
+COMPLIANCE_DETAILS_PAGE_SIZE = 100
+
+class Evaluation:
+    """Immutable evaluation of a resource, validated once at construction.
+
+    It only becomes the put_evaluations dictionary when its batch is serialized (to_dict()), and
+    reads like that dictionary (evaluation['ComplianceResourceId'], 'Annotation' in evaluation)
+    for the code written against the dictionaries.
+
+    Keyword arguments:
+    resource_type -- the CloudFormation resource type (or AWS::::Account) of the resource
+    resource_id -- the unique id of the resource
+    compliance_type -- either COMPLIANT, NON_COMPLIANT, NOT_APPLICABLE or INSUFFICIENT_DATA
+    ordering_timestamp -- the OrderingTimestamp of the evaluation
+    annotation -- an annotation to be added to the evaluation (default None)
+    """
+
+    __slots__ = ('resource_type', 'resource_id', 'compliance_type', 'ordering_timestamp', 'annotation')
+
+    _ATTRIBUTES = {
+        'ComplianceResourceType': 'resource_type',
+        'ComplianceResourceId': 'resource_id',
+        'ComplianceType': 'compliance_type',
+        'OrderingTimestamp': 'ordering_timestamp',
+        'Annotation': 'annotation'
+    }
+
+    def __init__(self, resource_type, resource_id, compliance_type, ordering_timestamp, annotation=None):
+        if not resource_type:
+            raise ValueError('The evaluation must have a ComplianceResourceType.')
+        if not resource_id:
+            raise ValueError('The evaluation must have a ComplianceResourceId.')
+        if compliance_type not in COMPLIANCE_TYPES:
+            raise ValueError('The ComplianceType "' + str(compliance_type) + '" is not valid.')
+        if not ordering_timestamp:
+            raise ValueError('The evaluation must have an OrderingTimestamp.')
+        object.__setattr__(self, 'resource_type', resource_type)
+        object.__setattr__(self, 'resource_id', resource_id)
+        object.__setattr__(self, 'compliance_type', compliance_type)
+        object.__setattr__(self, 'ordering_timestamp', ordering_timestamp)
+        object.__setattr__(self, 'annotation', annotation or None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Evaluation is immutable')
+
+    def __getitem__(self, key):
+        value = getattr(self, self._ATTRIBUTES[key])
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return key in self._ATTRIBUTES and getattr(self, self._ATTRIBUTES[key]) is not None
+
+    def get(self, key, default=None):  # pylint: disable=invalid-name
+        if key in self:
+            return self[key]
+        return default
+
+    def to_dict(self):
+        """Return the evaluation in the put_evaluations format."""
+        evaluation = {
+            'ComplianceResourceType': self.resource_type,
+            'ComplianceResourceId': self.resource_id,
+            'ComplianceType': self.compliance_type,
+            'OrderingTimestamp': self.ordering_timestamp
+        }
+        if self.annotation:
+            evaluation['Annotation'] = self.annotation
+        return evaluation
+
+    def __eq__(self, other):
+        if isinstance(other, Evaluation):
+            return self.to_dict() == other.to_dict()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    def __hash__(self):
+        return hash((self.resource_type, self.resource_id, self.compliance_type, self.ordering_timestamp, self.annotation))
+
+    def __repr__(self):
+        return 'Evaluation(' + repr(self.to_dict()) + ')'
+
+def is_valid_evaluation(evaluation):
+    """Return True when the evaluation can be sent to put_evaluations.
+
+    An Evaluation is valid by construction. A dictionary built by hand is checked field by field
+    and the missing fields are printed.
+    """
+    if isinstance(evaluation, Evaluation):
+        return True
+    missing_fields = [field for field in EVALUATION_FIELDS if field not in evaluation]
+    for field in missing_fields:
+        print("Missing " + field + " from custom evaluation.")
+    return not missing_fields
+
+def to_api_evaluation(evaluation):
+    """Return the put_evaluations dictionary of an Evaluation or of an evaluation dictionary."""
+    if isinstance(evaluation, Evaluation):
+        return evaluation.to_dict()
+    return evaluation
+
+class EvaluationStreamError(Exception):
+    """Error of a streamed evaluate_compliance(), raised while put_evaluations() consumes the stream.
+
+    The handler reports the wrapped error as the errors raised by evaluate_compliance() itself.
+
+    Keyword arguments:
+    error -- the ClientError or ValueError raised while producing the evaluations
+    """
+
+    def __init__(self, error):
+        super().__init__(str(error))
+        self.error = error
+
+def is_evaluation_stream(compliance_result):
+    """Return True when evaluate_compliance() returned an iterator (usually a generator) of evaluations."""
+    return isinstance(compliance_result, collections.abc.Iterator)
+
+def stream_evaluations(config_client, config_rule_name, evaluations, build_not_applicable, build_shadow=None):
+    """Yield the valid evaluations as the rule produces them, then the NOT_APPLICABLE evaluations of the resources not reported anymore.
+
+    Only the resource ids are kept while streaming, so put_evaluations() can send the first batches
+    while the rule is still enumerating the resources.
+
+    Keyword arguments:
+    config_client -- the AWS Config boto client
+    config_rule_name -- the name of the Config Rule, usually event['configRuleName']
+    evaluations -- the iterator returned by evaluate_compliance()
+    build_not_applicable -- callable(resource_id) returning the NOT_APPLICABLE evaluation of the resource
+    build_shadow -- callable() returning the "shadow" evaluation sent when the iterator is empty (default None)
+
+    A ClientError or ValueError raised while producing the evaluations is raised as an EvaluationStreamError.
+    """
+    latest_resource_ids = set()
+    try:
+        for evaluation in evaluations:
+            if is_valid_evaluation(evaluation):
+                latest_resource_ids.add(evaluation['ComplianceResourceId'])
+                yield evaluation
+        if not latest_resource_ids and build_shadow:
+            shadow_evaluation = build_shadow()
+            latest_resource_ids.add(shadow_evaluation['ComplianceResourceId'])
+            yield shadow_evaluation
+        for evaluation in iter_stale_evaluations(config_client, config_rule_name, latest_resource_ids, build_not_applicable):
+            yield evaluation
+    except (botocore.exceptions.ClientError, ValueError) as ex:
+        raise EvaluationStreamError(ex) from ex
+
+def build_handler_response(evaluations, metrics):
+    """Return the JSON serializable value returned by the lambda_handler (used by the RDK tests).
+
+    Keyword arguments:
+    evaluations -- the evaluations given to put_evaluations()
+    metrics -- the dictionary returned by put_evaluations()
+    """
+    if isinstance(evaluations, list):
+        return [to_api_evaluation(evaluation) for evaluation in evaluations]
+    # Streamed evaluations are not kept in memory, only their submission metrics.
+    return {key: value for key, value in metrics.items() if key != 'failed_evaluations'}
+
+def iter_stale_evaluations(config_client, config_rule_name, latest_resource_ids, build_not_applicable):
+    """Yield a NOT_APPLICABLE evaluation for every old evaluation of the rule whose resource is not reported anymore.
+
+    The old evaluations are consumed one page at a time, so memory is bounded by a page and the set of
+    latest resource ids, not by the evaluation history of the rule.
+
+    Keyword arguments:
+    config_client -- the AWS Config boto client
+    config_rule_name -- the name of the Config Rule, usually event['configRuleName']
+    latest_resource_ids -- a set of the ComplianceResourceId reported by the current evaluation
+    build_not_applicable -- callable(resource_id) returning the NOT_APPLICABLE evaluation of the resource
+    """
+    old_results = paginate(config_client, 'get_compliance_details_by_config_rule', page_size=COMPLIANCE_DETAILS_PAGE_SIZE,
+                           ConfigRuleName=config_rule_name, ComplianceTypes=CLEANED_COMPLIANCE_TYPES)
+    for old_result in old_results:
+        old_resource_id = old_result['EvaluationResultIdentifier']['EvaluationResultQualifier']['ResourceId']
+        if old_resource_id not in latest_resource_ids:
+            yield build_not_applicable(old_resource_id)
+
+def clean_up_old_evaluations(config_client, config_rule_name, latest_evaluations, build_not_applicable):
+    """Yield the NOT_APPLICABLE evaluations of the resources not reported anymore, followed by latest_evaluations.
+
+    This removes older evaluation (usually useful for periodic rule not reporting on AWS::::Account).
+    The old evaluations are read page by page while put_evaluations() consumes the iterator, so a
+    ClientError or ValueError raised meanwhile is raised as an EvaluationStreamError.
+
+    Keyword arguments:
+    config_client -- the AWS Config boto client
+    config_rule_name -- the name of the Config Rule, usually event['configRuleName']
+    latest_evaluations -- the list of evaluations of the current invocation
+    build_not_applicable -- callable(resource_id) returning the NOT_APPLICABLE evaluation of the resource
+    """
+    latest_resource_ids = {evaluation['ComplianceResourceId'] for evaluation in latest_evaluations}
+    try:
+        for evaluation in iter_stale_evaluations(config_client, config_rule_name, latest_resource_ids, build_not_applicable):
+            yield evaluation
+    except (botocore.exceptions.ClientError, ValueError) as ex:
+        raise EvaluationStreamError(ex) from ex
+    for evaluation in latest_evaluations:
+        yield evaluation
@@ -0,0 +1,165 @@
+# pylint: disable=invalid-name
+# pylint: enable=invalid-name
+"""
+Accounting of the AWS API calls made during an invocation.
+
+Every client handed out by get_client() is instrumented through the botocore event hooks: each
+call is counted per service and operation and timed, and the retries and throttled responses
+are counted. A handler decorated with instrument_handler() starts every invocation with fresh
+counters and prints their summary, and the EMF record of the invocation, when it returns:
+
+    api_calls: 1012 calls, 0 errors, 0 retries, 0 throttles, 3.204s; iam.list_mfa_devices 1000 calls 2.851s, iam.list_users 10 calls 0.201s, ...
+    api_latency_ms: <=10 0, <=25 0, <=50 12, <=100 640, ...
+"""
+
+import functools
+import json
+import threading
+import time
+
+import botocore
+
+from rule_runtime.context import InvocationContext
+from rule_runtime.debuglog import DEBUG_PARAMETERS, log
+from rule_runtime.metrics import build_emf_record, emit_emf_record, reset_submissions
+from rule_runtime.paginator import reset_pagination_stats
+from rule_runtime.submitter import THROTTLING_ERROR_CODES
+
+# Upper bounds, in milliseconds, of the call latency histogram. Slower calls fall in a last bucket.
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+class ApiCallStats:
+    """Calls, errors, retries, throttles and latency of the API calls, per 'service.operation'."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.operations = {}
+        self.histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def record_call(self, operation, seconds, retries=0, error_code=None):
+        """Count a call of the operation that took seconds, including its retries."""
+        with self._lock:
+            stats = self._operation(operation)
+            stats['calls'] += 1
+            stats['retries'] += retries
+            stats['seconds'] += seconds
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+            if error_code:
+                stats['errors'] += 1
+            bucket = next((index for index, bound in enumerate(LATENCY_BUCKETS_MS) if seconds * 1000 <= bound), len(LATENCY_BUCKETS_MS))
+            self.histogram[bucket] += 1
+
+    def record_throttle(self, operation):
+        """Count a throttled response of the operation, retried or not."""
+        with self._lock:
+            self._operation(operation)['throttles'] += 1
+
+    def totals(self):
+        """Return the 'calls', 'errors', 'retries', 'throttles' and 'seconds' of all the operations."""
+        with self._lock:
+            totals = {name: sum(stats[name] for stats in self.operations.values())
+                      for name in ('calls', 'errors', 'retries', 'throttles', 'seconds')}
+        totals['seconds'] = round(totals['seconds'], 3)
+        return totals
+
+    def histogram_buckets(self):
+        """Return the latency histogram as a list of (label, count), the labels being '<=10', ..., '>5000'."""
+        labels = ['<={}'.format(bound) for bound in LATENCY_BUCKETS_MS] + ['>{}'.format(LATENCY_BUCKETS_MS[-1])]
+        with self._lock:
+            return list(zip(labels, self.histogram))
+
+    def summary(self):
+        """Return the one-line summary of the calls, the operations taking the most time first."""
+        with self._lock:
+            operations = sorted(self.operations.items(), key=lambda item: item[1]['seconds'], reverse=True)
+            per_operation = ', '.join('{} {} calls {:.3f}s'.format(operation, stats['calls'], stats['seconds'])
+                                      for operation, stats in operations)
+        line = "api_calls: {calls} calls, {errors} errors, {retries} retries, {throttles} throttles, {seconds}s".format(**self.totals())
+        return line + '; ' + per_operation if per_operation else line
+
+    def _operation(self, operation):
+        if operation not in self.operations:
+            self.operations[operation] = {'calls': 0, 'errors': 0, 'retries': 0, 'throttles': 0, 'seconds': 0.0, 'max_seconds': 0.0}
+        return self.operations[operation]
+
+_STATS = ApiCallStats()
+
+# True until the first invocation of the container returns.
+_COLD_START = True
+
+def get_api_call_stats():
+    """Return the ApiCallStats of the current invocation."""
+    return _STATS
+
+def reset_api_call_stats():
+    """Start counting the API calls from zero, usually at the start of an invocation."""
+    global _STATS
+    _STATS = ApiCallStats()
+
+def instrument_client(client):
+    """Register the accounting hooks on the client and return it."""
+    events = client.meta.events
+    events.register('before-parameter-build', _start_call)
+    events.register('needs-retry', _count_throttle)
+    events.register('after-call', _end_call)
+    events.register('after-call-error', _end_failed_call)
+    return client
+
+def instrument_handler(lambda_handler):
+    """Decorate a lambda_handler to account the API calls of each invocation and print their summary
+    followed by the EMF record of the invocation (see rule_runtime.metrics).
+
+    The debug log is configured from the rule parameters (see rule_runtime.debuglog), which are then
+    removed from the ruleParameters, so the rules validating their parameters do not reject them.
+    The handler receives the event as an InvocationContext.
+    """
+    @functools.wraps(lambda_handler)
+    def instrumented_handler(event, context):
+        global _COLD_START
+        start_time = time.time()
+        reset_api_call_stats()
+        reset_pagination_stats()
+        reset_submissions()
+        event = InvocationContext.from_event(event)
+        _configure_debug_log(event)
+        try:
+            return lambda_handler(event, context)
+        finally:
+            if log.summary():
+                print(log.summary())
+            print(_STATS.summary())
+            print('api_latency_ms: ' + ', '.join('{} {}'.format(label, count) for label, count in _STATS.histogram_buckets()))
+            emit_emf_record(build_emf_record(event.rule_name, event.invoking_event.get('messageType'),
+                                             time.time() - start_time, _COLD_START, _STATS.totals()))
+            _COLD_START = False
+    return instrumented_handler
+
+def _configure_debug_log(event):
+    rule_parameters = json.loads(event.get('ruleParameters') or '{}')
+    log.configure(rule_parameters)
+    if any(name in rule_parameters for name in DEBUG_PARAMETERS):
+        event['ruleParameters'] = json.dumps({name: value for name, value in rule_parameters.items() if name not in DEBUG_PARAMETERS})
+
+def _operation_name(model):
+    return '{}.{}'.format(model.service_model.service_name, botocore.xform_name(model.name))
+
+# before-parameter-build is emitted before any before-call hook can answer the call (replay),
+# so the call is timed from there.
+def _start_call(model, context, **kwargs):
+    context['rule_runtime_operation'] = _operation_name(model)
+    context['rule_runtime_call_start'] = time.time()
+
+def _end_call(http_response, parsed, model, context, **kwargs):
+    seconds = time.time() - context.get('rule_runtime_call_start', time.time())
+    retries = parsed.get('ResponseMetadata', {}).get('RetryAttempts', 0)
+    error_code = parsed.get('Error', {}).get('Code') if http_response.status_code >= 300 else None
+    _STATS.record_call(context.get('rule_runtime_operation', _operation_name(model)), seconds, retries, error_code)
+
+def _end_failed_call(exception, context, **kwargs):
+    # This is the call failing without any response (connection error, retries exhausted...).
+    seconds = time.time() - context.get('rule_runtime_call_start', time.time())
+    _STATS.record_call(context.get('rule_runtime_operation', 'unknown'), seconds, error_code=type(exception).__name__)
+
+def _count_throttle(response, operation, **kwargs):
+    if response and response[1].get('Error', {}).get('Code') in THROTTLING_ERROR_CODES:
+        _STATS.record_throttle(_operation_name(operation))
@@ -0,0 +1,93 @@
+# pylint: disable=invalid-name
+# pylint: enable=invalid-name
+"""
+Canonical form and minimal diff of security group IpPermissions.
+
+Two IpPermissions lists granting the same access can differ by the order of their ranges, by the
+way the sources are grouped in permissions, or by descriptions. Comparing them as raw dictionaries
+revokes and authorizes again rules which did not change. Here every permission is decomposed into
+atomic rules, (protocol, from port, to port, source type, source), compared as sets, and the rules
+to add or remove are grouped back into as few IpPermissions as possible:
+
+    authorize, revoke = rule_runtime.diff_ip_permissions(group['IpPermissions'], REQUIRED_PERMISSIONS)
+"""
+
+# Source lists of an IpPermission -> key identifying a source in the list.
+SOURCE_KEYS = (
+    ('IpRanges', 'CidrIp'),
+    ('Ipv6Ranges', 'CidrIpv6'),
+    ('PrefixListIds', 'PrefixListId'),
+    ('UserIdGroupPairs', 'GroupId')
+)
+
+# Members of a UserIdGroupPair sent back to the API; GroupName and PeeringStatus are only informative.
+GROUP_PAIR_KEYS = ('GroupId', 'UserId', 'VpcId', 'VpcPeeringConnectionId', 'Description')
+
+# Key of a UserIdGroupPair naming its group when it has no GroupId (a default VPC group given by name).
+GROUP_NAME_KEY = 'GroupName'
+
+# Protocol numbers the API accepts in place of the names it returns.
+PROTOCOL_NAMES = {'1': 'icmp', '6': 'tcp', '17': 'udp', '58': 'icmpv6'}
+
+def canonical_ip_permissions(ip_permissions):
+    """Return the atomic rules of the IpPermissions, as {(protocol, from_port, to_port, source_type, source): source dictionary}.
+
+    The descriptions (and, for the group pairs, the owner and VPC details) are kept in the source
+    dictionary but are not part of the rule, so they do not make two rules differ.
+
+    Keyword arguments:
+    ip_permissions -- the IpPermissions list, as returned by describe_security_groups
+    """
+    rules = {}
+    for permission in ip_permissions:
+        protocol = str(permission['IpProtocol']).lower()
+        protocol = PROTOCOL_NAMES.get(protocol, protocol)
+        port_range = (None, None) if protocol == '-1' else (permission.get('FromPort'), permission.get('ToPort'))
+        for source_type, source_key in SOURCE_KEYS:
+            for source in permission.get(source_type, []):
+                if source_type == 'UserIdGroupPairs':
+                    source = _group_pair(source)
+                    source_id = source.get(source_key) or source.get(GROUP_NAME_KEY)
+                else:
+                    source_id = source[source_key]
+                rules[(protocol,) + port_range + (source_type, source_id)] = source
+    return rules
+
+def compose_ip_permissions(rules):
+    """Group atomic rules back into IpPermissions, one per protocol and port range.
+
+    Keyword arguments:
+    rules -- the {rule: source dictionary} of the rules, as returned by canonical_ip_permissions()
+    """
+    permissions = {}
+    for (protocol, from_port, to_port, source_type, _), source in sorted(rules.items(), key=lambda item: str(item[0])):
+        key = (protocol, from_port, to_port)
+        if key not in permissions:
+            permissions[key] = {'IpProtocol': protocol}
+            if from_port is not None:
+                permissions[key]['FromPort'] = from_port
+            if to_port is not None:
+                permissions[key]['ToPort'] = to_port
+        permissions[key].setdefault(source_type, []).append(source)
+    return list(permissions.values())
+
+def diff_ip_permissions(current_permissions, required_permissions):
+    """Return the (authorize, revoke) IpPermissions turning the current permissions into the required ones.
+
+    Both lists are empty when the permissions grant the same rules, whatever their order, grouping
+    or descriptions. Each list fits in a single authorize/revoke_security_group_ingress call.
+
+    Keyword arguments:
+    current_permissions -- the IpPermissions of the security group
+    required_permissions -- the IpPermissions it must have
+    """
+    current = canonical_ip_permissions(current_permissions)
+    required = canonical_ip_permissions(required_permissions)
+    authorize = compose_ip_permissions({rule: required[rule] for rule in required.keys() - current.keys()})
+    revoke = compose_ip_permissions({rule: current[rule] for rule in current.keys() - required.keys()})
+    return authorize, revoke
+
+def _group_pair(source):
+    # This keeps the members sent back to the API, and the GroupName when it is the only name of the group.
+    keys = GROUP_PAIR_KEYS if source.get('GroupId') else GROUP_PAIR_KEYS + (GROUP_NAME_KEY,)
+    return {key: value for key, value in source.items() if key in keys}
@@ -0,0 +1,104 @@
+# pylint: disable=invalid-name
+# pylint: enable=invalid-name
+"""
+CloudWatch Embedded Metric Format (EMF) record of an invocation.
+
+The record is a single JSON line printed to the Lambda log, from which CloudWatch extracts the
+metrics, so no PutMetricData call is made. The metrics are published under the RuleName and
+MessageType dimensions:
+
+    {"_aws": {"Timestamp": ..., "CloudWatchMetrics": [...]}, "RuleName": "IAM_USER_MFA_ENABLED",
+     "MessageType": "ScheduledNotification", "Duration": 3204.1, "ColdStart": 1, "ResourcesEvaluated": 1000, ...}
+"""
+
+import collections
+import json
+import os
+import time
+
+# CloudWatch namespace of the metrics, overridden by the RULE_RUNTIME_METRICS_NAMESPACE environment variable.
+DEFAULT_NAMESPACE = 'ConfigRules'
+
+DIMENSIONS = ('RuleName', 'MessageType')
+
+# (metric name, CloudWatch unit) of the record
+METRIC_UNITS = (
+    ('Duration', 'Milliseconds'),
+    ('ColdStart', 'Count'),
+    ('ResourcesEvaluated', 'Count'),
+    ('Compliant', 'Count'),
+    ('NonCompliant', 'Count'),
+    ('NotApplicable', 'Count'),
+    ('EvaluationsSubmitted', 'Count'),
+    ('PutEvaluationsBatches', 'Count'),
+    ('FailedEvaluations', 'Count'),
+    ('ApiCalls', 'Count'),
+    ('ApiErrors', 'Count'),
+    ('ApiRetries', 'Count'),
+    ('ApiThrottles', 'Count'),
+    ('ApiTime', 'Milliseconds')
+)
+
+# put_evaluations metrics of the current invocation, see record_submission(). Bounded, as the
+# handlers not decorated by instrument_handler() never reset it.
+_SUBMISSIONS = collections.deque(maxlen=100)
+
+def record_submission(submission_metrics):
+    """Keep the metrics returned by put_evaluations for the record of the current invocation."""
+    _SUBMISSIONS.append(submission_metrics)
+
+def reset_submissions():
+    """Forget the put_evaluations metrics kept so far, usually at the start of an invocation."""
+    _SUBMISSIONS.clear()
+
+def build_emf_record(rule_name, message_type, duration_seconds, cold_start, api_totals, submissions=None, timestamp=None):
+    """Return the EMF record (a dictionary) of an invocation.
+
+    Keyword arguments:
+    rule_name -- the RuleName dimension, usually event['configRuleName']
+    message_type -- the MessageType dimension, the messageType of the invokingEvent
+    duration_seconds -- the duration of the invocation
+    cold_start -- True for the first invocation of the container
+    api_totals -- the ApiCallStats.totals() of the invocation
+    submissions -- the list of put_evaluations metrics of the invocation (default the ones recorded)
+    timestamp -- the time of the record, in seconds since the epoch (default now)
+    """
+    submissions = _SUBMISSIONS if submissions is None else submissions
+    compliance_types = {}
+    for submission in submissions:
+        for compliance_type, count in submission.get('compliance_types', {}).items():
+            compliance_types[compliance_type] = compliance_types.get(compliance_type, 0) + count
+    values = {
+        'Duration': round(duration_seconds * 1000, 1),
+        'ColdStart': 1 if cold_start else 0,
+        'ResourcesEvaluated': sum(compliance_types.values()),
+        'Compliant': compliance_types.get('COMPLIANT', 0),
+        'NonCompliant': compliance_types.get('NON_COMPLIANT', 0),
+        'NotApplicable': compliance_types.get('NOT_APPLICABLE', 0),
+        'EvaluationsSubmitted': sum(submission['evaluations'] for submission in submissions),
+        'PutEvaluationsBatches': sum(submission['batches'] for submission in submissions),
+        'FailedEvaluations': sum(submission['failed'] for submission in submissions),
+        'ApiCalls': api_totals['calls'],
+        'ApiErrors': api_totals['errors'],
+        'ApiRetries': api_totals['retries'],
+        'ApiThrottles': api_totals['throttles'],
+        'ApiTime': round(api_totals['seconds'] * 1000, 1)
+    }
+    record = {
+        '_aws': {
+            'Timestamp': int((timestamp or time.time()) * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': os.environ.get('RULE_RUNTIME_METRICS_NAMESPACE', DEFAULT_NAMESPACE),
+                'Dimensions': [list(DIMENSIONS)],
+                'Metrics': [{'Name': name, 'Unit': unit} for name, unit in METRIC_UNITS]
+            }]
+        },
+        'RuleName': rule_name or 'unknown',
+        'MessageType': message_type or 'unknown'
+    }
+    record.update(values)
+    return record
+
+def emit_emf_record(record):
+    """Print the EMF record as the single JSON line CloudWatch Logs extracts the metrics from."""
+    print(json.dumps(record, separators=(',', ':')))
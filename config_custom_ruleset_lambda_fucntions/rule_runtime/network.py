@@ -0,0 +1,282 @@
+# pylint: disable=invalid-name
+# pylint: enable=invalid-name
+"""
+Shared inventory of the EC2 network of an account and region.
+
+The network rules read the same few collections: VPCs, subnets, route tables, VPC endpoints,
+security groups and flow logs. get_network_snapshot() describes the collections a rule needs
+once, in parallel, and indexes them by VPC, subnet and security group id. The snapshot is kept
+in memory and in a compact gzipped JSON file under /tmp for ttl_seconds, so the next invocations,
+and the other rules run by the same container, reuse it instead of describing the network again:
+
+    snapshot = rule_runtime.get_network_snapshot(ec2_client, event['accountId'], ('vpcs', 'vpc_endpoints'))
+    for vpc_id in snapshot.vpcs:
+        endpoints = snapshot.vpc_endpoints_by_vpc.get(vpc_id, [])
+
+A change-triggered rule passes the configurationItemCaptureTime as not_before, so a collection
+described before the change is not used to evaluate it.
+
+The items are the ones returned by the describe calls, with their timestamps as ISO 8601 strings.
+"""
+
+import concurrent.futures
+import datetime
+import glob
+import gzip
+import json
+import os
+import threading
+import time
+
+from botocore.utils import parse_timestamp
+
+from rule_runtime.delta import STATE_DIRECTORY
+from rule_runtime.paginator import paginate
+
+# (describe operation, id key of the items) of the collections of a snapshot.
+COLLECTIONS = {
+    'vpcs': ('describe_vpcs', 'VpcId'),
+    'subnets': ('describe_subnets', 'SubnetId'),
+    'route_tables': ('describe_route_tables', 'RouteTableId'),
+    'vpc_endpoints': ('describe_vpc_endpoints', 'VpcEndpointId'),
+    'security_groups': ('describe_security_groups', 'GroupId'),
+    'flow_logs': ('describe_flow_logs', 'FlowLogId')
+}
+
+# A collection older than this is described again, overridden by the RULE_RUNTIME_NETWORK_TTL_SECONDS environment variable.
+DEFAULT_TTL_SECONDS = int(os.environ.get('RULE_RUNTIME_NETWORK_TTL_SECONDS', 300))
+
+# Guards _SNAPSHOTS, and makes the concurrent callers of an account wait for a single fetch.
+_SNAPSHOTS_LOCK = threading.Lock()
+
+# (account_id, region) -> NetworkSnapshot
+_SNAPSHOTS = {}
+
+class NetworkSnapshot:
+    """Collections of network resources and their indexes, built on first use.
+
+    Keyword arguments:
+    collections -- the dictionary of item lists, keyed by collection name (see COLLECTIONS)
+    fetched_at -- the time each collection was described, in seconds since the epoch, keyed by collection name
+    """
+
+    def __init__(self, collections=None, fetched_at=None):
+        self.collections = dict(collections or {})
+        self.fetched_at = dict(fetched_at or {})
+        self._indexes = {}
+
+    @classmethod
+    def from_account(cls, ec2_client, collection_names=tuple(COLLECTIONS)):
+        """Describe the collections in parallel and return them as a new snapshot.
+
+        Keyword arguments:
+        ec2_client -- the boto ec2 client of the account and region
+        collection_names -- the names of the collections to describe (default all of them)
+        """
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(collection_names) or 1) as executor:
+            futures = {name: executor.submit(_describe, ec2_client, name) for name in collection_names}
+            collections = {name: future.result() for name, future in futures.items()}
+        now = time.time()
+        return cls(collections, {name: now for name in collection_names})
+
+    @classmethod
+    def from_file(cls, path):
+        """Return the snapshot saved in the file, an empty one when the file is missing or unreadable."""
+        try:
+            with gzip.open(path, 'rt') as snapshot_file:
+                content = json.load(snapshot_file)
+            return cls(content['collections'], content['fetched_at'])
+        except (IOError, ValueError, KeyError):
+            return cls()
+
+    def to_file(self, path):
+        """Replace the file content by the snapshot, atomically."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = path + '.tmp'
+        with gzip.open(temp_path, 'wt') as snapshot_file:
+            json.dump({'collections': self.collections, 'fetched_at': self.fetched_at}, snapshot_file, separators=(',', ':'))
+        os.replace(temp_path, path)
+
+    def merged(self, other):
+        """Return a new snapshot with the collections of other replacing the ones of this snapshot."""
+        collections = dict(self.collections, **other.collections)
+        fetched_at = dict(self.fetched_at, **other.fetched_at)
+        return NetworkSnapshot(collections, fetched_at)
+
+    def stale_collections(self, collection_names, ttl_seconds=DEFAULT_TTL_SECONDS, not_before=None):
+        """Return the names, among collection_names, of the collections missing, older than ttl_seconds or described before not_before.
+
+        Keyword arguments:
+        collection_names -- the names of the collections used by the rule
+        ttl_seconds -- the age after which a collection is stale (default DEFAULT_TTL_SECONDS)
+        not_before -- a datetime, an ISO 8601 string or seconds since the epoch, the collections must be described after (default None)
+        """
+        expired_before = time.time() - ttl_seconds
+        if not_before is not None:
+            expired_before = max(expired_before, _epoch_seconds(not_before))
+        return [name for name in collection_names if self.fetched_at.get(name, 0) < expired_before]
+
+    @property
+    def vpcs(self):
+        """VPCs by VpcId."""
+        return self._by_id('vpcs')
+
+    @property
+    def subnets(self):
+        """Subnets by SubnetId."""
+        return self._by_id('subnets')
+
+    @property
+    def route_tables(self):
+        """Route tables by RouteTableId."""
+        return self._by_id('route_tables')
+
+    @property
+    def vpc_endpoints(self):
+        """VPC endpoints by VpcEndpointId."""
+        return self._by_id('vpc_endpoints')
+
+    @property
+    def security_groups(self):
+        """Security groups by GroupId."""
+        return self._by_id('security_groups')
+
+    @property
+    def subnets_by_vpc(self):
+        """Lists of subnets by VpcId."""
+        return self._grouped('subnets', 'VpcId')
+
+    @property
+    def route_tables_by_vpc(self):
+        """Lists of route tables by VpcId."""
+        return self._grouped('route_tables', 'VpcId')
+
+    @property
+    def vpc_endpoints_by_vpc(self):
+        """Lists of VPC endpoints by VpcId."""
+        return self._grouped('vpc_endpoints', 'VpcId')
+
+    @property
+    def security_groups_by_vpc(self):
+        """Lists of security groups by VpcId."""
+        return self._grouped('security_groups', 'VpcId')
+
+    @property
+    def flow_logs_by_resource(self):
+        """Lists of flow logs by ResourceId, the VPC, subnet or network interface they capture."""
+        return self._grouped('flow_logs', 'ResourceId')
+
+    @property
+    def route_table_by_subnet(self):
+        """Route table explicitly associated with each subnet, by SubnetId."""
+        return self._route_index()['by_subnet']
+
+    @property
+    def main_route_table_by_vpc(self):
+        """Main route table of each VPC, by VpcId."""
+        return self._route_index()['main_by_vpc']
+
+    @property
+    def public_route_tables(self):
+        """Ids of the route tables with a default route (0.0.0.0/0) or a route to an internet gateway."""
+        return self._route_index()['public']
+
+    def subnet_route_table(self, subnet_id, vpc_id):
+        """Return the route table of the subnet: the one explicitly associated with it, else the main one of its VPC, else None."""
+        return self.route_table_by_subnet.get(subnet_id) or self.main_route_table_by_vpc.get(vpc_id)
+
+    def is_public_subnet(self, subnet_id, vpc_id):
+        """Return True when the route table of the subnet (see subnet_route_table()) has a public route."""
+        route_table = self.subnet_route_table(subnet_id, vpc_id)
+        return route_table is not None and route_table['RouteTableId'] in self.public_route_tables
+
+    def _route_index(self):
+        # This walks the associations and routes once for the three route table indexes.
+        if 'routes' not in self._indexes:
+            index = {'by_subnet': {}, 'main_by_vpc': {}, 'public': set()}
+            for route_table in self._items('route_tables'):
+                for association in route_table.get('Associations', []):
+                    if association.get('Main'):
+                        index['main_by_vpc'][route_table['VpcId']] = route_table
+                    elif association.get('SubnetId'):
+                        index['by_subnet'][association['SubnetId']] = route_table
+                if any(_is_public_route(route) for route in route_table.get('Routes', [])):
+                    index['public'].add(route_table['RouteTableId'])
+            self._indexes['routes'] = index
+        return self._indexes['routes']
+
+    def _items(self, collection_name):
+        if collection_name not in self.collections:
+            raise ValueError('The network snapshot holds no {}, request it from get_network_snapshot().'.format(collection_name))
+        return self.collections[collection_name]
+
+    def _by_id(self, collection_name):
+        key = (collection_name, None)
+        if key not in self._indexes:
+            id_key = COLLECTIONS[collection_name][1]
+            self._indexes[key] = {item[id_key]: item for item in self._items(collection_name)}
+        return self._indexes[key]
+
+    def _grouped(self, collection_name, group_key):
+        key = (collection_name, group_key)
+        if key not in self._indexes:
+            index = {}
+            for item in self._items(collection_name):
+                index.setdefault(item.get(group_key), []).append(item)
+            self._indexes[key] = index
+        return self._indexes[key]
+
+def get_network_snapshot(ec2_client, account_id, collection_names=tuple(COLLECTIONS), ttl_seconds=DEFAULT_TTL_SECONDS, not_before=None):
+    """Return the NetworkSnapshot of the account and region of the client, holding at least collection_names.
+
+    Only the collections missing, older than ttl_seconds or described before not_before are described; the snapshot is then
+    saved for the next invocations of the container.
+
+    Keyword arguments:
+    ec2_client -- the boto ec2 client of the account and region, usually get_client('ec2', event)
+    account_id -- the account of the client, usually event['accountId']
+    collection_names -- the names of the collections used by the rule (default all of them, see COLLECTIONS)
+    ttl_seconds -- the age after which a collection is described again (default DEFAULT_TTL_SECONDS)
+    not_before -- the time the collections must be described after, usually the configurationItemCaptureTime of a change (default None)
+    """
+    region = ec2_client.meta.region_name
+    path = _snapshot_path(account_id, region)
+    with _SNAPSHOTS_LOCK:
+        snapshot = _SNAPSHOTS.get((account_id, region)) or NetworkSnapshot.from_file(path)
+        stale = snapshot.stale_collections(collection_names, ttl_seconds, not_before)
+        if stale:
+            snapshot = snapshot.merged(NetworkSnapshot.from_account(ec2_client, stale))
+            snapshot.to_file(path)
+        _SNAPSHOTS[(account_id, region)] = snapshot
+        return snapshot
+
+def clear_network_snapshots():
+    """Forget the snapshots kept in memory and delete their files, the next get_network_snapshot() calls describe the network again."""
+    with _SNAPSHOTS_LOCK:
+        _SNAPSHOTS.clear()
+        for path in glob.glob(_snapshot_path('*', '*')):
+            os.remove(path)
+
+def _is_public_route(route):
+    return route.get('DestinationCidrBlock') == '0.0.0.0/0' or route.get('GatewayId', '').startswith('igw-')
+
+def _snapshot_path(account_id, region):
+    return os.path.join(STATE_DIRECTORY, 'network-{}-{}.json.gz'.format(account_id, region))
+
+def _describe(ec2_client, collection_name):
+    operation_name = COLLECTIONS[collection_name][0]
+    items = list(paginate(ec2_client, operation_name, call_site='network.' + collection_name))
+    # This gives the fresh items the same JSON types (timestamps as strings) as the ones loaded from the file.
+    return json.loads(json.dumps(items, default=_json_default))
+
+def _epoch_seconds(timestamp):
+    if isinstance(timestamp, str):
+        timestamp = parse_timestamp(timestamp)
+    if isinstance(timestamp, datetime.datetime):
+        return timestamp.timestamp()
+    return timestamp
+
+def _json_default(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return str(value)
@@ -0,0 +1,93 @@
+# pylint: disable=invalid-name
+# pylint: enable=invalid-name
+"""
+Deployment zip of a rule or a standalone script, with the rule_runtime package next to it.
+
+The RDK rules and the standalone scripts of this folder import rule_runtime, which a Lambda function
+deployed from the script file alone does not have. build_package() writes a zip holding the script
+(or every file of a rule folder) and the rule_runtime package at its root, ready to be uploaded as
+the function code with the handler <script name>.lambda_handler. build_layer() writes the package
+alone under python/, the layout of a Lambda layer shared by several functions:
+
+    python -m rule_runtime.package ec2_vpc_public_subnet.py      # ec2_vpc_public_subnet.zip
+    python -m rule_runtime.package --layer rule_runtime_layer.zip
+
+The entries are sorted and dated 1980-01-01, so packaging unchanged sources gives the same zip.
+"""
+
+import argparse
+import os
+import zipfile
+
+# The directory of the rule_runtime package.
+PACKAGE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+# The root of the Python packages in a Lambda layer zip.
+LAYER_PREFIX = 'python'
+
+# Date of every zip entry, the earliest the zip format stores.
+ENTRY_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+# Files never packaged.
+EXCLUDED_DIRECTORIES = ('__pycache__',)
+EXCLUDED_SUFFIXES = ('.pyc', '.zip')
+
+def build_package(source_path, output_path=None):
+    """Write the deployment zip of a script or a rule folder, with the rule_runtime package, and return its path.
+
+    Keyword arguments:
+    source_path -- a script (ec2_vpc_public_subnet.py) or a rule folder (AMI_OUTDATED_CHECK)
+    output_path -- the zip to write (default the source path with a .zip extension, next to it)
+    """
+    source_path = os.path.abspath(source_path)
+    if output_path is None:
+        output_path = os.path.splitext(source_path.rstrip(os.sep))[0] + '.zip'
+    if os.path.isdir(source_path):
+        entries = list(_walk_files(source_path, ''))
+    else:
+        entries = [(source_path, os.path.basename(source_path))]
+    entries.extend(_walk_files(PACKAGE_DIRECTORY, 'rule_runtime'))
+    _write_zip(output_path, entries)
+    return output_path
+
+def build_layer(output_path):
+    """Write the Lambda layer zip of the rule_runtime package (python/rule_runtime/...) and return its path."""
+    _write_zip(output_path, _walk_files(PACKAGE_DIRECTORY, LAYER_PREFIX + '/rule_runtime'))
+    return output_path
+
+def _walk_files(directory, prefix):
+    # This yields (path, name in the zip) for the files of the directory, skipping the caches and the zips.
+    for root, directories, files in os.walk(directory):
+        directories[:] = sorted(name for name in directories if name not in EXCLUDED_DIRECTORIES)
+        for name in sorted(files):
+            if name.endswith(EXCLUDED_SUFFIXES):
+                continue
+            path = os.path.join(root, name)
+            relative_path = os.path.relpath(path, directory).replace(os.sep, '/')
+            yield path, prefix + '/' + relative_path if prefix else relative_path
+
+def _write_zip(output_path, entries):
+    with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as package:
+        for path, name in sorted(entries, key=lambda entry: entry[1]):
+            info = zipfile.ZipInfo(name, ENTRY_DATE_TIME)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.external_attr = 0o644 << 16
+            with open(path, 'rb') as source_file:
+                package.writestr(info, source_file.read())
+
+def command_line(argv=None):
+    parser = argparse.ArgumentParser(description='Build the deployment zip of a rule or a script, with rule_runtime.')
+    parser.add_argument('source_path', nargs='?', help='the script or the rule folder, e.g. ec2_vpc_public_subnet.py')
+    parser.add_argument('--output', help='the zip to write (default the source path with a .zip extension)')
+    parser.add_argument('--layer', metavar='LAYER_ZIP', help='write the Lambda layer zip of rule_runtime instead')
+    args = parser.parse_args(argv)
+
+    if args.layer:
+        print(build_layer(args.layer))
+    elif args.source_path:
+        print(build_package(args.source_path, args.output))
+    else:
+        parser.error('a source path or --layer is required')
+
+if __name__ == '__main__':
+    command_line()
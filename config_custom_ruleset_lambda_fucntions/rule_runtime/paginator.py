@@ -0,0 +1,102 @@
+# pylint: disable=invalid-name
+# pylint: enable=invalid-name
+"""
+Lazy pagination of the list/describe calls made by the rules.
+
+paginate() always asks for the largest page the operation accepts, so an inventory is walked
+with as few calls as possible, and yields the items one by one, so a rule can stop reading (and
+calling the API) as soon as it has its answer. The pages and items fetched are counted per call
+site, to see which listing dominates an invocation.
+"""
+
+import threading
+
+import jmespath
+
+# Largest page size accepted by the operations listed by the rules, keyed by (service, operation).
+MAX_PAGE_SIZES = {
+    ('apigateway', 'get_rest_apis'): 500,
+    ('config', 'get_compliance_details_by_config_rule'): 100,
+    ('config', 'list_discovered_resources'): 100,
+    ('ec2', 'describe_flow_logs'): 1000,
+    ('ec2', 'describe_images'): 1000,
+    ('ec2', 'describe_instances'): 1000,
+    ('ec2', 'describe_route_tables'): 100,
+    ('ec2', 'describe_security_groups'): 1000,
+    ('ec2', 'describe_subnets'): 1000,
+    ('ec2', 'describe_vpc_endpoints'): 1000,
+    ('ec2', 'describe_vpcs'): 1000,
+    ('efs', 'describe_file_systems'): 100,
+    ('elbv2', 'describe_listeners'): 400,
+    ('elbv2', 'describe_load_balancers'): 400,
+    ('elbv2', 'describe_rules'): 400,
+    ('iam', 'get_account_authorization_details'): 1000,
+    ('iam', 'list_attached_group_policies'): 1000,
+    ('iam', 'list_attached_role_policies'): 1000,
+    ('iam', 'list_attached_user_policies'): 1000,
+    ('iam', 'list_group_policies'): 1000,
+    ('iam', 'list_role_policies'): 1000,
+    ('iam', 'list_user_policies'): 1000,
+    ('iam', 'list_users'): 1000,
+}
+
+# Marker passed as page_size to use the largest page of the operation.
+LARGEST_PAGE = 'largest'
+
+_STATS_LOCK = threading.Lock()
+_STATS = {}
+
+def paginate(client, method, result_key=None, call_site=None, page_size=LARGEST_PAGE, **kwargs):
+    """Yield the items of every page of a list/describe operation, fetching the pages on demand.
+
+    Operations without a botocore paginator are called once and their result_key items yielded.
+    EC2 refuses a page size next to an explicit list of ids (InstanceIds, ImageIds...), so none is
+    sent in that case.
+
+    Keyword arguments:
+    client -- the boto client
+    method -- the client method (client.list_users) or its name ('list_users')
+    result_key -- the key, or JMESPath expression, of the items in a page (default the first result key of the paginator)
+    call_site -- the name under which the pages and items are counted (default 'service.operation')
+    page_size -- the number of items per page, None to let the service decide (default the largest accepted)
+    kwargs -- the parameters of the operation
+    """
+    operation_name = method if isinstance(method, str) else method.__name__
+    service_name = client.meta.service_model.service_name
+    call_site = call_site or '{}.{}'.format(service_name, operation_name)
+    if page_size == LARGEST_PAGE:
+        page_size = MAX_PAGE_SIZES.get((service_name, operation_name))
+        if service_name == 'ec2' and any(name.endswith('Ids') for name in kwargs):
+            page_size = None
+
+    if client.can_paginate(operation_name):
+        paginator = client.get_paginator(operation_name)
+        result_key = result_key or paginator.result_keys[0].expression
+        pages = paginator.paginate(PaginationConfig={'PageSize': page_size} if page_size else {}, **kwargs)
+    elif result_key:
+        pages = iter([getattr(client, operation_name)(**kwargs)])
+    else:
+        raise ValueError('A result_key is required to list {}, which cannot be paginated.'.format(call_site))
+
+    search = jmespath.compile(result_key).search
+    for page in pages:
+        items = search(page) or []
+        _record(call_site, len(items))
+        for item in items:
+            yield item
+
+def get_pagination_stats():
+    """Return the pages and items fetched so far, as {call_site: {'pages': int, 'items': int}}."""
+    with _STATS_LOCK:
+        return {call_site: dict(stats) for call_site, stats in _STATS.items()}
+
+def reset_pagination_stats():
+    """Forget the pages and items counted so far, usually at the start of an invocation."""
+    with _STATS_LOCK:
+        _STATS.clear()
+
+def _record(call_site, item_count):
+    with _STATS_LOCK:
+        stats = _STATS.setdefault(call_site, {'pages': 0, 'items': 0})
+        stats['pages'] += 1
+        stats['items'] += item_count
@@ -0,0 +1,104 @@
+# pylint: disable=invalid-name
+# pylint: enable=invalid-name
+"""
+Memoized verdicts of an analysis of IAM policy documents.
+
+The same managed policies (AdministratorAccess, ReadOnlyAccess...) are attached to thousands of
+users, groups and roles, and the same inline documents are pasted on many of them. A version of a
+managed policy never changes, and an inline document is identified by its content, so the verdict
+of an analysis can be kept under (policy ARN, version id, document hash), or the hash of the inline
+document, and every distinct policy analysed once per warm container. The hash of the managed
+policy document tells apart a policy deleted and created again under the same ARN, whose versions
+are numbered from v1 again:
+
+    full_star_verdicts = rule_runtime.PolicyAnalysisCache(is_full_star_document, 'full_star_allow', spill_to_disk=True)
+    if full_star_verdicts.managed_policy(policy_arn, version_id, document):
+        ...
+
+With spill_to_disk, the verdicts are also appended to a JSON lines file under /tmp, read back by
+the next cold start of the container. Give the analysis a new name when its code changes, so the
+verdicts of the previous code are not read back.
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+from rule_runtime.delta import STATE_DIRECTORY
+
+class PolicyAnalysisCache:
+    """Verdicts of one analysis, keyed by managed policy version and document hash, or inline document hash.
+
+    Keyword arguments:
+    analyse -- the analysis, a function of the policy document returning a JSON-serializable verdict
+    name -- the name of the analysis, naming its file (default the name of the analyse function)
+    spill_to_disk -- True to keep the verdicts in a file under /tmp too (default False)
+    """
+
+    def __init__(self, analyse, name=None, spill_to_disk=False):
+        self.analyse = analyse
+        self.name = name or analyse.__name__
+        self.path = os.path.join(STATE_DIRECTORY, 'policy-analysis-{}.jsonl'.format(self.name)) if spill_to_disk else None
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._verdicts = None
+
+    def managed_policy(self, policy_arn, version_id, document):
+        """Return the verdict of the version of the managed policy, analysing its document on the first call.
+
+        The document hash is part of the key, as the ARN and version id of a policy created again are reused.
+        """
+        return self._verdict('{}#{}#{}'.format(policy_arn, version_id, document_hash(document)), document)
+
+    def inline_policy(self, document):
+        """Return the verdict of the inline policy document, analysing it on the first call for this content."""
+        return self._verdict('sha256:' + document_hash(document), document)
+
+    def clear_verdicts(self):
+        """Forget the verdicts, and delete their file."""
+        with self._lock:
+            self._verdicts = {}
+            if self.path and os.path.exists(self.path):
+                os.remove(self.path)
+
+    def _verdict(self, key, document):
+        with self._lock:
+            if self._verdicts is None:
+                self._verdicts = self._load_verdicts()
+            if key in self._verdicts:
+                self.hits += 1
+                return self._verdicts[key]
+        verdict = self.analyse(document)
+        with self._lock:
+            self.misses += 1
+            self._verdicts[key] = verdict
+            self._append(key, verdict)
+        return verdict
+
+    def _load_verdicts(self):
+        verdicts = {}
+        if not self.path or not os.path.exists(self.path):
+            return verdicts
+        with open(self.path, encoding='utf-8') as verdicts_file:
+            for line in verdicts_file:
+                try:
+                    key, verdict = json.loads(line)
+                except ValueError:
+                    # This skips a line cut by a container frozen while writing it.
+                    continue
+                verdicts[key] = verdict
+        return verdicts
+
+    def _append(self, key, verdict):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as verdicts_file:
+            verdicts_file.write(json.dumps([key, verdict], separators=(',', ':')) + '\n')
+
+def document_hash(document):
+    """Return the SHA-256 of the policy document, the same whatever the order of its keys."""
+    canonical = json.dumps(document, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
@@ -0,0 +1,222 @@
+# pylint: disable=invalid-name
+# pylint: enable=invalid-name
+"""
+Compiled IAM policy documents, queried for the broad grants the IAM rules look for.
+
+compile_policy() normalizes the statements of a document once (a single statement or a list,
+strings or lists of actions, lower-cased action names) and compiles the Action, NotAction,
+Resource and NotResource patterns of every statement into a PatternTrie, a trie of the pattern
+characters walked with the '*' and '?' wildcards. The compiled policy then answers any number of
+questions with one walk of each trie:
+
+    policy = rule_runtime.compile_policy(document)
+    policy.allows('*')                   # an Allow statement grants every action
+    policy.allows('iam:*', '*')          # ... every IAM action on every resource
+    policy.grants({'admin': FULL_ADMIN, 'iam': service_admin('iam')})   # {'admin', 'iam'} or a subset
+
+A query is an action, or an action prefix followed by '*', and a resource in the same form.
+Every action name is 'service:action', so the query '*' (or '*:*') is matched structurally: it is
+covered by any pattern whose service and action parts are only '*' ('*', '*:*'), not only by '*'.
+The Allow statements are considered alone: a Deny is not subtracted from them and a Condition does
+not restrict them, as the rules flag the grant itself.
+"""
+
+# Every action on every resource.
+FULL_ADMIN = ('*', '*')
+
+class PatternTrie:
+    """Set of IAM wildcard patterns ('*' any sequence, '?' any character) stored as a character trie.
+
+    Keyword arguments:
+    patterns -- the patterns
+    ignore_case -- True to compare lower-cased patterns and queries, as for the action names (default False)
+    """
+
+    __slots__ = ('ignore_case', '_root')
+
+    def __init__(self, patterns=(), ignore_case=False):
+        self.ignore_case = ignore_case
+        self._root = _TrieNode()
+        for pattern in patterns:
+            self.add_pattern(pattern)
+
+    def add_pattern(self, pattern):
+        """Add a pattern to the set."""
+        node = self._root
+        for character in self._normalized(pattern):
+            node = node.children.setdefault(character, _TrieNode())
+            node.is_star = character == '*'
+        node.terminal = True
+
+    def covers(self, query):
+        """Return True when a single pattern matches everything the query matches.
+
+        Keyword arguments:
+        query -- a name ('iam:passrole'), or a prefix followed by '*' ('iam:*', '*')
+        """
+        query = self._normalized(query)
+        if not query.endswith('*'):
+            return any(node.terminal for node in self._final_nodes(query))
+        # A pattern covers every name starting with prefix when it is some r + '*', r matching a prefix of prefix.
+        for nodes in self._walk_steps(query[:-1]):
+            for node in nodes:
+                star = node.children.get('*')
+                if star and star.terminal:
+                    return True
+        return False
+
+    def intersects(self, query):
+        """Return True when a pattern matches at least one of the names the query matches."""
+        query = self._normalized(query)
+        if not query.endswith('*'):
+            return any(node.terminal for node in self._final_nodes(query))
+        # Every node of the trie leads to a pattern end, so a pattern still alive after the prefix matches a name starting with it.
+        return bool(self._final_nodes(query[:-1]))
+
+    def _normalized(self, text):
+        return text.lower() if self.ignore_case else text
+
+    def _final_nodes(self, text):
+        nodes = []
+        for nodes in self._walk_steps(text):
+            pass
+        return nodes
+
+    def _walk_steps(self, text):
+        # This yields the nodes reached after every prefix of text, the '*' nodes consuming any number of characters.
+        nodes = _star_closure([self._root])
+        yield nodes
+        for character in text:
+            next_nodes = [node for node in nodes if node.is_star]
+            for node in nodes:
+                for key in (character, '?'):
+                    if key != '*' and key in node.children:
+                        next_nodes.append(node.children[key])
+            nodes = _star_closure(next_nodes)
+            yield nodes
+            if not nodes:
+                return
+
+class CompiledStatement:
+    """One normalized statement, its action and resource patterns compiled.
+
+    Keyword arguments:
+    statement -- the statement dictionary of the policy document
+    """
+
+    __slots__ = ('effect', 'actions', 'not_action', 'all_actions', 'resources', 'not_resource')
+
+    def __init__(self, statement):
+        self.effect = statement.get('Effect', 'Allow')
+        self.not_action = 'NotAction' in statement
+        actions = _as_list(statement.get('NotAction' if self.not_action else 'Action'))
+        self.actions = PatternTrie(actions, ignore_case=True)
+        # True when a pattern matches every action name, as '*' and '*:*' do.
+        self.all_actions = any(_is_all_actions(action) for action in actions)
+        self.not_resource = 'NotResource' in statement
+        # A statement without Resource is an identity or trust policy statement applying to the principal itself.
+        self.resources = PatternTrie(_as_list(statement.get('NotResource' if self.not_resource else 'Resource', '*')))
+
+    def allows(self, action, resource=None):
+        """Return True when the statement is an Allow granting everything the action and resource queries match."""
+        if self.effect != 'Allow':
+            return False
+        if _is_all_actions(action):
+            # The trie compares characters, so '*' and '*:*' are answered from the parts of the patterns.
+            granted = not self.actions.intersects('*') if self.not_action else self.all_actions
+        elif self.not_action:
+            granted = not (self.all_actions or self.actions.intersects(action))
+        else:
+            granted = self.actions.covers(action)
+        if not granted or resource is None:
+            return granted
+        if self.not_resource:
+            return not self.resources.intersects(resource)
+        return self.resources.covers(resource)
+
+class CompiledPolicy:
+    """Compiled statements of a policy document.
+
+    Keyword arguments:
+    document -- the policy document dictionary, or its Statement (a statement or a list of statements)
+    """
+
+    __slots__ = ('statements',)
+
+    def __init__(self, document):
+        statements = document.get('Statement', []) if isinstance(document, dict) and 'Statement' in document else document
+        if isinstance(statements, dict):
+            statements = [statements]
+        elif not isinstance(statements, list):
+            statements = []
+        self.statements = [CompiledStatement(statement) for statement in statements
+                           if isinstance(statement, dict) and ('Action' in statement or 'NotAction' in statement)]
+
+    def allows(self, action, resource=None):
+        """Return True when an Allow statement grants everything the action (and resource, when given) queries match.
+
+        Keyword arguments:
+        action -- an action or an action prefix followed by '*' ('iam:*'), '*' for every action
+        resource -- a resource in the same form, None to accept a grant on any resource (default None)
+        """
+        return any(statement.allows(action, resource) for statement in self.statements)
+
+    def grants(self, queries):
+        """Return the names of the queries granted by the policy, in one pass over its statements.
+
+        Keyword arguments:
+        queries -- the (action, resource) queries keyed by name, as FULL_ADMIN or service_admin()
+        """
+        granted = set()
+        for statement in self.statements:
+            for name, (action, resource) in queries.items():
+                if name not in granted and statement.allows(action, resource):
+                    granted.add(name)
+            if len(granted) == len(queries):
+                break
+        return granted
+
+def compile_policy(document):
+    """Return the CompiledPolicy of a policy document, or of its Statement."""
+    return CompiledPolicy(document)
+
+def service_admin(service):
+    """Return the query of every action of the service ('iam', 's3'...) on every resource."""
+    return ('{}:*'.format(service), '*')
+
+class _TrieNode:
+    __slots__ = ('children', 'terminal', 'is_star')
+
+    def __init__(self):
+        self.children = {}
+        self.terminal = False
+        self.is_star = False
+
+def _star_closure(nodes):
+    # This adds the '*' children, which match the empty sequence, of the nodes.
+    closure = []
+    seen = set()
+    pending = list(nodes)
+    while pending:
+        node = pending.pop()
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+        closure.append(node)
+        if '*' in node.children:
+            pending.append(node.children['*'])
+    return closure
+
+def _is_all_actions(action):
+    # This splits 'service:action' and checks that every part is made of '*' only.
+    if not isinstance(action, str):
+        return False
+    parts = action.split(':')
+    return len(parts) <= 2 and all(part and part == '*' * len(part) for part in parts)
+
+def _as_list(value):
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [value]
+    return list(value)
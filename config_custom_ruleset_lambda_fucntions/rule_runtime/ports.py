@@ -0,0 +1,77 @@
+# pylint: disable=invalid-name
+# pylint: enable=invalid-name
+"""
+Port sets of the security group rules, as merged intervals.
+
+A security group permission opens a port range, 0-65535 at worst, and the rules compare it with
+forbidden or authorized ranges. PortIntervals keeps a set of ports as sorted, merged, inclusive
+(begin, end) intervals, so a lookup is a bisection whatever the width of the ranges:
+
+    open_ports = rule_runtime.PortIntervals([(0, 65535), (22, 22)])
+    open_ports.overlaps(8080, 8080)   # True
+    rule_runtime.PortIntervals([(80, 80), (443, 443)]).covers(80, 443)   # False
+"""
+
+import bisect
+
+MIN_PORT = 0
+MAX_PORT = 65535
+
+class PortIntervals:
+    """Immutable set of ports stored as sorted, disjoint, inclusive (begin, end) intervals.
+
+    Keyword arguments:
+    intervals -- the (begin, end) ranges of ports, in any order, overlapping or not; the empty
+        ones (begin > end) are ignored
+    """
+
+    __slots__ = ('_begins', '_ends')
+
+    def __init__(self, intervals=()):
+        self._begins = []
+        self._ends = []
+        for begin, end in sorted((begin, end) for begin, end in intervals if begin <= end):
+            if self._ends and begin <= self._ends[-1] + 1:
+                self._ends[-1] = max(self._ends[-1], end)
+            else:
+                self._begins.append(begin)
+                self._ends.append(end)
+
+    def __iter__(self):
+        return iter(zip(self._begins, self._ends))
+
+    def __len__(self):
+        return len(self._begins)
+
+    def __bool__(self):
+        return bool(self._begins)
+
+    def __contains__(self, port):
+        return self.overlaps(port, port)
+
+    def __repr__(self):
+        return 'PortIntervals({})'.format(list(self))
+
+    def overlaps(self, begin, end):
+        """Return True when at least one port of begin-end is in the set."""
+        # This is the last interval starting at or before end, the only one which can overlap.
+        index = bisect.bisect_right(self._begins, end) - 1
+        return index >= 0 and self._ends[index] >= begin
+
+    def covers(self, begin, end):
+        """Return True when every port of begin-end is in the set."""
+        # The intervals are merged, so the whole range must fall in the single one holding begin.
+        index = bisect.bisect_right(self._begins, begin) - 1
+        return index >= 0 and self._ends[index] >= end
+
+def permission_port_range(permission):
+    """Return the (begin, end) ports of an EC2 IpPermission, all of them for the '-1' protocol.
+
+    Keyword arguments:
+    permission -- the IpPermission dictionary, with the API (FromPort) or the configuration item (fromPort) keys
+    """
+    protocol = permission.get('IpProtocol', permission.get('ipProtocol'))
+    if str(protocol) == '-1':
+        return MIN_PORT, MAX_PORT
+    return (permission.get('FromPort', permission.get('fromPort')),
+            permission.get('ToPort', permission.get('toPort')))
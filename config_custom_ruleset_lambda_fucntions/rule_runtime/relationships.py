@@ -0,0 +1,149 @@
+# pylint: disable=invalid-name
+# pylint: enable=invalid-name
+"""
+Resolution of the configuration items related to the one a change-triggered rule evaluates.
+
+A rule following the relationships of its configuration item (subnet -> route table, subnet ->
+VPC -> route tables...) reads the related items from the AWS Config inventory. ConfigItemResolver
+fetches them with batch_get_resource_config, up to 100 keys per call, and keeps them for the warm
+container keyed by (resourceType, resourceId, configurationStateId), so a burst of subnet changes
+in one VPC resolves the route tables of that VPC once.
+
+Every item seen, the configuration items of the notifications included (see observe()), records
+the latest configurationStateId of its resource: a cached item is not returned anymore once a newer
+state of its resource has been seen, nor after ttl_seconds.
+"""
+
+import json
+import os
+import threading
+import time
+
+# Most resource keys accepted by one batch_get_resource_config call.
+BATCH_GET_MAX_KEYS = 100
+
+# A cached item older than this is fetched again, overridden by the RULE_RUNTIME_RELATIONSHIP_TTL_SECONDS environment variable.
+DEFAULT_TTL_SECONDS = int(os.environ.get('RULE_RUNTIME_RELATIONSHIP_TTL_SECONDS', 300))
+
+class ConfigItemResolver:
+    """Batched, memoized lookup of the latest configuration item of related resources.
+
+    The items are returned with their configuration parsed. The ones returned by resolve() come
+    from batch_get_resource_config, which does not return the relationships of the items; ask
+    for with_relationships=True to read them from get_resource_config_history instead.
+
+    Keyword arguments:
+    ttl_seconds -- the age after which a cached item is fetched again (default DEFAULT_TTL_SECONDS)
+    """
+
+    def __init__(self, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        # (resourceType, resourceId, configurationStateId) -> (item, time it was cached)
+        self._items = {}
+        # (resourceType, resourceId) -> latest configurationStateId seen
+        self._latest_states = {}
+
+    def observe(self, configuration_item):
+        """Record a configuration item seen by the rule, usually the one of the change notification, and cache it."""
+        item = _parsed(configuration_item)
+        with self._lock:
+            self._remember(item)
+
+    def resolve(self, config_client, relationships, with_relationships=False):
+        """Return the latest configuration item of every related resource, None for the ones AWS Config does not know.
+
+        Keyword arguments:
+        config_client -- the boto config client
+        relationships -- the relationship dictionaries, with their 'resourceType' and 'resourceId'
+        with_relationships -- True when the relationships of the items are needed (default False)
+        """
+        keys = [(relationship['resourceType'], relationship['resourceId']) for relationship in relationships]
+        found = {}
+        missing = []
+        with self._lock:
+            for key in keys:
+                item = self._cached(key, with_relationships)
+                if item is None:
+                    missing.append(key)
+                else:
+                    found[key] = item
+        missing = list(dict.fromkeys(missing))
+        if missing:
+            fetched = _history_items(config_client, missing) if with_relationships else _batch_items(config_client, missing)
+            with self._lock:
+                for item in fetched:
+                    self._remember(item)
+                    found[(item['resourceType'], item['resourceId'])] = item
+        return [found.get(key) for key in keys]
+
+    def resolve_one(self, config_client, relationship, with_relationships=False):
+        """Return the latest configuration item of the related resource, None when AWS Config does not know it."""
+        return self.resolve(config_client, [relationship], with_relationships)[0]
+
+    def clear_cache(self):
+        """Forget every cached item and state."""
+        with self._lock:
+            self._items.clear()
+            self._latest_states.clear()
+
+    def _cached(self, key, with_relationships):
+        state_id = self._latest_states.get(key)
+        cached = self._items.get(key + (state_id,))
+        if cached is None or time.time() - cached[1] > self.ttl_seconds:
+            return None
+        if with_relationships and 'relationships' not in cached[0]:
+            return None
+        return cached[0]
+
+    def _remember(self, item):
+        key = (item['resourceType'], item['resourceId'])
+        state_id = str(item.get('configurationStateId'))
+        latest_state_id = self._latest_states.get(key)
+        if latest_state_id is not None and _state_order(latest_state_id) > _state_order(state_id):
+            # This is an older state than one already seen, it must not replace it.
+            return
+        if latest_state_id is not None and latest_state_id != state_id:
+            self._items.pop(key + (latest_state_id,), None)
+        previous = self._items.get(key + (state_id,))
+        if previous and 'relationships' in previous[0] and 'relationships' not in item:
+            # This keeps the relationships of a history item when the same state comes back from a batch.
+            item = dict(item, relationships=previous[0]['relationships'])
+        self._latest_states[key] = state_id
+        self._items[key + (state_id,)] = (item, time.time())
+
+def _batch_items(config_client, keys):
+    items = []
+    for start in range(0, len(keys), BATCH_GET_MAX_KEYS):
+        resource_keys = [{'resourceType': resource_type, 'resourceId': resource_id}
+                         for resource_type, resource_id in keys[start:start + BATCH_GET_MAX_KEYS]]
+        while resource_keys:
+            response = config_client.batch_get_resource_config(resourceKeys=resource_keys)
+            items.extend(_parsed(item) for item in response['baseConfigurationItems'])
+            unprocessed = response.get('unprocessedResourceKeys') or []
+            # This stops on a call which processed nothing, rather than looping on it.
+            if len(unprocessed) == len(resource_keys):
+                break
+            resource_keys = unprocessed
+    return items
+
+def _history_items(config_client, keys):
+    items = []
+    for resource_type, resource_id in keys:
+        try:
+            response = config_client.get_resource_config_history(resourceType=resource_type, resourceId=resource_id, limit=1)
+        except config_client.exceptions.ResourceNotDiscoveredException:
+            continue
+        items.extend(_parsed(item) for item in response['configurationItems'][:1])
+    return items
+
+def _parsed(item):
+    if isinstance(item.get('configuration'), str):
+        item = dict(item, configuration=json.loads(item['configuration']))
+    return item
+
+def _state_order(state_id):
+    try:
+        return int(state_id)
+    except (TypeError, ValueError):
+        return 0
@@ -0,0 +1,248 @@
+# pylint: disable=invalid-name
+# pylint: enable=invalid-name
+"""
+Offline replay of a Config rule against recorded API responses.
+
+A fixture directory holds one file per API operation, <fixture_dir>/<service>/<operation>.json,
+with either a single response (returned on every call) or a list of responses (returned in
+order, the last one repeated). A response with an "Error" key is raised as a ClientError.
+Timestamps are written as strings and turned into datetimes following the API model.
+
+    fixtures/iam/list_users.json
+    fixtures/iam/list_mfa_devices.json
+
+The rule module is loaded from its file, its get_client() calls are answered from the fixtures
+and the evaluations it sends to put_evaluations are captured, so a rule runs on a laptop with
+no AWS account and no network:
+
+    python -m rule_runtime.replay IAM_USER_MFA_ENABLED/IAM_USER_MFA_ENABLED.py fixtures/ --parameters '{"WhitelistedUserList": ""}'
+"""
+
+import argparse
+import collections
+import datetime
+import importlib.machinery
+import importlib.util
+import json
+import os
+import sys
+import threading
+
+import boto3
+import botocore
+from botocore.awsrequest import AWSResponse
+from botocore.utils import parse_timestamp
+
+from rule_runtime.authorization import clear_authorization_snapshots
+from rule_runtime.clients import set_client_factory
+from rule_runtime.credential_report import clear_credential_reports
+from rule_runtime.network import clear_network_snapshots
+
+FIXTURE_REGION = 'us-east-1'
+FIXTURE_ACCOUNT_ID = '123456789012'
+
+# Any resultToken but TESTMODE, so the evaluations reach put_evaluations and are captured.
+REPLAY_RESULT_TOKEN = 'replay-result-token'
+
+# Response of config.put_evaluations when the fixture directory has none.
+DEFAULT_PUT_EVALUATIONS_RESPONSE = {'FailedEvaluations': []}
+
+class FixtureClientFactory:
+    """Build boto clients answering every call from the fixture directory, for set_client_factory().
+
+    The responses are returned from the before-call hook of the client, the one botocore's Stubber
+    uses, so the operations can be called in any order. Every call is counted in call_counts, and
+    recorded in calls, and the evaluations sent to put_evaluations are kept in evaluations.
+
+    Keyword arguments:
+    fixture_dir -- the directory of the recorded responses
+    region -- the region of the clients (default FIXTURE_REGION)
+    record_calls -- False to only count the calls, not keep their parameters (default True)
+    """
+
+    def __init__(self, fixture_dir, region=FIXTURE_REGION, record_calls=True):
+        self.fixture_dir = fixture_dir
+        self.region = region
+        self.record_calls = record_calls
+        self.calls = []
+        self.call_counts = collections.Counter()
+        self.evaluations = []
+        self._responses = {}
+        self._lock = threading.Lock()
+        self._session = boto3.session.Session(aws_access_key_id='replay', aws_secret_access_key='replay',
+                                              region_name=region)
+
+    def __call__(self, service, region=None, credentials=None):
+        client = self._session.client(service, region_name=region or self.region)
+        client.meta.events.register_first('before-parameter-build', self._record)
+        client.meta.events.register_first('before-call', self._reply)
+        return client
+
+    def _record(self, model, params, context, **kwargs):
+        service_name = model.service_model.service_name
+        operation_name = botocore.xform_name(model.name)
+        # This hands the call parameters to _reply(), which only sees the serialized request.
+        context['replay_params'] = params
+        with self._lock:
+            self.call_counts[(service_name, operation_name)] += 1
+            if self.record_calls:
+                self.calls.append((service_name, operation_name, params))
+            if (service_name, operation_name) == ('config', 'put_evaluations'):
+                self.evaluations.extend(params.get('Evaluations', []))
+
+    def _reply(self, model, context, **kwargs):
+        service_name = model.service_model.service_name
+        operation_name = botocore.xform_name(model.name)
+        response = self._next_response(service_name, operation_name, context.get('replay_params', {}))
+        if 'Error' in response:
+            return AWSResponse(None, response.get('StatusCode', 400), {}, None), response
+        return AWSResponse(None, 200, {}, None), _parse_timestamps(model.output_shape, response)
+
+    def _next_response(self, service_name, operation_name, params):
+        key = (service_name, operation_name)
+        with self._lock:
+            if key not in self._responses:
+                self._responses[key] = self._load_responses(service_name, operation_name)
+            responses = self._responses[key]
+            return responses.popleft() if len(responses) > 1 else responses[0]
+
+    def _load_responses(self, service_name, operation_name):
+        path = os.path.join(self.fixture_dir, service_name, operation_name + '.json')
+        if not os.path.exists(path):
+            if (service_name, operation_name) == ('config', 'put_evaluations'):
+                return collections.deque([DEFAULT_PUT_EVALUATIONS_RESPONSE])
+            raise ValueError('No fixture for {}.{}, expected in {}.'.format(service_name, operation_name, path))
+        with open(path, encoding='utf-8') as fixture_file:
+            responses = json.load(fixture_file)
+        if not isinstance(responses, list):
+            responses = [responses]
+        if not responses:
+            raise ValueError('The fixture {} holds no response.'.format(path))
+        return collections.deque(responses)
+
+def load_rule(rule_path):
+    """Import the rule from its file (the .PY extension included) and return the module.
+
+    The module gets a name of its own, so several rules (or the same rule twice) can be loaded.
+
+    Keyword arguments:
+    rule_path -- the path of the rule code, usually <RULE>/<RULE>.py
+    """
+    module_name = 'replayed_' + os.path.splitext(os.path.basename(rule_path))[0]
+    loader = importlib.machinery.SourceFileLoader(module_name, rule_path)
+    spec = importlib.util.spec_from_loader(module_name, loader)
+    module = importlib.util.module_from_spec(spec)
+    loader.exec_module(module)
+    return module
+
+def build_invoking_event(configuration_item=None, message_type=None, notification_time=None):
+    """Return the invokingEvent dictionary of a synthetic invocation.
+
+    A ConfigurationItemChangeNotification when a configuration_item is given, a ScheduledNotification otherwise.
+
+    Keyword arguments:
+    configuration_item -- the configurationItem dictionary of a change triggered invocation (default None)
+    message_type -- the messageType, to force e.g. OversizedConfigurationItemChangeNotification (default None)
+    notification_time -- the notificationCreationTime or configurationItemCaptureTime (default now)
+    """
+    notification_time = notification_time or datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+    if configuration_item is None:
+        return {
+            'messageType': message_type or 'ScheduledNotification',
+            'notificationCreationTime': notification_time,
+            'awsAccountId': FIXTURE_ACCOUNT_ID
+        }
+    configuration_item = dict(configuration_item)
+    configuration_item.setdefault('configurationItemCaptureTime', notification_time)
+    configuration_item.setdefault('configurationItemStatus', 'OK')
+    configuration_item.setdefault('awsAccountId', FIXTURE_ACCOUNT_ID)
+    return {
+        'messageType': message_type or 'ConfigurationItemChangeNotification',
+        'configurationItem': configuration_item,
+        'notificationCreationTime': notification_time,
+        'awsAccountId': FIXTURE_ACCOUNT_ID
+    }
+
+def build_event(invoking_event, rule_parameters=None, rule_name='replayed-rule', event_left_scope=False):
+    """Return the lambda event of a synthetic invocation, as AWS Config sends it.
+
+    Keyword arguments:
+    invoking_event -- the invokingEvent dictionary, usually built by build_invoking_event()
+    rule_parameters -- the ruleParameters dictionary (default None)
+    rule_name -- the configRuleName (default 'replayed-rule')
+    event_left_scope -- the eventLeftScope flag (default False)
+    """
+    return {
+        'version': '1.0',
+        'invokingEvent': json.dumps(invoking_event),
+        'ruleParameters': json.dumps(rule_parameters or {}),
+        'resultToken': REPLAY_RESULT_TOKEN,
+        'eventLeftScope': event_left_scope,
+        'executionRoleArn': 'arn:aws:iam::{}:role/config-role'.format(FIXTURE_ACCOUNT_ID),
+        'configRuleArn': 'arn:aws:config:{}:{}:config-rule/{}'.format(FIXTURE_REGION, FIXTURE_ACCOUNT_ID, rule_name),
+        'configRuleName': rule_name,
+        'configRuleId': 'config-rule-replay',
+        'accountId': FIXTURE_ACCOUNT_ID
+    }
+
+def replay(rule, fixture_dir, event, region=FIXTURE_REGION, factory=None):
+    """Run the lambda_handler of the rule with its clients answered from the fixture directory.
+
+    Return a dictionary with the handler 'response', the 'evaluations' sent to put_evaluations and
+    the API 'calls' made, as (service, operation, params) tuples.
+
+    Keyword arguments:
+    rule -- the rule module, or the path of its code
+    fixture_dir -- the directory of the recorded responses
+    event -- the lambda event, usually built by build_event()
+    region -- the region of the clients (default FIXTURE_REGION)
+    factory -- the FixtureClientFactory answering the calls (default one reading fixture_dir)
+    """
+    if isinstance(rule, str):
+        rule = load_rule(rule)
+    factory = factory or FixtureClientFactory(fixture_dir, region)
+    # This keeps a snapshot or credential report of a previous replay from answering in place of the fixtures.
+    clear_authorization_snapshots()
+    clear_credential_reports()
+    clear_network_snapshots()
+    set_client_factory(factory)
+    try:
+        response = rule.lambda_handler(event, None)
+    finally:
+        set_client_factory(None)
+    return {'response': response, 'evaluations': factory.evaluations, 'calls': factory.calls}
+
+def _parse_timestamps(shape, value):
+    # This turns the timestamps of the JSON fixture into datetimes, as botocore parses them.
+    if shape is None or value is None:
+        return value
+    if shape.type_name == 'structure' and isinstance(value, dict):
+        return {name: _parse_timestamps(shape.members.get(name), member) for name, member in value.items()}
+    if shape.type_name == 'list' and isinstance(value, list):
+        return [_parse_timestamps(shape.member, member) for member in value]
+    if shape.type_name == 'map' and isinstance(value, dict):
+        return {name: _parse_timestamps(shape.value, member) for name, member in value.items()}
+    if shape.type_name == 'timestamp' and isinstance(value, (str, int, float)):
+        return parse_timestamp(value)
+    return value
+
+def command_line(argv=None):
+    parser = argparse.ArgumentParser(description='Run a Config rule offline against recorded API responses.')
+    parser.add_argument('rule_path', help='the rule code, e.g. IAM_USER_MFA_ENABLED/IAM_USER_MFA_ENABLED.py')
+    parser.add_argument('fixture_dir', help='the directory of the recorded responses, <service>/<operation>.json')
+    parser.add_argument('--configuration-item', help='a JSON file holding the configurationItem (default a scheduled invocation)')
+    parser.add_argument('--parameters', default='{}', help='the rule parameters, as JSON')
+    parser.add_argument('--rule-name', default='replayed-rule')
+    args = parser.parse_args(argv)
+
+    configuration_item = None
+    if args.configuration_item:
+        with open(args.configuration_item, encoding='utf-8') as configuration_item_file:
+            configuration_item = json.load(configuration_item_file)
+    event = build_event(build_invoking_event(configuration_item), json.loads(args.parameters), args.rule_name)
+    result = replay(args.rule_path, args.fixture_dir, event)
+    print(json.dumps(result['evaluations'], indent=2, default=str))
+    print('{} evaluations, {} API calls'.format(len(result['evaluations']), len(result['calls'])), file=sys.stderr)
+
+if __name__ == '__main__':
+    command_line()
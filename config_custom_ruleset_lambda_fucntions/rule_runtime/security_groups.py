@@ -0,0 +1,78 @@
+# pylint: disable=invalid-name
+# pylint: enable=invalid-name
+"""
+Warm-container cache of the security group permissions read by the change-triggered rules.
+
+An instance change needs the permissions of its security groups, and the same shared groups
+(default, bastion, web...) come back in every change of an autoscaling burst. SecurityGroupCache
+describes the groups missing from the cache in one describe_security_groups(GroupIds=[...]) call
+and keeps their IpPermissions by group id, until a change notification of the group invalidates
+them (see observe()) or ttl_seconds pass, as the notification may reach another container.
+"""
+
+import os
+import threading
+import time
+
+from rule_runtime.paginator import paginate
+
+SECURITY_GROUP_RESOURCE_TYPE = 'AWS::EC2::SecurityGroup'
+
+# Cached permissions older than this are described again, overridden by the RULE_RUNTIME_SECURITY_GROUP_TTL_SECONDS environment variable.
+DEFAULT_TTL_SECONDS = int(os.environ.get('RULE_RUNTIME_SECURITY_GROUP_TTL_SECONDS', 300))
+
+class SecurityGroupCache:
+    """IpPermissions of the security groups by GroupId, described in batches and kept for ttl_seconds.
+
+    Keyword arguments:
+    ttl_seconds -- the age after which the permissions of a group are described again (default DEFAULT_TTL_SECONDS)
+    """
+
+    def __init__(self, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        # GroupId -> (IpPermissions, time they were described)
+        self._permissions = {}
+
+    def get_ip_permissions(self, ec2_client, group_ids):
+        """Return the IpPermissions of the groups as {group_id: permissions}, describing the uncached ones in one call.
+
+        Keyword arguments:
+        ec2_client -- the boto ec2 client
+        group_ids -- the ids of the security groups
+        """
+        expired_before = time.time() - self.ttl_seconds
+        with self._lock:
+            permissions = {group_id: self._permissions[group_id][0] for group_id in group_ids
+                           if group_id in self._permissions and self._permissions[group_id][1] >= expired_before}
+        missing = sorted(set(group_ids) - set(permissions))
+        if missing:
+            now = time.time()
+            described = {group['GroupId']: group['IpPermissions']
+                         for group in paginate(ec2_client, 'describe_security_groups', GroupIds=missing)}
+            with self._lock:
+                for group_id, group_permissions in described.items():
+                    self._permissions[group_id] = (group_permissions, now)
+            permissions.update(described)
+        return permissions
+
+    def observe(self, configuration_item):
+        """Drop the cached permissions of the security group of a change notification.
+
+        Return True when the configuration item is a security group.
+
+        Keyword arguments:
+        configuration_item -- the configurationItem dictionary in the invokingEvent
+        """
+        if configuration_item.get('resourceType') != SECURITY_GROUP_RESOURCE_TYPE:
+            return False
+        self.invalidate(configuration_item['resourceId'])
+        return True
+
+    def invalidate(self, group_id=None):
+        """Forget the permissions of the group, or of every group when group_id is None."""
+        with self._lock:
+            if group_id is None:
+                self._permissions.clear()
+            else:
+                self._permissions.pop(group_id, None)
@@ -0,0 +1,148 @@
+# pylint: disable=invalid-name
+# pylint: enable=invalid-name
+"""
+Concurrent, throttle-aware submission of evaluations to AWS Config.
+
+Evaluations are cut in batches of PUT_EVALUATIONS_BATCH_SIZE and several batches are sent at
+once by a bounded pool of workers. Only the evaluations returned in FailedEvaluations (or a
+whole batch rejected by throttling) are sent again, after a jittered exponential backoff. The
+evaluations still rejected after the last attempt fail the invocation with an
+EvaluationSubmissionError, so Config does not take a partial report for a complete one.
+"""
+
+import itertools
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import botocore
+
+from rule_runtime.evaluations import to_api_evaluation
+from rule_runtime.metrics import record_submission
+
+# Maximum number of evaluations accepted by a single put_evaluations call.
+PUT_EVALUATIONS_BATCH_SIZE = 100
+
+# Number of batches in flight at the same time.
+DEFAULT_MAX_WORKERS = 4
+
+# Number of put_evaluations attempts for each evaluation before giving up on it.
+DEFAULT_MAX_ATTEMPTS = 5
+
+# Bounds of the jittered exponential backoff between attempts, in seconds.
+BACKOFF_BASE_SECONDS = 0.2
+BACKOFF_CAP_SECONDS = 5
+
+THROTTLING_ERROR_CODES = ('ThrottlingException', 'Throttling', 'TooManyRequestsException', 'RequestLimitExceeded')
+
+class EvaluationSubmissionError(Exception):
+    """Error raised by put_evaluations() when evaluations are still rejected after max_attempts.
+
+    Keyword arguments:
+    metrics -- the submission metrics, the rejected evaluations in 'failed_evaluations'
+    """
+
+    def __init__(self, metrics):
+        super().__init__('Failed to report all evaluations successfully to the AWSConfig service. Failed: '
+                         + str(metrics['failed_evaluations']))
+        self.metrics = metrics
+        self.failed_evaluations = metrics['failed_evaluations']
+
+def put_evaluations(config_client, evaluations, result_token, test_mode=False,
+                    max_workers=DEFAULT_MAX_WORKERS, max_attempts=DEFAULT_MAX_ATTEMPTS, delta_reporter=None):
+    """Send the evaluations to AWS Config and return the submission metrics.
+
+    Raise an EvaluationSubmissionError, once the metrics are recorded, when evaluations are still rejected after max_attempts.
+
+    The returned dictionary holds the number of 'evaluations', 'batches', put_evaluations 'calls',
+    'retries' and 'failed' evaluations, the elapsed 'seconds', the 'evaluations_per_second', the list of the
+    'failed_evaluations' still rejected after max_attempts and the count of every ComplianceType in
+    'compliance_types' (the evaluations skipped by the delta_reporter included).
+
+    Keyword arguments:
+    config_client -- the AWS Config boto client
+    evaluations -- an iterable of Evaluation or evaluation dictionaries, consumed lazily
+    result_token -- the resultToken of the event
+    test_mode -- True to skip the actual recording of the evaluations (default False)
+    max_workers -- the number of batches sent concurrently (default DEFAULT_MAX_WORKERS)
+    max_attempts -- the number of attempts per evaluation (default DEFAULT_MAX_ATTEMPTS)
+    delta_reporter -- a DeltaReporter to only submit the evaluations that changed (default None)
+    """
+    metrics = {'evaluations': 0, 'batches': 0, 'calls': 0, 'retries': 0, 'failed': 0, 'failed_evaluations': [],
+               'compliance_types': {}}
+    start_time = time.time()
+    evaluations = _count_compliance_types(evaluations, metrics['compliance_types'])
+    if delta_reporter:
+        evaluations = delta_reporter.filter(evaluations)
+    evaluations = iter(evaluations)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = set()
+        for batch in iter_batches(evaluations):
+            # Keep at most max_workers batches in flight, so the iterable is not drained ahead of the API.
+            if len(pending) >= max_workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                _collect(done, metrics)
+            metrics['evaluations'] += len(batch)
+            metrics['batches'] += 1
+            pending.add(executor.submit(_put_batch, config_client, batch, result_token, test_mode, max_attempts))
+        _collect(wait(pending).done, metrics)
+    metrics['seconds'] = round(time.time() - start_time, 3)
+    metrics['evaluations_per_second'] = round(metrics['evaluations'] / metrics['seconds'], 1) if metrics['seconds'] else 0.0
+    print("put_evaluations: {evaluations} evaluations in {batches} batches, {calls} calls, {retries} retries, {failed} failed, "
+          "{seconds}s ({evaluations_per_second}/s)".format(**metrics))
+    if delta_reporter and not test_mode:
+        delta_reporter.commit(metrics['failed_evaluations'])
+    record_submission(metrics)
+    if metrics['failed_evaluations']:
+        raise EvaluationSubmissionError(metrics)
+    return metrics
+
+def iter_batches(evaluations, batch_size=PUT_EVALUATIONS_BATCH_SIZE):
+    """Yield lists of at most batch_size evaluations from the iterable."""
+    evaluations = iter(evaluations)
+    while True:
+        batch = list(itertools.islice(evaluations, batch_size))
+        if not batch:
+            return
+        yield batch
+
+def _put_batch(config_client, batch, result_token, test_mode, max_attempts):
+    batch_metrics = {'calls': 0, 'retries': 0, 'failed_evaluations': []}
+    for attempt in range(max_attempts):
+        if attempt:
+            batch_metrics['retries'] += 1
+            time.sleep(random.uniform(0, min(BACKOFF_CAP_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt)))
+        batch_metrics['calls'] += 1
+        try:
+            response = config_client.put_evaluations(Evaluations=[to_api_evaluation(evaluation) for evaluation in batch],
+                                                     ResultToken=result_token, TestMode=test_mode)
+        except botocore.exceptions.ClientError as ex:
+            if ex.response['Error']['Code'] not in THROTTLING_ERROR_CODES:
+                raise
+            continue
+        batch = _match_failed(batch, response.get('FailedEvaluations', []))
+        if not batch:
+            return batch_metrics
+    batch_metrics['failed_evaluations'] = batch
+    return batch_metrics
+
+# FailedEvaluations echoes the rejected evaluations, retry the original dictionaries of those resources.
+def _match_failed(batch, failed_evaluations):
+    if not failed_evaluations:
+        return []
+    failed_keys = {(failed['ComplianceResourceType'], failed['ComplianceResourceId']) for failed in failed_evaluations}
+    return [evaluation for evaluation in batch
+            if (evaluation['ComplianceResourceType'], evaluation['ComplianceResourceId']) in failed_keys]
+
+def _count_compliance_types(evaluations, compliance_types):
+    for evaluation in evaluations:
+        compliance_types[evaluation['ComplianceType']] = compliance_types.get(evaluation['ComplianceType'], 0) + 1
+        yield evaluation
+
+def _collect(futures, metrics):
+    for future in futures:
+        batch_metrics = future.result()
+        metrics['calls'] += batch_metrics['calls']
+        metrics['retries'] += batch_metrics['retries']
+        metrics['failed'] += len(batch_metrics['failed_evaluations'])
+        metrics['failed_evaluations'].extend(batch_metrics['failed_evaluations'])
@@ -0,0 +1,38 @@
+"""
+Shared setup of the tests: rule_runtime and the rules importable, and the fixture directories of the replays.
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+# The folder of the rules and of rule_runtime, the parent of tests/.
+RULES_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# This makes rule_runtime importable whatever the directory pytest is run from.
+if RULES_DIRECTORY not in sys.path:
+    sys.path.insert(0, RULES_DIRECTORY)
+
+@pytest.fixture(scope='session')
+def rule_path():
+    """Return a function giving the path of the code of a rule folder, e.g. rule_path('IAM_USER_MFA_ENABLED')."""
+    return lambda rule_name: os.path.join(RULES_DIRECTORY, rule_name, rule_name + '.py')
+
+@pytest.fixture
+def fixture_dir(tmp_path):
+    """Return an empty directory of recorded responses, as replay.FixtureClientFactory reads them."""
+    return str(tmp_path)
+
+@pytest.fixture
+def write_fixture(fixture_dir):
+    """Return a function writing the responses of an operation to fixture_dir, as <service>/<operation>.json.
+
+    The responses are a response dictionary, or a list of them returned in order.
+    """
+    def write(service, operation, responses):
+        os.makedirs(os.path.join(fixture_dir, service), exist_ok=True)
+        with open(os.path.join(fixture_dir, service, operation + '.json'), 'w', encoding='utf-8') as fixture_file:
+            json.dump(responses, fixture_file)
+    return write
@@ -0,0 +1,84 @@
+"""
+IAM rules reading the changed entity through rule_runtime.get_entity_authorization(), and every entity on schedule.
+"""
+
+import json
+import os
+import time
+import urllib.parse
+
+import rule_runtime
+from rule_runtime import replay
+from rule_runtime.delta import STATE_DIRECTORY
+
+RULE_NAME = 'IAM_ROLE_NO_POLICY_FULL_STAR'
+
+FULL_STAR_DOCUMENT = {'Version': '2012-10-17', 'Statement': [{'Effect': 'Allow', 'Action': '*', 'Resource': '*'}]}
+
+READ_ONLY_DOCUMENT = {'Version': '2012-10-17', 'Statement': [{'Effect': 'Allow', 'Action': 's3:Get*', 'Resource': '*'}]}
+
+def encoded(document):
+    # IAM returns the policy documents URL-encoded, botocore decodes them.
+    return urllib.parse.quote(json.dumps(document))
+
+def build_role_event():
+    configuration_item = {'resourceType': 'AWS::IAM::Role', 'resourceId': 'AROAADMIN', 'resourceName': 'admin',
+                          'configuration': {'roleName': 'admin'}}
+    return replay.build_event(replay.build_invoking_event(configuration_item))
+
+def test_change_reads_the_entity_alone(fixture_dir, write_fixture, rule_path):
+    write_fixture('iam', 'list_role_policies', {'PolicyNames': ['read'], 'IsTruncated': False})
+    write_fixture('iam', 'get_role_policy', {'RoleName': 'admin', 'PolicyName': 'read', 'PolicyDocument': encoded(READ_ONLY_DOCUMENT)})
+    write_fixture('iam', 'list_attached_role_policies', {'AttachedPolicies': [
+        {'PolicyName': 'AdministratorAccess', 'PolicyArn': 'arn:aws:iam::aws:policy/AdministratorAccess'}], 'IsTruncated': False})
+    write_fixture('iam', 'get_policy', {'Policy': {'Arn': 'arn:aws:iam::aws:policy/AdministratorAccess', 'DefaultVersionId': 'v1'}})
+    write_fixture('iam', 'get_policy_version', {'PolicyVersion': {'VersionId': 'v1', 'Document': encoded(FULL_STAR_DOCUMENT)}})
+
+    result = replay.replay(rule_path(RULE_NAME), fixture_dir, build_role_event())
+
+    assert [evaluation['ComplianceType'] for evaluation in result['evaluations']] == ['NON_COMPLIANT']
+    assert {operation for _, operation, _ in result['calls'] if operation != 'put_evaluations'} == {
+        'list_role_policies', 'get_role_policy', 'list_attached_role_policies', 'get_policy', 'get_policy_version'}
+
+def test_snapshot_read_after_the_change_is_used(fixture_dir, rule_path):
+    rule = replay.load_rule(rule_path(RULE_NAME))
+    event = build_role_event()
+    snapshot = rule_runtime.AuthorizationSnapshot({'RoleDetailList': [
+        {'RoleName': 'admin', 'RolePolicyList': [{'PolicyName': 'read', 'PolicyDocument': READ_ONLY_DOCUMENT}], 'AttachedManagedPolicies': []}]},
+        time.time() + 60)
+    factory = replay.FixtureClientFactory(fixture_dir)
+    rule_runtime.set_client_factory(factory)
+    try:
+        rule_runtime.clear_authorization_snapshots()
+        snapshot.to_file(os.path.join(STATE_DIRECTORY, 'authorization-{}.json.gz'.format(event['accountId'])))
+        response = rule.lambda_handler(event, None)
+    finally:
+        rule_runtime.set_client_factory(None)
+        rule_runtime.clear_authorization_snapshots()
+
+    assert response[0]['ComplianceType'] == 'COMPLIANT'
+    assert [operation for _, operation, _ in factory.calls] == ['put_evaluations']
+
+def test_schedule_evaluates_every_role_from_the_snapshot(fixture_dir, write_fixture, rule_path):
+    write_fixture('iam', 'get_account_authorization_details', {
+        'RoleDetailList': [
+            {'RoleName': 'admin', 'RoleId': 'AROAADMIN', 'RolePolicyList': [], 'AttachedManagedPolicies': [
+                {'PolicyName': 'Admin', 'PolicyArn': 'arn:aws:iam::123456789012:policy/Admin'}]},
+            {'RoleName': 'reader', 'RoleId': 'AROAREADER', 'RolePolicyList': [
+                {'PolicyName': 'read', 'PolicyDocument': encoded(READ_ONLY_DOCUMENT)}], 'AttachedManagedPolicies': []}],
+        'UserDetailList': [], 'GroupDetailList': [],
+        'Policies': [{'PolicyName': 'Admin', 'Arn': 'arn:aws:iam::123456789012:policy/Admin', 'DefaultVersionId': 'v2',
+                      'PolicyVersionList': [{'VersionId': 'v2', 'IsDefaultVersion': True, 'Document': encoded(
+                          {'Version': '2012-10-17', 'Statement': [{'Effect': 'Allow', 'Action': '*:*', 'Resource': '*'}]})}]}],
+        'IsTruncated': False})
+    write_fixture('config', 'get_compliance_details_by_config_rule', {'EvaluationResults': []})
+    rule_runtime.clear_authorization_snapshots()
+    try:
+        result = replay.replay(rule_path(RULE_NAME), fixture_dir, replay.build_event(replay.build_invoking_event()))
+    finally:
+        rule_runtime.clear_authorization_snapshots()
+
+    assert {evaluation['ComplianceResourceId']: evaluation['ComplianceType'] for evaluation in result['evaluations']} == {
+        'AROAADMIN': 'NON_COMPLIANT', 'AROAREADER': 'COMPLIANT'}
+    assert {service for service, _, _ in result['calls']} == {'iam', 'config'}
+    assert {operation for service, operation, _ in result['calls'] if service == 'iam'} == {'get_account_authorization_details'}
@@ -0,0 +1,72 @@
+"""
+IAM credential report of rule_runtime.get_credential_report().
+"""
+
+import datetime
+
+import pytest
+
+import rule_runtime
+from rule_runtime import credential_report, replay
+
+REPORT = ('user,arn,user_creation_time,password_enabled,mfa_active,'
+          'access_key_1_active,access_key_1_last_rotated,access_key_1_last_used_date,access_key_1_last_used_region,access_key_1_last_used_service,'
+          'access_key_2_active,access_key_2_last_rotated,access_key_2_last_used_date,access_key_2_last_used_region,access_key_2_last_used_service\n'
+          '<root_account>,arn:aws:iam::123456789012:root,2019-01-01T00:00:00+00:00,not_supported,true,false,N/A,N/A,N/A,N/A,false,N/A,N/A,N/A,N/A\n'
+          'alice,arn:aws:iam::123456789012:user/alice,2020-01-01T00:00:00+00:00,true,false,'
+          'true,2020-02-01T00:00:00+00:00,N/A,N/A,N/A,false,N/A,N/A,N/A,N/A\n')
+
+@pytest.fixture
+def client_factory(fixture_dir):
+    rule_runtime.clear_credential_reports()
+    yield replay.FixtureClientFactory(fixture_dir)
+    rule_runtime.clear_credential_reports()
+
+def test_cells_are_parsed():
+    report = rule_runtime.CredentialReport.from_content(REPORT.encode('utf-8'))
+
+    assert report.user_names() == ['alice']
+    assert report.column_value('alice', 'password_enabled') is True
+    assert report.column_value('alice', 'mfa_active') is False
+    assert report.column_value('alice', 'user_creation_time') == datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+    assert report.column_value('alice', 'access_key_1_last_used_date') is None
+    with pytest.raises(KeyError):
+        report.column_value('bob', 'mfa_active')
+
+def test_access_keys_skip_the_slots_never_used():
+    report = rule_runtime.CredentialReport.from_content(REPORT)
+
+    keys = report.access_keys('alice')
+
+    assert [(key['number'], key['active'], key['last_rotated'].month) for key in keys] == [(1, True, 2)]
+
+def test_user_created_again_is_not_the_reported_one():
+    report = rule_runtime.CredentialReport.from_content(REPORT)
+
+    assert report.has_user('alice', datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc))
+    assert not report.has_user('alice', datetime.datetime(2021, 1, 1, tzinfo=datetime.timezone.utc))
+
+def test_report_is_generated_once_and_kept(client_factory, write_fixture, monkeypatch):
+    monkeypatch.setattr(credential_report, 'POLL_INTERVAL_SECONDS', 0)
+    generated_time = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    write_fixture('iam', 'generate_credential_report', [{'State': 'STARTED'}, {'State': 'COMPLETE'}])
+    write_fixture('iam', 'get_credential_report', {'Content': REPORT, 'ReportFormat': 'text/csv', 'GeneratedTime': generated_time})
+    iam_client = client_factory('iam')
+
+    report = rule_runtime.get_credential_report(iam_client, '123456789012')
+
+    assert rule_runtime.get_credential_report(iam_client, '123456789012') is report
+    assert [operation for _, operation, _ in client_factory.calls] == ['generate_credential_report', 'generate_credential_report',
+                                                                        'get_credential_report']
+
+def test_report_older_than_max_age_is_read_again(client_factory, write_fixture):
+    generated_time = (datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=2)).isoformat()
+    write_fixture('iam', 'generate_credential_report', {'State': 'COMPLETE'})
+    write_fixture('iam', 'get_credential_report', {'Content': REPORT, 'ReportFormat': 'text/csv', 'GeneratedTime': generated_time})
+    iam_client = client_factory('iam')
+
+    rule_runtime.get_credential_report(iam_client, '123456789012')
+    rule_runtime.get_credential_report(iam_client, '123456789012')
+    rule_runtime.get_credential_report(iam_client, '123456789012', max_age=datetime.timedelta(hours=1))
+
+    assert [operation for _, operation, _ in client_factory.calls].count('get_credential_report') == 2
@@ -0,0 +1,70 @@
+"""
+Expiry-aware STS credentials of rule_runtime.CredentialCache.
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import rule_runtime
+
+ROLE_ARN = 'arn:aws:iam::123456789012:role/config-rule'
+
+class CountingLoader:
+    """STS stand-in returning credentials which expire lifetime after they are loaded, delay seconds after the call."""
+
+    def __init__(self, lifetime, delay=0):
+        self.lifetime = lifetime
+        self.delay = delay
+        self.calls = 0
+
+    def __call__(self, role_arn, region, duration_seconds):
+        self.calls += 1
+        time.sleep(self.delay)
+        credentials = {'AccessKeyId': 'key-{}'.format(self.calls)}
+        if self.lifetime is not None:
+            credentials['Expiration'] = datetime.now(timezone.utc) + self.lifetime
+        return credentials
+
+def test_credentials_are_reused_until_the_margin():
+    loader = CountingLoader(timedelta(hours=1))
+    cache = rule_runtime.CredentialCache(loader)
+
+    assert cache.get_credentials(ROLE_ARN) is cache.get_credentials(ROLE_ARN)
+    assert loader.calls == 1
+
+def test_credentials_within_the_margin_are_refreshed():
+    loader = CountingLoader(timedelta(seconds=30))
+    cache = rule_runtime.CredentialCache(loader, margin_seconds=60)
+
+    assert cache.get_credentials(ROLE_ARN)['AccessKeyId'] == 'key-1'
+    assert cache.get_credentials(ROLE_ARN)['AccessKeyId'] == 'key-2'
+
+def test_duration_is_the_lifetime_without_expiration():
+    cache = rule_runtime.CredentialCache(CountingLoader(None))
+
+    credentials = cache.get_credentials(ROLE_ARN, duration_seconds=900)
+
+    assert timedelta(seconds=890) < credentials['Expiration'] - datetime.now(timezone.utc) <= timedelta(seconds=900)
+
+def test_invalidate_forgets_the_role():
+    loader = CountingLoader(timedelta(hours=1))
+    cache = rule_runtime.CredentialCache(loader)
+    cache.get_credentials(ROLE_ARN)
+
+    cache.invalidate(ROLE_ARN)
+    cache.get_credentials(ROLE_ARN)
+
+    assert loader.calls == 2
+
+def test_concurrent_callers_share_one_refresh():
+    loader = CountingLoader(timedelta(hours=1), delay=0.1)
+    cache = rule_runtime.CredentialCache(loader)
+    threads = [threading.Thread(target=cache.get_credentials, args=(ROLE_ARN,)) for _ in range(8)]
+
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert loader.calls == 1
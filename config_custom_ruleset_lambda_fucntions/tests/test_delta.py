@@ -0,0 +1,75 @@
+"""
+Delta-only reporting of rule_runtime.DeltaReporter.
+"""
+
+import os
+
+import rule_runtime
+from rule_runtime import delta
+
+def build_evaluation(resource_id, compliance_type, annotation=None):
+    evaluation = {'ComplianceResourceType': 'AWS::IAM::User', 'ComplianceResourceId': resource_id,
+                  'ComplianceType': compliance_type, 'OrderingTimestamp': '2020-01-01T00:00:00Z'}
+    if annotation:
+        evaluation['Annotation'] = annotation
+    return evaluation
+
+def resource_ids(evaluations):
+    return [evaluation['ComplianceResourceId'] for evaluation in evaluations]
+
+def test_unchanged_evaluations_are_skipped():
+    store = rule_runtime.MemoryFingerprintStore()
+    first = rule_runtime.DeltaReporter(store)
+    assert resource_ids(first.filter([build_evaluation('alice', 'COMPLIANT'), build_evaluation('bob', 'COMPLIANT')])) == ['alice', 'bob']
+    first.commit()
+
+    second = rule_runtime.DeltaReporter(store)
+    submitted = second.filter([build_evaluation('alice', 'COMPLIANT'), build_evaluation('bob', 'NON_COMPLIANT'),
+                               build_evaluation('carol', 'COMPLIANT')])
+
+    assert resource_ids(submitted) == ['bob', 'carol']
+    assert second.skipped == 1
+
+def test_annotation_change_is_submitted():
+    store = rule_runtime.MemoryFingerprintStore()
+    reporter = rule_runtime.DeltaReporter(store)
+    list(reporter.filter([build_evaluation('alice', 'NON_COMPLIANT', 'key 1 is 91 days old')]))
+    reporter.commit()
+
+    submitted = rule_runtime.DeltaReporter(store).filter([build_evaluation('alice', 'NON_COMPLIANT', 'key 1 is 92 days old')])
+
+    assert resource_ids(submitted) == ['alice']
+
+def test_failed_evaluations_are_submitted_again():
+    store = rule_runtime.MemoryFingerprintStore()
+    reporter = rule_runtime.DeltaReporter(store)
+    list(reporter.filter([build_evaluation('alice', 'COMPLIANT'), build_evaluation('bob', 'COMPLIANT')]))
+    reporter.commit(failed_evaluations=[build_evaluation('bob', 'COMPLIANT')])
+
+    submitted = rule_runtime.DeltaReporter(store).filter([build_evaluation('alice', 'COMPLIANT'), build_evaluation('bob', 'COMPLIANT')])
+
+    assert resource_ids(submitted) == ['bob']
+
+def test_unchanged_evaluation_is_refreshed_after_the_period(monkeypatch):
+    store = rule_runtime.MemoryFingerprintStore()
+    reporter = rule_runtime.DeltaReporter(store, refresh_after_seconds=3600)
+    list(reporter.filter([build_evaluation('alice', 'COMPLIANT')]))
+    reporter.commit()
+
+    later = delta.time.time() + 3600
+    monkeypatch.setattr(delta.time, 'time', lambda: later)
+    refreshed = rule_runtime.DeltaReporter(store, refresh_after_seconds=3600)
+
+    assert resource_ids(refreshed.filter([build_evaluation('alice', 'COMPLIANT')])) == ['alice']
+
+def test_local_store_survives_a_new_reporter(tmp_path):
+    store = rule_runtime.LocalFingerprintStore(os.path.join(str(tmp_path), 'state', 'rule.json'))
+    assert store.load_fingerprints() == {}
+    reporter = rule_runtime.DeltaReporter(store)
+    list(reporter.filter([build_evaluation('alice', 'COMPLIANT')]))
+    reporter.commit()
+
+    reloaded = rule_runtime.LocalFingerprintStore(store.path)
+
+    assert list(reloaded.load_fingerprints()) == ['AWS::IAM::User|alice']
+    assert resource_ids(rule_runtime.DeltaReporter(reloaded).filter([build_evaluation('alice', 'COMPLIANT')])) == []
@@ -0,0 +1,44 @@
+"""
+Checks of the regexPattern guard of IAM_USER_MATCHES_REGEX_PATTERN against catastrophic backtracking.
+"""
+
+import pytest
+
+from rule_runtime import replay
+
+@pytest.fixture(scope='module')
+def rule(rule_path):
+    return replay.load_rule(rule_path('IAM_USER_MATCHES_REGEX_PATTERN'))
+
+@pytest.fixture
+def rule_check(rule, monkeypatch):
+    monkeypatch.setattr(rule, 'PATTERN_CHECK_TIMEOUT_SECONDS', 0.5)
+    monkeypatch.setattr(rule, 'BACKTRACKING_PATTERNS', {})
+    return rule
+
+@pytest.mark.parametrize('pattern', [r'(a+)+$', r'(.*,)*$', r'(a|aa)+$', r'(a|a)*b'])
+def test_backtracking_pattern_is_rejected(rule_check, pattern):
+    assert rule_check.has_nested_quantifier(pattern)
+
+@pytest.mark.parametrize('pattern', [r'^[a-z]+(\.[a-z]+)*$', r'^[a-z]+(-[a-z]+)*$', r'^(admin|user)-[0-9]+$', r'(a|b)+$', r'user-\d*[02468]$',
+                                     r'(.*,)*', r'(\w|\d)+$'])
+def test_linear_pattern_is_accepted(rule_check, pattern):
+    assert not rule_check.has_nested_quantifier(pattern)
+
+def test_verdict_is_kept_per_pattern(rule_check, monkeypatch):
+    rule_check.has_nested_quantifier(r'(a+)+$')
+    monkeypatch.setattr(rule_check, 'is_matched_in_time', None)
+
+    assert rule_check.has_nested_quantifier(r'(a+)+$')
+
+def test_periodic_evaluations_keep_the_user_name_key(rule, fixture_dir, write_fixture):
+    write_fixture('iam', 'list_users', {'Users': [{'UserName': 'alice', 'UserId': 'AIDAALICE', 'Arn': 'arn:aws:iam::123456789012:user/alice',
+                                                   'Path': '/', 'CreateDate': '2020-01-01T00:00:00Z'}], 'IsTruncated': False})
+    # The evaluation of alice reported by a change-triggered invocation.
+    write_fixture('config', 'get_compliance_details_by_config_rule', {'EvaluationResults': [{'EvaluationResultIdentifier': {'EvaluationResultQualifier': {
+        'ConfigRuleName': 'replayed-rule', 'ResourceType': 'AWS::IAM::User', 'ResourceId': 'alice'}}, 'ComplianceType': 'COMPLIANT'}]})
+    event = replay.build_event(replay.build_invoking_event(), {'regexPattern': 'a.*'})
+
+    result = replay.replay(rule, fixture_dir, event)
+
+    assert [(evaluation['ComplianceResourceId'], evaluation['ComplianceType']) for evaluation in result['evaluations']] == [('alice', 'COMPLIANT')]
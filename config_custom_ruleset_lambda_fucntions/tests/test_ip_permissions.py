@@ -0,0 +1,39 @@
+"""
+Minimal authorize/revoke diff of rule_runtime.diff_ip_permissions().
+"""
+
+import rule_runtime
+
+HTTPS = {'IpProtocol': 'tcp', 'FromPort': 443, 'ToPort': 443, 'IpRanges': [{'CidrIp': '0.0.0.0/0'}]}
+
+def test_same_rules_in_another_form_need_no_change():
+    current = [{'IpProtocol': '6', 'FromPort': 443, 'ToPort': 443,
+                'IpRanges': [{'CidrIp': '10.0.0.0/8', 'Description': 'office'}, {'CidrIp': '0.0.0.0/0'}]}]
+    required = [HTTPS, {'IpProtocol': 'tcp', 'FromPort': 443, 'ToPort': 443, 'IpRanges': [{'CidrIp': '10.0.0.0/8'}]}]
+
+    assert rule_runtime.diff_ip_permissions(current, required) == ([], [])
+
+def test_only_the_changed_rules_are_authorized_or_revoked():
+    current = [{'IpProtocol': 'tcp', 'FromPort': 443, 'ToPort': 443,
+                'IpRanges': [{'CidrIp': '0.0.0.0/0'}, {'CidrIp': '10.0.0.0/8'}]}]
+    required = [HTTPS, {'IpProtocol': 'tcp', 'FromPort': 80, 'ToPort': 80, 'IpRanges': [{'CidrIp': '0.0.0.0/0'}]}]
+
+    authorize, revoke = rule_runtime.diff_ip_permissions(current, required)
+
+    assert authorize == [{'IpProtocol': 'tcp', 'FromPort': 80, 'ToPort': 80, 'IpRanges': [{'CidrIp': '0.0.0.0/0'}]}]
+    assert revoke == [{'IpProtocol': 'tcp', 'FromPort': 443, 'ToPort': 443, 'IpRanges': [{'CidrIp': '10.0.0.0/8'}]}]
+
+def test_group_pairs_keep_only_the_api_members():
+    current = [{'IpProtocol': '-1', 'FromPort': -1, 'ToPort': -1, 'UserIdGroupPairs': [
+        {'GroupId': 'sg-1', 'UserId': '123456789012', 'GroupName': 'web', 'PeeringStatus': 'active'}]}]
+
+    authorize, revoke = rule_runtime.diff_ip_permissions(current, [])
+
+    assert authorize == []
+    assert revoke == [{'IpProtocol': '-1', 'UserIdGroupPairs': [{'GroupId': 'sg-1', 'UserId': '123456789012'}]}]
+
+def test_group_pair_without_group_id_is_keyed_by_its_name():
+    current = [{'IpProtocol': 'tcp', 'FromPort': 22, 'ToPort': 22, 'UserIdGroupPairs': [{'GroupName': 'bastion', 'UserId': '123456789012'}]}]
+
+    assert rule_runtime.diff_ip_permissions(current, current) == ([], [])
+    assert rule_runtime.diff_ip_permissions(current, [])[1][0]['UserIdGroupPairs'] == [{'GroupName': 'bastion', 'UserId': '123456789012'}]
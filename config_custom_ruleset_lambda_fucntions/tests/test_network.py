@@ -0,0 +1,59 @@
+"""
+Network inventory of rule_runtime.get_network_snapshot().
+"""
+
+import time
+
+import pytest
+
+import rule_runtime
+from rule_runtime import replay
+
+ROUTE_TABLES = [
+    {'RouteTableId': 'rtb-main', 'VpcId': 'vpc-1', 'Associations': [{'Main': True}],
+     'Routes': [{'DestinationCidrBlock': '10.0.0.0/16', 'GatewayId': 'local'}]},
+    {'RouteTableId': 'rtb-public', 'VpcId': 'vpc-1', 'Associations': [{'Main': False, 'SubnetId': 'subnet-public'}],
+     'Routes': [{'DestinationCidrBlock': '10.0.0.0/16', 'GatewayId': 'local'}, {'DestinationIpv6CidrBlock': '::/0', 'GatewayId': 'igw-1'}]}
+]
+
+@pytest.fixture
+def client_factory(fixture_dir):
+    rule_runtime.clear_network_snapshots()
+    yield replay.FixtureClientFactory(fixture_dir)
+    rule_runtime.clear_network_snapshots()
+
+def test_subnet_route_table_falls_back_to_the_main_one():
+    snapshot = rule_runtime.NetworkSnapshot({'route_tables': ROUTE_TABLES}, {'route_tables': time.time()})
+
+    assert snapshot.is_public_subnet('subnet-public', 'vpc-1')
+    assert not snapshot.is_public_subnet('subnet-private', 'vpc-1')
+    assert snapshot.subnet_route_table('subnet-private', 'vpc-1')['RouteTableId'] == 'rtb-main'
+    assert snapshot.subnet_route_table('subnet-other', 'vpc-2') is None
+
+def test_collection_not_requested_raises():
+    snapshot = rule_runtime.NetworkSnapshot({'route_tables': ROUTE_TABLES}, {'route_tables': time.time()})
+
+    with pytest.raises(ValueError):
+        snapshot.vpcs
+
+def test_only_the_stale_collections_are_described(client_factory, write_fixture):
+    write_fixture('ec2', 'describe_vpcs', {'Vpcs': [{'VpcId': 'vpc-1'}]})
+    write_fixture('ec2', 'describe_route_tables', {'RouteTables': ROUTE_TABLES})
+    write_fixture('ec2', 'describe_subnets', {'Subnets': [{'SubnetId': 'subnet-public', 'VpcId': 'vpc-1'}]})
+    ec2_client = client_factory('ec2')
+
+    rule_runtime.get_network_snapshot(ec2_client, '123456789012', ('vpcs', 'route_tables'))
+    snapshot = rule_runtime.get_network_snapshot(ec2_client, '123456789012', ('vpcs', 'subnets'))
+
+    assert sorted(operation for _, operation, _ in client_factory.calls) == ['describe_route_tables', 'describe_subnets', 'describe_vpcs']
+    assert list(snapshot.vpcs) == ['vpc-1']
+    assert [subnet['SubnetId'] for subnet in snapshot.subnets_by_vpc['vpc-1']] == ['subnet-public']
+
+def test_collection_described_before_the_change_is_described_again(client_factory, write_fixture):
+    write_fixture('ec2', 'describe_vpcs', [{'Vpcs': [{'VpcId': 'vpc-1'}]}, {'Vpcs': [{'VpcId': 'vpc-1'}, {'VpcId': 'vpc-2'}]}])
+    ec2_client = client_factory('ec2')
+
+    rule_runtime.get_network_snapshot(ec2_client, '123456789012', ('vpcs',))
+    snapshot = rule_runtime.get_network_snapshot(ec2_client, '123456789012', ('vpcs',), not_before=time.time() + 60)
+
+    assert sorted(snapshot.vpcs) == ['vpc-1', 'vpc-2']
@@ -0,0 +1,59 @@
+"""
+Lazy pagination of rule_runtime.paginate().
+"""
+
+import pytest
+
+import rule_runtime
+from rule_runtime import replay
+
+USERS_PAGES = [
+    {'Users': [{'UserName': 'alice', 'UserId': 'AIDAALICE', 'Arn': 'arn:aws:iam::123456789012:user/alice', 'Path': '/',
+                'CreateDate': '2020-01-01T00:00:00Z'}], 'IsTruncated': True, 'Marker': 'page-2'},
+    {'Users': [{'UserName': 'bob', 'UserId': 'AIDABOB', 'Arn': 'arn:aws:iam::123456789012:user/bob', 'Path': '/',
+                'CreateDate': '2020-01-01T00:00:00Z'}], 'IsTruncated': False}
+]
+
+@pytest.fixture
+def client_factory(fixture_dir):
+    rule_runtime.reset_pagination_stats()
+    yield replay.FixtureClientFactory(fixture_dir)
+    rule_runtime.reset_pagination_stats()
+
+def test_every_page_is_read_at_the_largest_size(client_factory, write_fixture):
+    write_fixture('iam', 'list_users', USERS_PAGES)
+    iam_client = client_factory('iam')
+
+    user_names = [user['UserName'] for user in rule_runtime.paginate(iam_client, iam_client.list_users)]
+
+    assert user_names == ['alice', 'bob']
+    assert [(params.get('MaxItems'), params.get('Marker')) for _, _, params in client_factory.calls] == [(1000, None), (1000, 'page-2')]
+    assert rule_runtime.get_pagination_stats() == {'iam.list_users': {'pages': 2, 'items': 2}}
+
+def test_pages_are_read_on_demand(client_factory, write_fixture):
+    write_fixture('iam', 'list_users', USERS_PAGES)
+    iam_client = client_factory('iam')
+
+    first_user = next(rule_runtime.paginate(iam_client, 'list_users', call_site='first-user'))
+
+    assert first_user['UserName'] == 'alice'
+    assert len(client_factory.calls) == 1
+    assert rule_runtime.get_pagination_stats() == {'first-user': {'pages': 1, 'items': 1}}
+
+def test_ec2_ids_are_listed_without_page_size(client_factory, write_fixture):
+    write_fixture('ec2', 'describe_vpcs', {'Vpcs': [{'VpcId': 'vpc-1'}]})
+    ec2_client = client_factory('ec2')
+
+    list(rule_runtime.paginate(ec2_client, 'describe_vpcs', VpcIds=['vpc-1']))
+
+    assert 'MaxResults' not in client_factory.calls[0][2]
+
+def test_operation_without_paginator_needs_a_result_key(client_factory, write_fixture):
+    write_fixture('ec2', 'describe_regions', {'Regions': [{'RegionName': 'us-east-1'}, {'RegionName': 'eu-west-1'}]})
+    ec2_client = client_factory('ec2')
+
+    regions = [region['RegionName'] for region in rule_runtime.paginate(ec2_client, 'describe_regions', result_key='Regions')]
+
+    assert regions == ['us-east-1', 'eu-west-1']
+    with pytest.raises(ValueError):
+        list(rule_runtime.paginate(ec2_client, 'describe_regions'))
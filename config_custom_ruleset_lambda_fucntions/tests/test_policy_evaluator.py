@@ -0,0 +1,44 @@
+"""
+Broad grants found by rule_runtime.compile_policy().
+"""
+
+import pytest
+
+import rule_runtime
+
+@pytest.mark.parametrize('action', ['*', '*:*', ['s3:GetObject', '*:*']])
+def test_every_action_pattern_grants_full_admin(action):
+    policy = rule_runtime.compile_policy([{'Effect': 'Allow', 'Action': action, 'Resource': '*'}])
+
+    assert policy.allows('*')
+    assert policy.allows('*:*', '*')
+    assert policy.allows('iam:*', '*')
+
+def test_service_wildcard_does_not_grant_full_admin():
+    policy = rule_runtime.compile_policy({'Statement': {'Effect': 'Allow', 'Action': 'IAM:*', 'Resource': '*'}})
+
+    assert not policy.allows('*')
+    assert not policy.allows('*:*')
+    assert policy.allows('iam:*', '*')
+    assert policy.grants({'admin': rule_runtime.FULL_ADMIN, 'iam': rule_runtime.service_admin('iam')}) == {'iam'}
+
+def test_not_action_grants_full_admin_only_when_it_excludes_nothing():
+    excluding_iam = rule_runtime.compile_policy([{'Effect': 'Allow', 'NotAction': 'iam:*', 'Resource': '*'}])
+    excluding_all = rule_runtime.compile_policy([{'Effect': 'Allow', 'NotAction': '*:*', 'Resource': '*'}])
+
+    assert not excluding_iam.allows('*')
+    assert excluding_iam.allows('s3:*', '*')
+    assert not excluding_all.allows('*')
+    assert not excluding_all.allows('s3:*')
+
+def test_deny_statement_grants_nothing():
+    policy = rule_runtime.compile_policy([{'Effect': 'Deny', 'Action': '*:*', 'Resource': '*'}])
+
+    assert not policy.allows('*')
+    assert not policy.allows('iam:*')
+
+def test_resource_restriction_is_not_full_admin():
+    policy = rule_runtime.compile_policy([{'Effect': 'Allow', 'Action': '*:*', 'Resource': 'arn:aws:s3:::bucket/*'}])
+
+    assert policy.allows('*')
+    assert not policy.allows('*', '*')
@@ -0,0 +1,33 @@
+"""
+Port sets of rule_runtime.PortIntervals.
+"""
+
+import pytest
+
+import rule_runtime
+
+def test_overlapping_and_adjacent_intervals_are_merged():
+    ports = rule_runtime.PortIntervals([(443, 443), (20, 22), (0, -1), (21, 80), (81, 81)])
+
+    assert list(ports) == [(20, 81), (443, 443)]
+    assert len(ports) == 2
+    assert not rule_runtime.PortIntervals([(10, 9)])
+
+@pytest.mark.parametrize('begin, end, overlaps, covers', [
+    (22, 22, True, True), (19, 20, True, False), (82, 442, False, False), (0, 65535, True, False), (443, 443, True, True)])
+def test_overlaps_and_covers(begin, end, overlaps, covers):
+    ports = rule_runtime.PortIntervals([(20, 81), (443, 443)])
+
+    assert ports.overlaps(begin, end) is overlaps
+    assert ports.covers(begin, end) is covers
+
+def test_covers_needs_a_single_interval():
+    assert not rule_runtime.PortIntervals([(80, 80), (443, 443)]).covers(80, 443)
+    assert 80 in rule_runtime.PortIntervals([(80, 80), (443, 443)])
+
+@pytest.mark.parametrize('permission, port_range', [
+    ({'IpProtocol': '-1'}, (0, 65535)),
+    ({'IpProtocol': 'tcp', 'FromPort': 22, 'ToPort': 23}, (22, 23)),
+    ({'ipProtocol': 'udp', 'fromPort': 53, 'toPort': 53}, (53, 53))])
+def test_permission_port_range(permission, port_range):
+    assert rule_runtime.permission_port_range(permission) == port_range
@@ -0,0 +1,25 @@
+"""
+Replays of the streaming rules, whose evaluate_compliance() runs while put_evaluations() sends its evaluations.
+"""
+
+from rule_runtime import replay
+
+CREDENTIAL_REPORT = ('user,arn,user_creation_time,mfa_active\n'
+                     'alice,arn:aws:iam::123456789012:user/alice,2020-01-01T00:00:00+00:00,true\n')
+
+def test_error_of_a_later_page_is_reported_as_an_error_response(fixture_dir, write_fixture, rule_path):
+    write_fixture('iam', 'generate_credential_report', {'State': 'COMPLETE'})
+    write_fixture('iam', 'get_credential_report',
+                  {'Content': CREDENTIAL_REPORT, 'ReportFormat': 'text/csv', 'GeneratedTime': '2030-01-01T00:00:00Z'})
+    write_fixture('iam', 'list_users', [
+        {'Users': [{'UserName': 'alice', 'UserId': 'AIDAALICE', 'Arn': 'arn:aws:iam::123456789012:user/alice', 'Path': '/',
+                    'CreateDate': '2020-01-01T00:00:00Z'}],
+         'IsTruncated': True, 'Marker': 'page-2'},
+        {'Error': {'Code': 'AccessDenied', 'Message': 'User is not authorized to perform: iam:ListUsers'}}
+    ])
+    event = replay.build_event(replay.build_invoking_event())
+
+    result = replay.replay(rule_path('IAM_USER_MFA_ENABLED'), fixture_dir, event)
+
+    assert result['response']['customerErrorCode'] == 'AccessDenied'
+    assert [params.get('Marker') for _, operation, params in result['calls'] if operation == 'list_users'] == [None, 'page-2']
@@ -0,0 +1,39 @@
+"""
+Submission of the evaluations by rule_runtime.put_evaluations().
+"""
+
+import pytest
+
+import rule_runtime
+from rule_runtime import submitter
+
+class RejectingConfigClient:
+    """Config client answering put_evaluations with the evaluations of the rejected resources in FailedEvaluations."""
+
+    def __init__(self, rejected_resource_ids):
+        self.rejected_resource_ids = rejected_resource_ids
+        self.calls = 0
+
+    def put_evaluations(self, Evaluations, ResultToken, TestMode):
+        self.calls += 1
+        return {'FailedEvaluations': [evaluation for evaluation in Evaluations
+                                      if evaluation['ComplianceResourceId'] in self.rejected_resource_ids]}
+
+def build_evaluations(count):
+    return [{'ComplianceResourceType': 'AWS::IAM::User', 'ComplianceResourceId': 'user-{}'.format(number),
+             'ComplianceType': 'COMPLIANT', 'OrderingTimestamp': '2020-01-01T00:00:00Z'} for number in range(count)]
+
+def test_evaluations_rejected_after_every_attempt_raise(monkeypatch):
+    monkeypatch.setattr(submitter, 'BACKOFF_CAP_SECONDS', 0)
+    config_client = RejectingConfigClient({'user-150'})
+
+    with pytest.raises(rule_runtime.EvaluationSubmissionError) as error:
+        rule_runtime.put_evaluations(config_client, build_evaluations(200), 'token', max_attempts=3)
+
+    assert [evaluation['ComplianceResourceId'] for evaluation in error.value.failed_evaluations] == ['user-150']
+    assert config_client.calls == 4
+
+def test_accepted_evaluations_return_the_metrics():
+    metrics = rule_runtime.put_evaluations(RejectingConfigClient(set()), build_evaluations(200), 'token')
+
+    assert (metrics['evaluations'], metrics['batches'], metrics['failed']) == (200, 2, 0)